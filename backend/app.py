@@ -1,141 +1,282 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Blueprint, Response, request, jsonify, render_template, send_from_directory, current_app
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import UnsupportedMediaType
 import os
+import re
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 from models import db, Video
-from services.video_service import VideoService
+from services.video_service import VideoService, HISTOGRAM_INTERVALS
 from services.social_media_service import SocialMediaService
-from config import Config
+from services import publication_events
+from services.platform_limits import PLATFORM_LIMITS, LIMITS_VERSION
+from services.tag_index import init_tag_index
+from services.renditions import init_rendition_cache, rendition_cache
+from services.storage_tiers import init_storage_tiers, storage_tiers, storage_cli
+from services.snapshots import snapshot_cli
+from services.fingerprints import init_fingerprints, fingerprint_index, fingerprints_cli
+from services.platform_accounts import init_account_registry, accounts_cli
+from models import PlatformAccount
+from config import config
+from metrics import init_metrics, APP_STARTUP_SECONDS
+from query_profiler import init_query_profiler
+from db_routing import init_db_routing
+from logging_setup import configure_logging
+from upload_pipeline import ALLOWED_EXTENSIONS, VideoRequest
+from json_stream import requested_stream_format, stream_response
+from assets import init_assets, build_assets_command
+from migrations.cli import db_cli
+from services.publication_analytics import publication_analytics, analytics_cli, WINDOWS
 import time
-from sqlalchemy.exc import OperationalError
-
-# Crear la aplicación Flask con configuración explícita de archivos estáticos
-app = Flask(__name__, 
-           static_folder='static',
-           static_url_path='/static',
-           template_folder='templates')
-
-app.config.from_object(Config)
-
-# Configurar CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost", "http://localhost:80", "http://localhost:5000", "http://localhost:5500"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
+import queue
+import threading
+import logging
+
+main = Blueprint('main', __name__)
 
-# Inicializar la base de datos
-db.init_app(app)
+logger = logging.getLogger(__name__)
 
 # Servicios
 video_service = VideoService()
 social_service = SocialMediaService()
 
-# Asegurar que la carpeta de uploads existe
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+def create_app(config_name=None):
+    """
+    Crear la aplicación Flask.
+
+    No realiza I/O: los engines de SQLAlchemy abren conexiones de forma
+    perezosa y el esquema y los directorios los prepara el paso de arranque
+    `flask --app app db upgrade`, que se ejecuta una sola vez antes de
+    levantar los workers.
+    """
+    started = time.perf_counter()
+    config_name = config_name or os.environ.get('ENVIRONMENT', 'default')
+    config_class = config.get(config_name, config['default'])
 
-# Función robusta para inicializar la base de datos
-def initialize_db():
-    max_retries = 5
-    retry_delay = 3
+    # Crear la aplicación Flask con configuración explícita de archivos estáticos
+    app = Flask(__name__,
+               static_folder='static',
+               static_url_path='/static',
+               template_folder='templates')
     
-    for attempt in range(max_retries):
-        try:
-            db.create_all()
-            print("Database initialized successfully!")
-            return
-        except OperationalError as e:
-            if "the database system is starting up" in str(e) and attempt < max_retries - 1:
-                print(f"Database not ready, retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                print(f"Failed to initialize database: {str(e)}")
-                raise
-
-# Crear las tablas si no existen con manejo de reintentos
-with app.app_context():
-    initialize_db()
-
-# Configuración de archivos permitidos
-ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm'}
+    # Los videos subidos se escriben directamente en UPLOAD_FOLDER
+    app.request_class = VideoRequest
+
+    app.config.from_object(config_class)
+    config_class.init_app(app)
+
+    # Logging estructurado con escritura en segundo plano e ID de petición
+    configure_logging(app)
+
+    # Configurar CORS
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost", "http://localhost:80", "http://localhost:5000", "http://localhost:5500"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    # Inicializar la base de datos
+    db.init_app(app)
+
+    # Lecturas en réplica con persistencia de lectura-tras-escritura
+    init_db_routing(app)
+
+    # Métricas de rendimiento (/metrics)
+    init_metrics(app)
+
+    # Instrumentación de consultas SQL (N+1, consultas lentas, Server-Timing)
+    init_query_profiler(app)
+
+    # Autocompletado de tags (el índice se construye al primer uso)
+    init_tag_index(app)
+    init_rendition_cache(app)
+    init_storage_tiers(app)
+    init_account_registry(app)
+    init_fingerprints(app)
+
+    # asset_url() en las plantillas (recursos compilados por `flask build-assets`)
+    init_assets(app)
+
+    # Huecos para flujos SSE en este worker (cada uno retiene un hilo)
+    app.extensions['sse_streams'] = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+
+    app.register_blueprint(main)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(snapshot_cli)
+    app.cli.add_command(accounts_cli)
+    app.cli.add_command(fingerprints_cli)
+    app.cli.add_command(build_assets_command)
+
+    elapsed = time.perf_counter() - started
+    APP_STARTUP_SECONDS.set(elapsed)
+    logger.info("SocialMan App startup (%s) en %.1f ms", config_name, elapsed * 1000)
+    return app
+
+# Paginación y rangos de los endpoints por fecha
+MAX_PER_PAGE = 100
+# Con 4 trozos de 16 bits, hasta 15 se consultan como mucho 697 claves por trozo
+MAX_SIMILAR_DISTANCE = 15
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,100}$')
+HISTOGRAM_DEFAULT_DAYS = {'day': 30, 'week': 7 * 12, 'month': 365}
+HISTOGRAM_MAX_DAYS = {'day': 366, 'week': 7 * 260, 'month': 365 * 20}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/')
+@main.route('/')
 def index():
     """Página principal"""
     return render_template('index.html')
 
-@app.route('/api/videos', methods=['GET'])
+@main.route('/api/videos', methods=['GET'])
 def get_videos():
-    """Obtener lista de videos"""
+    """Obtener lista de videos (completa, paginada con page/per_page o en streaming)"""
+    try:
+        stream_format = requested_stream_format()
+        page = request.args.get('page', type=int)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        include_facets = request.args.get('facets', '').lower() in ['true', '1', 'yes']
+        if stream_format and include_facets:
+            raise ValueError('facets no está disponible en streaming')
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros no válidos: {e}'}), 400
     try:
         search = request.args.get('search', '')
         tag = request.args.get('tag', '')
         sort_by = request.args.get('sort_by', 'date')
         order = request.args.get('order', 'desc')
         
-        videos = video_service.get_videos(search, tag, sort_by, order)
-        return jsonify({'data': videos})
+        if stream_format:
+            videos = video_service.iter_videos(
+                search, tag, sort_by, order, current_app.config['STREAM_BATCH_SIZE']
+            )
+            return stream_response(videos, stream_format)
+        
+        if page is not None:
+            result = video_service.get_videos_page(search, tag, sort_by, order, max(page, 1), per_page)
+            response = {'data': result['videos'], 'pagination': result['pagination']}
+        else:
+            response = {'data': video_service.get_videos(search, tag, sort_by, order)}
+        if include_facets:
+            # Recuentos para los filtros calculados en SQL (facets=1)
+            response['facets'] = video_service.get_video_facets(
+                search, tag, current_app.config['FACET_TAGS_LIMIT']
+            )
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/videos', methods=['POST'])
+@main.route('/api/videos', methods=['POST'])
 def upload_video():
     """Subir un nuevo video"""
     try:
-        print("🔍 Recibida solicitud POST a /api/videos")
-        print(f"   - Content-Type: {request.content_type}")
-        print(f"   - Files: {list(request.files.keys())}")
-        print(f"   - Form data: {list(request.form.keys())}")
+        # Sin leer request.files ni request.form: el cuerpo se procesa después
+        logger.debug("Recibida solicitud POST a /api/videos (Content-Type: %s, %s bytes)",
+                     request.content_type, request.content_length)
         
         if 'video' not in request.files:
-            print("❌ Error: No se proporcionó archivo de video")
+            logger.info("Subida rechazada: no se proporcionó archivo de video")
             return jsonify({'error': 'No se proporcionó archivo de video'}), 400
         
         file = request.files['video']
-        print(f"   - Archivo recibido: {file.filename}")
-        print(f"   - Tamaño del archivo: {file.content_length if hasattr(file, 'content_length') else 'N/A'}")
         
         if file.filename == '':
-            print("❌ Error: No se seleccionó archivo")
+            logger.info("Subida rechazada: no se seleccionó archivo")
             return jsonify({'error': 'No se seleccionó archivo'}), 400
         
         if not allowed_file(file.filename):
-            print(f"❌ Error: Formato de archivo no permitido: {file.filename}")
+            logger.info("Subida rechazada: formato de archivo no permitido (%s)", file.filename)
             return jsonify({'error': 'Formato de archivo no permitido'}), 400
         
         title = request.form.get('title', '').strip()
         description = request.form.get('description', '').strip()
         tags = request.form.get('tags', '').strip()
         
-        print(f"   - Título: {title}")
-        print(f"   - Descripción: {description}")
-        print(f"   - Tags: {tags}")
+        logger.debug("Archivo %s, título %r, tags %r", file.filename, title, tags)
         
         if not title:
-            print("❌ Error: El título es obligatorio")
+            logger.info("Subida rechazada: el título es obligatorio")
             return jsonify({'error': 'El título es obligatorio'}), 400
         
-        print("✅ Datos válidos, procediendo con la subida...")
         video_data = video_service.upload_video(file, title, description, tags)
-        print(f"✅ Video subido exitosamente con ID: {video_data.get('id')}")
+        logger.info("Video subido con ID %s", video_data.get('id'),
+                    extra={'video_id': video_data.get('id')})
         return jsonify({'data': video_data}), 201
         
+    except UnsupportedMediaType as e:
+        # El contenido no es un video: se detecta con los primeros bytes
+        return jsonify({'error': e.description}), 415
+    except Exception as e:
+        logger.exception("Error inesperado en la subida de video")
+        return jsonify({'error': str(e)}), 500
+
+def _parse_date(value, end_of_range=False):
+    """
+    Convertir un parámetro ISO (YYYY-MM-DD o fecha y hora) a datetime. Una
+    fecha sin hora como fin de rango incluye el día completo.
+    """
+    parsed = datetime.fromisoformat(value)
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.replace(tzinfo=None)
+
+def _date_range_args(default_days):
+    """Rango [start, end) de la query string; por defecto los últimos días"""
+    end = request.args.get('end')
+    start = request.args.get('start')
+    end_date = _parse_date(end, end_of_range=True) if end else datetime.utcnow()
+    start_date = _parse_date(start) if start else end_date - timedelta(days=default_days)
+    if start_date >= end_date:
+        raise ValueError('La fecha de inicio debe ser anterior a la de fin')
+    return start_date, end_date
+
+@main.route('/api/videos/date-range', methods=['GET'])
+def get_videos_by_date_range():
+    """Obtener videos subidos en un rango de fechas (paginado, o completo en streaming)"""
+    try:
+        start_date, end_date = _date_range_args(default_days=30)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        stream_format = requested_stream_format()
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros no válidos: {e}'}), 400
+    try:
+        if stream_format:
+            videos = video_service.iter_videos_by_date_range(
+                start_date, end_date, current_app.config['STREAM_BATCH_SIZE']
+            )
+            return stream_response(videos, stream_format)
+        result = video_service.search_videos_by_date_range(start_date, end_date, page, per_page)
+        return jsonify({'data': result['videos'], 'pagination': result['pagination']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/videos/histogram', methods=['GET'])
+def get_upload_histogram():
+    """Obtener subidas (número y bytes) por día, semana o mes"""
+    interval = request.args.get('interval', 'day')
+    if interval not in HISTOGRAM_INTERVALS:
+        return jsonify({'error': f'Intervalo no válido (usar {", ".join(HISTOGRAM_INTERVALS)})'}), 400
+    try:
+        start_date, end_date = _date_range_args(default_days=HISTOGRAM_DEFAULT_DAYS[interval])
+        if (end_date - start_date).days > HISTOGRAM_MAX_DAYS[interval]:
+            raise ValueError('Rango demasiado amplio para el intervalo')
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros no válidos: {e}'}), 400
+    try:
+        histogram = video_service.get_upload_histogram(start_date, end_date, interval)
+        return jsonify({'data': histogram, 'interval': interval})
     except Exception as e:
-        print(f"❌ Error inesperado: {str(e)}")
-        import traceback
-        traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/videos/<int:video_id>', methods=['GET'])
+@main.route('/api/videos/<int:video_id>', methods=['GET'])
 def get_video(video_id):
     """Obtener un video específico"""
     try:
@@ -146,7 +287,7 @@ def get_video(video_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/videos/<int:video_id>', methods=['DELETE'])
+@main.route('/api/videos/<int:video_id>', methods=['DELETE'])
 def delete_video(video_id):
     """Eliminar un video"""
     try:
@@ -157,7 +298,7 @@ def delete_video(video_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/videos/<int:video_id>/delete', methods=['DELETE'])
+@main.route('/api/videos/<int:video_id>/delete', methods=['DELETE'])
 def delete_video_endpoint(video_id):
     """Eliminar un video (endpoint alternativo)"""
     try:
@@ -168,7 +309,67 @@ def delete_video_endpoint(video_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/videos/<int:video_id>/publish', methods=['POST'])
+@main.route('/api/videos/<int:video_id>/metadata', methods=['GET'])
+def get_video_metadata(video_id):
+    """Obtener metadatos del video y su compatibilidad con cada plataforma"""
+    try:
+        metadata = video_service.get_video_metadata(video_id)
+        if not metadata:
+            return jsonify({'error': 'Metadatos no disponibles para este video'}), 404
+        return jsonify({'data': metadata})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/videos/<int:video_id>/similar', methods=['GET'])
+def get_similar_videos(video_id):
+    """Videos casi duplicados (copias recodificadas o recortadas)"""
+    try:
+        max_distance = request.args.get('max_distance', type=int)
+        limit = min(request.args.get('limit', 20, type=int), MAX_PER_PAGE)
+        if max_distance is not None and not 0 <= max_distance <= MAX_SIMILAR_DISTANCE:
+            return jsonify({'error': f'max_distance debe estar entre 0 y {MAX_SIMILAR_DISTANCE}'}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+        result = video_service.get_similar_videos(video_id, max_distance, limit)
+        if result is None:
+            return jsonify({'error': 'Video no encontrado'}), 404
+        return jsonify({'data': result})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/fingerprints/stats', methods=['GET'])
+def get_fingerprint_stats():
+    """Tamaño del índice de huellas de este worker"""
+    return jsonify({'data': fingerprint_index.stats()})
+
+@main.route('/api/renditions/stats', methods=['GET'])
+def get_rendition_stats():
+    """Uso de disco y aciertos/fallos de la caché de versiones recodificadas"""
+    return jsonify({'data': rendition_cache.stats()})
+
+@main.route('/api/platforms/limits', methods=['GET'])
+def get_platform_limits():
+    """Obtener los límites publicados de cada plataforma"""
+    limits = {
+        platform: {key: sorted(value) if isinstance(value, set) else value
+                   for key, value in platform_limits.items()}
+        for platform, platform_limits in PLATFORM_LIMITS.items()
+    }
+    return jsonify({'data': limits, 'version': LIMITS_VERSION})
+
+@main.route('/api/platforms/accounts', methods=['GET'])
+def get_platform_accounts():
+    """Cuentas de cada plataforma con su concurrencia y cuota (sin credenciales)"""
+    try:
+        query = PlatformAccount.query.order_by(PlatformAccount.platform, PlatformAccount.id)
+        platform = request.args.get('platform')
+        if platform:
+            query = query.filter(PlatformAccount.platform == platform)
+        return jsonify({'data': [account.to_dict() for account in query]})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/videos/<int:video_id>/publish', methods=['POST'])
 def publish_video(video_id):
     """Publicar video en redes sociales"""
     try:
@@ -178,13 +379,95 @@ def publish_video(video_id):
         if not platforms:
             return jsonify({'error': 'No se especificaron plataformas'}), 400
         
-        result = social_service.publish_video(video_id, platforms)
+        # Los reintentos con la misma clave devuelven el resultado guardado
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip() or None
+        if idempotency_key and not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+            return jsonify({'error': 'Idempotency-Key no válida (hasta 100 letras, números o -_.:)'}), 400
+        
+        # Cuentas que se pueden usar (por defecto todas las de cada plataforma)
+        brand = (data.get('brand') or '').strip() or None
+        account_ids = data.get('account_ids') or None
+        if account_ids is not None and not (
+            isinstance(account_ids, list) and all(isinstance(account_id, int) for account_id in account_ids)
+        ):
+            return jsonify({'error': 'account_ids debe ser una lista de ids de cuenta'}), 400
+        
+        result = social_service.publish_video(video_id, platforms, idempotency_key, brand, account_ids)
         # Devolver solo el array de resultados de plataformas
         return jsonify({'data': result.get('platforms', [])})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analytics', methods=['GET'])
+def _sse_message(event_name, data):
+    """Formatear un mensaje de Server-Sent Events"""
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+def _publication_stream(video_id=None):
+    """
+    Respuesta SSE con los cambios de estado de publicaciones. El generador no
+    usa la sesión de base de datos, así que no retiene conexiones del pool.
+    Con todos los huecos SSE del worker ocupados responde 503 en el acto.
+    """
+    config = current_app.config
+    heartbeat = config['SSE_HEARTBEAT_SECONDS']
+    max_seconds = config['SSE_MAX_STREAM_SECONDS']
+
+    slots = current_app.extensions['sse_streams']
+    if not slots.acquire(blocking=False):
+        retry_seconds = config['SSE_BUSY_RETRY_SECONDS']
+        return Response(f"retry: {retry_seconds * 1000}\n\n", status=503, mimetype='text/event-stream', headers={
+            'Retry-After': str(retry_seconds),
+            'Cache-Control': 'no-cache'
+        })
+
+    try:
+        # Suscribirse antes de leer el estado actual para no perder transiciones
+        subscription = publication_events.subscribe(db.engine, video_id)
+        snapshot = social_service.get_publication_status(video_id) if video_id else []
+    except Exception:
+        slots.release()
+        raise
+
+    def generate():
+        # El navegador reconecta solo al cerrarse el flujo (EventSource)
+        yield 'retry: 3000\n\n'
+        for publication in snapshot:
+            yield _sse_message('snapshot', publication)
+
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            try:
+                event_data = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield _sse_message('publication', event_data)
+
+    def close():
+        publication_events.unsubscribe(subscription)
+        slots.release()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Se llama al cerrar la respuesta aunque el generador no llegue a empezar
+    response.call_on_close(close)
+    return response
+
+@main.route('/api/videos/<int:video_id>/publications/stream', methods=['GET'])
+def stream_video_publications(video_id):
+    """Flujo SSE con el estado de las publicaciones de un video"""
+    if not db.session.get(Video, video_id):
+        return jsonify({'error': 'Video no encontrado'}), 404
+    return _publication_stream(video_id)
+
+@main.route('/api/publications/stream', methods=['GET'])
+def stream_publications():
+    """Flujo SSE con el estado de todas las publicaciones de la cuenta"""
+    return _publication_stream()
+
+@main.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Obtener estadísticas de la aplicación"""
     try:
@@ -193,7 +476,20 @@ def get_analytics():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/tags', methods=['GET'])
+@main.route('/api/analytics/publications', methods=['GET'])
+def get_publication_analytics():
+    """Tasa de éxito, motivos de fallo y latencias por plataforma"""
+    window = request.args.get('window', '7d')
+    if window not in WINDOWS:
+        return jsonify({'error': f'Ventana no válida (usar {", ".join(WINDOWS)})'}), 400
+    try:
+        # Los agregados se actualizan por cron; aquí solo si están obsoletos
+        publication_analytics.refresh_if_stale()
+        return jsonify({'data': publication_analytics.get_analytics(window)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/tags', methods=['GET'])
 def get_tags():
     """Obtener lista de tags disponibles"""
     try:
@@ -202,10 +498,37 @@ def get_tags():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/uploads/<filename>')
+@main.route('/api/tags/suggest', methods=['GET'])
+def suggest_tags():
+    """Autocompletar tags por prefijo (ordenados por uso)"""
+    try:
+        prefix = request.args.get('prefix', '')
+        limit = request.args.get('limit', type=int)
+        return jsonify({'data': video_service.suggest_tags(prefix, limit)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/uploads/<filename>')
 def uploaded_file(filename):
-    """Servir archivos de video subidos"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Servir archivos de video subidos (promoviéndolos si están en el nivel frío)"""
+    video = Video.query.filter_by(filename=filename).first()
+    if video is not None:
+        try:
+            storage_tiers.ensure_hot(video)
+        except FileNotFoundError:
+            return jsonify({'error': 'Archivo no encontrado'}), 404
+        # Los reproductores piden el video por rangos: solo cuenta el primero
+        ranges = request.range.ranges if request.range else None
+        if not ranges or ranges[0][0] == 0:
+            storage_tiers.record_access(video.id, video.last_accessed_at)
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+app = create_app()
 
 if __name__ == '__main__':
+    # En desarrollo local se aplican las migraciones antes de arrancar
+    from migrations.runner import MigrationRunner
+    with app.app_context():
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        MigrationRunner(db.engine).upgrade()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
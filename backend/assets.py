@@ -0,0 +1,135 @@
+"""
+Recursos estáticos con huella, minificados y precomprimidos
+
+`flask --app app build-assets` genera en static/dist/ una copia minificada
+de cada recurso con el hash del contenido en el nombre (style.<hash>.css),
+sus versiones .gz y .br y un manifest.json con la correspondencia. nginx
+sirve static/dist/ directamente (sin pasar por gunicorn) con caché
+inmutable de un año: si el contenido cambia, cambia la URL.
+
+Las plantillas no escriben las rutas a mano sino {{ asset_url('style.css') }},
+que consulta el manifiesto; sin compilar (desarrollo) devuelve el archivo
+original de static/.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+ASSETS = ('style.css', 'script.js')
+
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+HASH_LENGTH = 12
+
+class AssetManifest:
+    """Manifiesto compilado, recargado solo cuando cambia el archivo"""
+
+    def __init__(self):
+        self._path = None
+        self._mtime = None
+        self._entries = {}
+
+    def resolve(self, static_folder, filename):
+        path = os.path.join(static_folder, DIST_FOLDER, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return filename
+        if path != self._path or mtime != self._mtime:
+            with open(path) as manifest_file:
+                self._entries = json.load(manifest_file)
+            self._path, self._mtime = path, mtime
+        return self._entries.get(filename, filename)
+
+asset_manifest = AssetManifest()
+
+def asset_url(filename):
+    """URL del recurso compilado (o del original si no hay compilación)"""
+    return url_for('static', filename=asset_manifest.resolve(current_app.static_folder, filename))
+
+def init_assets(app):
+    """Registrar asset_url en las plantillas"""
+    app.add_template_global(asset_url)
+
+def _minify(filename, source):
+    # Solo hacen falta al compilar, no en los workers
+    from rcssmin import cssmin
+    from rjsmin import jsmin
+
+    if filename.endswith('.css'):
+        return cssmin(source)
+    if filename.endswith('.js'):
+        return jsmin(source)
+    return source
+
+def _write(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+def build_assets(static_folder):
+    """
+    Compilar ASSETS en static/dist/ y devolver el manifiesto. Se conservan
+    los archivos del manifiesto anterior para las páginas ya servidas.
+    """
+    import brotli
+
+    dist_folder = os.path.join(static_folder, DIST_FOLDER)
+    os.makedirs(dist_folder, exist_ok=True)
+    manifest_path = os.path.join(dist_folder, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as manifest_file:
+            previous = json.load(manifest_file)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    for filename in ASSETS:
+        with open(os.path.join(static_folder, filename), encoding='utf-8') as source_file:
+            minified = _minify(filename, source_file.read()).encode('utf-8')
+        digest = hashlib.sha256(minified).hexdigest()[:HASH_LENGTH]
+        name, extension = os.path.splitext(filename)
+        built_name = f"{name}.{digest}{extension}"
+        path = os.path.join(dist_folder, built_name)
+        if not os.path.exists(path):
+            _write(path, minified)
+            # mtime=0: misma salida en cada compilación del mismo contenido
+            _write(f"{path}.gz", gzip.compress(minified, compresslevel=9, mtime=0))
+            _write(f"{path}.br", brotli.compress(minified, mode=brotli.MODE_TEXT))
+        manifest[filename] = f"{DIST_FOLDER}/{built_name}"
+
+    # El manifiesto se escribe el último: hasta entonces se sirven los anteriores
+    _write(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+
+    keep = {os.path.basename(path) for path in list(manifest.values()) + list(previous.values())}
+    for entry in os.scandir(dist_folder):
+        base = entry.name
+        for suffix in ('.gz', '.br'):
+            base = base.removesuffix(suffix)
+        if entry.name != MANIFEST_NAME and base not in keep:
+            os.remove(entry.path)
+    return manifest
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Minificar, añadir huella y precomprimir los recursos estáticos"""
+    static_folder = current_app.static_folder
+    for filename, built in build_assets(static_folder).items():
+        path = os.path.join(static_folder, built)
+        click.echo(
+            f"{filename} -> {built} ({os.path.getsize(os.path.join(static_folder, filename))} B, "
+            f"min {os.path.getsize(path)} B, gzip {os.path.getsize(path + '.gz')} B, "
+            f"br {os.path.getsize(path + '.br')} B)"
+        )
@@ -0,0 +1,120 @@
+"""
+Generación de catálogos sintéticos de videos para los benchmarks
+
+Los datos se generan de forma determinista (semilla fija) y se insertan en
+lotes con INSERT multi-fila, de modo que un catálogo de 1M de videos se crea
+en minutos y dos ejecuciones producen exactamente el mismo contenido.
+"""
+
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from models import db, Video, Publication, VideoTag, VideoTagMap
+
+PLATFORMS = ['instagram', 'tiktok', 'facebook', 'twitter']
+STATUSES = ['published', 'published', 'published', 'failed', 'pending']
+WORDS = [
+    'viaje', 'receta', 'tutorial', 'baile', 'concierto', 'partido', 'entrevista',
+    'resumen', 'unboxing', 'review', 'vlog', 'paisaje', 'evento', 'clase', 'demo'
+]
+TAG_VOCABULARY = [f'tag{i}' for i in range(200)]
+
+BATCH_SIZE = 10000
+START_DATE = datetime(2022, 1, 1)
+DATE_SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+def _video_rows(count, rng):
+    """Generar filas de la tabla videos"""
+    for index in range(1, count + 1):
+        upload_date = START_DATE + timedelta(seconds=rng.randrange(DATE_SPAN_SECONDS))
+        tags = rng.sample(TAG_VOCABULARY, rng.randint(1, 5))
+        title = f"{rng.choice(WORDS)} {rng.choice(WORDS)} video {index}"
+        filename = f"bench_{index:08d}.mp4"
+        yield {
+            'id': index,
+            'title': title,
+            'description': f"Descripción sintética del {title}",
+            'filename': filename,
+            'original_filename': filename,
+            'file_path': f"static/uploads/{filename}",
+            'file_size': rng.randint(256 * 1024, 100 * 1024 * 1024),
+            'duration': round(rng.uniform(5, 600), 2),
+            'tags': ','.join(tags),
+            'upload_date': upload_date,
+            'created_at': upload_date,
+            'updated_at': upload_date
+        }
+
+def _publication_rows(video_count, publications_per_video, rng):
+    """Generar filas de la tabla publications"""
+    for video_id in range(1, video_count + 1):
+        # Número de publicaciones alrededor de la media configurada
+        count = min(len(PLATFORMS), int(rng.expovariate(1 / publications_per_video))) \
+            if publications_per_video else 0
+        for platform in rng.sample(PLATFORMS, count):
+            created_at = START_DATE + timedelta(seconds=rng.randrange(DATE_SPAN_SECONDS))
+            status = rng.choice(STATUSES)
+            yield {
+                'video_id': video_id,
+                'platform': platform,
+                'platform_post_id': f"{platform}_{video_id}" if status == 'published' else None,
+                'status': status,
+                'message': 'Publicado exitosamente' if status == 'published' else None,
+                'published_at': created_at if status == 'published' else None,
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+
+def _insert_in_batches(table, rows):
+    """Insertar filas en lotes para no cargar todo el catálogo en memoria"""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        total += len(batch)
+    db.session.commit()
+    return total
+
+def build_catalog(video_count, publications_per_video=1.5, seed=42):
+    """
+    Crear un catálogo sintético de `video_count` videos con sus publicaciones
+    y estadísticas de tags. Debe llamarse dentro de un contexto de aplicación
+    con las tablas ya creadas y vacías.
+    """
+    rng = random.Random(seed)
+    tag_counts = Counter()
+    tag_links = []
+
+    def videos_with_tag_count():
+        for row in _video_rows(video_count, rng):
+            tags = row['tags'].split(',')
+            tag_counts.update(tags)
+            tag_links.extend({'video_id': row['id'], 'tag': tag} for tag in tags)
+            yield row
+
+    _insert_in_batches(Video.__table__, videos_with_tag_count())
+    # Copia normalizada de videos.tags (filtro por tag y facetas)
+    _insert_in_batches(VideoTagMap.__table__, tag_links)
+    publications = _insert_in_batches(
+        Publication.__table__,
+        _publication_rows(video_count, publications_per_video, rng)
+    )
+
+    now = datetime.utcnow()
+    _insert_in_batches(VideoTag.__table__, (
+        {'tag': tag, 'usage_count': count, 'created_at': now, 'updated_at': now}
+        for tag, count in tag_counts.items()
+    ))
+
+    return {
+        'videos': video_count,
+        'publications': publications,
+        'tags': len(tag_counts)
+    }
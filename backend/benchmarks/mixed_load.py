@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga mixta: workers sync frente a workers con hilos
+
+Levanta gunicorn dos veces sobre la misma base de datos SQLite temporal, una
+con workers sync y otra con gthread, y en cada caso lanza el generador de
+carga de debug_upload.py con una mezcla de publicaciones lentas (los
+publishers simulados duermen 0.8-1.5 s), subidas y lecturas rápidas. Compara
+throughput y latencias por endpoint; con workers sync las lecturas quedan
+bloqueadas detrás de las publicaciones.
+
+Uso:
+    cd backend
+    python -m benchmarks.mixed_load --workers 2 --threads 8 --duration 20
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from debug_upload import LoadTest, parse_args as parse_load_args  # noqa: E402
+
+# Credenciales ficticias: activan la latencia simulada de los publishers
+# sin llamar a ninguna API externa
+FAKE_CREDENTIALS = {
+    'INSTAGRAM_ACCESS_TOKEN': 'bench',
+    'INSTAGRAM_BUSINESS_ACCOUNT_ID': 'bench',
+    'TIKTOK_ACCESS_TOKEN': 'bench',
+    'TWITTER_BEARER_TOKEN': 'bench'
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/analytics", timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"gunicorn no respondió en {base_url}")
+
+def run_mode(worker_class, options, env):
+    """Arrancar gunicorn con la clase de worker dada y medir la carga"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server_env = dict(
+        env,
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKERS=str(options.workers),
+        GUNICORN_WORKER_CLASS=worker_class,
+        # gunicorn cambia sync por gthread si threads > 1
+        GUNICORN_THREADS=str(options.threads if worker_class == 'gthread' else 1)
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=BACKEND_DIR, env=server_env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(base_url)
+        load_options = parse_load_args([
+            'load', '--base-url', base_url,
+            '--concurrency', str(options.concurrency),
+            '--duration', str(options.duration),
+            '--mix', options.mix,
+            '--video-size-mb', str(options.video_size_mb),
+            '--output', os.devnull
+        ])
+        print(f"\n⚙️  Workers {worker_class} ({options.workers} procesos"
+              f"{f' x {options.threads} hilos' if worker_class == 'gthread' else ''})")
+        return LoadTest(load_options).run()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Comparar workers sync y gthread bajo carga mixta')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', default='publish=2,upload=1,list=4,analytics=2')
+    parser.add_argument('--video-size-mb', type=float, default=1)
+    parser.add_argument('--output', default='mixed_load_results.json')
+    options = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='socialman-mixed-')
+    env = dict(
+        os.environ,
+        **FAKE_CREDENTIALS,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'mixed.db')}",
+        UPLOAD_FOLDER=os.path.join(workdir, 'uploads')
+    )
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    try:
+        # Crear el esquema una sola vez antes de arrancar los workers
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'],
+                       cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        results = {mode: run_mode(mode, options, env) for mode in ('sync', 'gthread')}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'Endpoint':<34}{'sync p95':>12}{'gthread p95':>14}{'sync req/s':>12}{'gthread req/s':>15}")
+    endpoints = sorted(set(results['sync']['endpoints']) | set(results['gthread']['endpoints']))
+    for endpoint in endpoints:
+        sync = results['sync']['endpoints'].get(endpoint, {})
+        gthread = results['gthread']['endpoints'].get(endpoint, {})
+        print(f"{endpoint:<34}{sync.get('p95_ms', 0):>12.1f}{gthread.get('p95_ms', 0):>14.1f}"
+              f"{sync.get('throughput_rps', 0):>12.1f}{gthread.get('throughput_rps', 0):>15.1f}")
+    print(f"{'TOTAL':<34}{results['sync']['total']['p95_ms'] or 0:>12.1f}"
+          f"{results['gthread']['total']['p95_ms'] or 0:>14.1f}"
+          f"{results['sync']['total']['throughput_rps']:>12.1f}"
+          f"{results['gthread']['total']['throughput_rps']:>15.1f}")
+
+    with open(options.output, 'w') as f:
+        json.dump({'options': vars(options), 'results': results}, f, indent=2)
+    print(f"\n💾 Resultados guardados en {options.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,15 +22,37 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Hilos por worker de gunicorn (mismo valor por defecto que gunicorn.conf.py)
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', '8'))
+    
+    # Pool de conexiones (por worker de gunicorn: workers * (size + overflow)
+    # no debe superar max_connections de PostgreSQL). Con workers gthread
+    # cada hilo necesita su conexión, así que por defecto size = GUNICORN_THREADS.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', str(GUNICORN_THREADS)))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() in ['true', '1', 'yes']
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': DB_POOL_PRE_PING}
+    if not DATABASE_URL.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update({
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE
+        })
+    
+    # Réplica de lectura opcional; las lecturas vuelven al primario durante
+    # REPLICA_STICKINESS_SECONDS tras una escritura del mismo cliente
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    REPLICA_STICKINESS_SECONDS = int(os.environ.get('REPLICA_STICKINESS_SECONDS', '5'))
+    
     # Configuración de archivos
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'static/uploads'
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB máximo por archivo
     
-    # Crear directorio de uploads si no existe
-    upload_path = os.path.join(os.path.dirname(__file__), UPLOAD_FOLDER)
-    if not os.path.exists(upload_path):
-        os.makedirs(upload_path)
-    
     # Configuración de AWS (para futuro uso)
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
@@ -58,11 +80,133 @@ class Config:
     TWITTER_ACCESS_TOKEN_SECRET = os.environ.get('TWITTER_ACCESS_TOKEN_SECRET')
     TWITTER_BEARER_TOKEN = os.environ.get('TWITTER_BEARER_TOKEN')
     
+    # Endpoints de las APIs (se pueden apuntar a fake_platform_server.py)
+    TWITTER_UPLOAD_URL = os.environ.get('TWITTER_UPLOAD_URL', 'https://upload.twitter.com/1.1/media/upload.json')
+    TWITTER_API_URL = os.environ.get('TWITTER_API_URL', 'https://api.twitter.com')
+    FACEBOOK_GRAPH_VIDEO_URL = os.environ.get('FACEBOOK_GRAPH_VIDEO_URL', 'https://graph-video.facebook.com/v18.0')
+    TIKTOK_API_URL = os.environ.get('TIKTOK_API_URL', 'https://open.tiktokapis.com')
+    
+    # Subida del archivo por partes (X, Facebook, TikTok). Solo las plataformas
+    # de CHUNKED_UPLOAD_PLATFORMS suben el video real; el resto se simula.
+    # El estado de cada subida se guarda para reanudarla tras un fallo
+    CHUNKED_UPLOAD_PLATFORMS = [
+        platform.strip() for platform in os.environ.get('CHUNKED_UPLOAD_PLATFORMS', '').split(',')
+        if platform.strip()
+    ]
+    CHUNKED_UPLOAD_STATE_DIR = os.environ.get('CHUNKED_UPLOAD_STATE_DIR', 'instance/chunked_uploads')
+    CHUNKED_UPLOAD_WORKERS = int(os.environ.get('CHUNKED_UPLOAD_WORKERS', '4'))
+    CHUNKED_UPLOAD_RETRIES = int(os.environ.get('CHUNKED_UPLOAD_RETRIES', '5'))
+    # Tamaño de parte en bytes (vacío = el recomendado por cada plataforma)
+    CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE') or 0) or None
+    
+    # Caché de versiones recodificadas para cada plataforma (clave: checksum
+    # del original y preset) con presupuesto de disco y expulsión LRU
+    RENDITION_CACHE_DIR = os.environ.get('RENDITION_CACHE_DIR', 'instance/renditions')
+    RENDITION_CACHE_MAX_MB = int(os.environ.get('RENDITION_CACHE_MAX_MB', '5120'))
+    
+    # Niveles de almacenamiento: los videos sin descargas ni publicaciones en
+    # STORAGE_COLD_AFTER_DAYS pasan a COLD_STORAGE_FOLDER (`flask storage demote`)
+    # y vuelven a UPLOAD_FOLDER al usarse
+    COLD_STORAGE_FOLDER = os.environ.get('COLD_STORAGE_FOLDER', 'cold_storage')
+    COLD_STORAGE_COMPRESS = os.environ.get('COLD_STORAGE_COMPRESS', 'False').lower() in ['true', '1', 'yes']
+    STORAGE_COLD_AFTER_DAYS = int(os.environ.get('STORAGE_COLD_AFTER_DAYS', '30'))
+    STORAGE_ACCESS_TOUCH_SECONDS = int(os.environ.get('STORAGE_ACCESS_TOUCH_SECONDS', '3600'))
+    STORAGE_DEMOTE_BATCH_SIZE = int(os.environ.get('STORAGE_DEMOTE_BATCH_SIZE', '50'))
+    STORAGE_DEMOTE_BATCH_PAUSE_SECONDS = float(os.environ.get('STORAGE_DEMOTE_BATCH_PAUSE_SECONDS', '1'))
+    
+    # Copias de seguridad del catálogo (`flask snapshot create|restore`): las
+    # instantáneas incrementales solo copian los videos modificados
+    SNAPSHOT_FOLDER = os.environ.get('SNAPSHOT_FOLDER', 'snapshots')
+    SNAPSHOT_WORKERS = int(os.environ.get('SNAPSHOT_WORKERS', '4'))
+    
+    # Flujo de eventos de publicaciones (Server-Sent Events). Cada flujo
+    # ocupa un hilo de gunicorn; se cierra tras SSE_MAX_STREAM_SECONDS y el
+    # navegador reconecta automáticamente. Cada worker admite como mucho
+    # SSE_MAX_STREAMS flujos a la vez (por defecto una cuarta parte de sus
+    # hilos, para que el resto siga atendiendo la API); con todos ocupados
+    # responde 503 y el navegador lo reintenta pasados SSE_BUSY_RETRY_SECONDS
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+    SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', str(max(1, GUNICORN_THREADS // 4))))
+    SSE_BUSY_RETRY_SECONDS = int(os.environ.get('SSE_BUSY_RETRY_SECONDS', '10'))
+
+    # Listados en streaming (?stream=ndjson|json): filas leídas por lote del
+    # cursor del servidor; la memoria por worker depende de este valor
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '500'))
+    
+    # Facetas de /api/videos (?facets=1): tags más frecuentes devueltos
+    FACET_TAGS_LIMIT = int(os.environ.get('FACET_TAGS_LIMIT', '100'))
+    
     # Configuración de CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
     
     # Configuración de logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # json (una línea JSON por evento) o text
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    # Archivo de log (por defecto stderr); se escribe desde un hilo en segundo plano
+    LOG_FILE = os.environ.get('LOG_FILE')
+    # Eventos en espera de escribirse; si se llena se descartan en vez de bloquear
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+    # Fracción de eventos DEBUG que se registran (1.0 = todos)
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+    
+    # Configuración de métricas (Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    
+    # Instrumentación de consultas SQL y detector de N+1
+    QUERY_PROFILING_ENABLED = os.environ.get('QUERY_PROFILING_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+    QUERY_PROFILE_TOP_N = int(os.environ.get('QUERY_PROFILE_TOP_N', '5'))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+    # Cabecera Server-Timing con el tiempo de base de datos (solo fuera de producción)
+    SERVER_TIMING_ENABLED = True
+    
+    # Autocompletado de tags: sugerencias máximas y cada cuánto se leen los
+    # cambios hechos por otros workers
+    TAG_SUGGESTIONS_MAX = int(os.environ.get('TAG_SUGGESTIONS_MAX', '10'))
+    TAG_INDEX_REFRESH_SECONDS = int(os.environ.get('TAG_INDEX_REFRESH_SECONDS', '30'))
+    
+    # Analíticas de publicaciones: antigüedad máxima de los agregados antes
+    # de recalcularlos al consultar (el cron `flask analytics refresh` los
+    # mantiene al día)
+    ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYTICS_MAX_STALENESS_SECONDS', '60'))
+    
+    # Particiones mensuales de publications (PostgreSQL): meses futuros creados
+    # por adelantado y meses conservados antes de archivar (0 = no archivar)
+    PUBLICATIONS_PARTITION_MONTHS_AHEAD = int(os.environ.get('PUBLICATIONS_PARTITION_MONTHS_AHEAD', '3'))
+    PUBLICATIONS_RETENTION_MONTHS = int(os.environ.get('PUBLICATIONS_RETENTION_MONTHS', '24'))
+    
+    # Publicaciones idempotentes: cuánto se guarda el resultado de cada
+    # Idempotency-Key, cuánto espera una petición repetida al resultado de la
+    # que está en curso y cuándo se da por abandonada una operación en curso
+    # (la fila se renueva cada cuarto de ese tiempo mientras el worker vive)
+    PUBLISH_IDEMPOTENCY_TTL_HOURS = int(os.environ.get('PUBLISH_IDEMPOTENCY_TTL_HOURS', '24'))
+    PUBLISH_WAIT_SECONDS = int(os.environ.get('PUBLISH_WAIT_SECONDS', '60'))
+    PUBLISH_INFLIGHT_TIMEOUT_SECONDS = int(os.environ.get('PUBLISH_INFLIGHT_TIMEOUT_SECONDS', '300'))
+    
+    # Cuentas de las plataformas (`flask accounts add`): cada cuánto se
+    # recargan sus credenciales en cada worker, cuánto espera una
+    # publicación a que alguna cuenta tenga un hueco libre y cuándo caduca
+    # la reserva de un worker caído (se renueva cada cuarto de ese tiempo)
+    PLATFORM_ACCOUNTS_REFRESH_SECONDS = int(os.environ.get('PLATFORM_ACCOUNTS_REFRESH_SECONDS', '60'))
+    PLATFORM_ACCOUNT_WAIT_SECONDS = int(os.environ.get('PLATFORM_ACCOUNT_WAIT_SECONDS', '30'))
+    PLATFORM_ACCOUNT_LEASE_SECONDS = int(os.environ.get('PLATFORM_ACCOUNT_LEASE_SECONDS', '120'))
+    
+    # Huellas perceptuales (videos casi duplicados): fotogramas clave por
+    # video, distancia de Hamming máxima entre fotogramas equivalentes,
+    # similitud a partir de la cual se avisa al subir, tiempo máximo de
+    # ffmpeg (se calculan durante la subida: muy por debajo de
+    # GUNICORN_TIMEOUT) y cada cuánto lee cada worker las huellas nuevas o
+    # reconstruye su índice
+    FINGERPRINTS_ENABLED = os.environ.get('FINGERPRINTS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    FINGERPRINT_MAX_FRAMES = int(os.environ.get('FINGERPRINT_MAX_FRAMES', '32'))
+    FINGERPRINT_MAX_DISTANCE = int(os.environ.get('FINGERPRINT_MAX_DISTANCE', '10'))
+    DUPLICATE_MIN_SIMILARITY = float(os.environ.get('DUPLICATE_MIN_SIMILARITY', '0.6'))
+    FINGERPRINT_TIMEOUT_SECONDS = int(os.environ.get('FINGERPRINT_TIMEOUT_SECONDS', '20'))
+    FINGERPRINT_INDEX_REFRESH_SECONDS = int(os.environ.get('FINGERPRINT_INDEX_REFRESH_SECONDS', '30'))
+    FINGERPRINT_INDEX_REBUILD_SECONDS = int(os.environ.get('FINGERPRINT_INDEX_REBUILD_SECONDS', '3600'))
     
     # Configuración de desarrollo/producción
     ENVIRONMENT = os.environ.get('ENVIRONMENT', 'development')
@@ -79,36 +223,22 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Configuración para producción"""
     DEBUG = False
+    SERVER_TIMING_ENABLED = False
+    LOG_FILE = os.environ.get('LOG_FILE', 'logs/socialman.log')
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.1'))
     
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
-        
-        # Configuraciones específicas de producción
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        
-        file_handler = RotatingFileHandler(
-            'logs/socialman.log',
-            maxBytes=10240000,
-            backupCount=10
-        )
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('SocialMan App startup')
+        # El handler de archivo (LOG_FILE) lo crea configure_logging detrás
+        # de la cola, para no escribir en disco desde la petición
 
 class TestConfig(Config):
     """Configuración para pruebas"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
     WTF_CSRF_ENABLED = False
 
 # Mapeo de configuraciones
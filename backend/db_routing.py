@@ -0,0 +1,102 @@
+"""
+Enrutamiento de lecturas a réplicas de la base de datos
+
+Si se configura DATABASE_REPLICA_URL, las consultas ejecutadas dentro de un
+método marcado con @read_only se envían al bind 'replica'. Las escrituras
+siempre van al primario y, tras una escritura, la sesión y el cliente quedan
+"pegados" al primario durante REPLICA_STICKINESS_SECONDS para que cada
+usuario lea lo que acaba de escribir aunque la réplica vaya con retraso.
+"""
+
+import functools
+import inspect
+import time
+
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND_KEY = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+
+class RoutingSession(Session):
+    """Sesión que elige primario o réplica según el tipo de operación"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica():
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        return (
+            self.info.get('read_only', 0) > 0
+            and not self.info.get('wrote')
+            and not self.info.get('sticky')
+            and not self._flushing
+            and REPLICA_BIND_KEY in self._db.engines
+        )
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    """Después de cualquier escritura la sesión solo lee del primario"""
+    session.info['wrote'] = True
+
+def read_only(func):
+    """Marcar un método de servicio como de solo lectura (enrutable a réplica)"""
+    if inspect.isgeneratorfunction(func):
+        return _read_only_generator(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from models import db
+
+        info = db.session.info
+        info['read_only'] = info.get('read_only', 0) + 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            info['read_only'] -= 1
+    return wrapper
+
+def _read_only_generator(func):
+    """
+    Variante para generadores: la marca se mantiene mientras se consumen
+    (p. ej. durante una respuesta en streaming), no solo al crearlos
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from models import db
+
+        info = db.session.info
+        info['read_only'] = info.get('read_only', 0) + 1
+        try:
+            yield from func(*args, **kwargs)
+        finally:
+            info['read_only'] -= 1
+    return wrapper
+
+def init_db_routing(app):
+    """Registrar la persistencia de lectura-tras-escritura entre peticiones"""
+    if REPLICA_BIND_KEY not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    from models import db
+
+    @app.before_request
+    def _restore_primary_stickiness():
+        try:
+            primary_until = float(request.cookies.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        if primary_until > time.time():
+            db.session.info['sticky'] = True
+
+    @app.after_request
+    def _remember_primary_stickiness(response):
+        if db.session.info.get('wrote'):
+            seconds = current_app.config['REPLICA_STICKINESS_SECONDS']
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds),
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
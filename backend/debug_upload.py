@@ -1,25 +1,54 @@
 #!/usr/bin/env python3
 """
-Script de debug para probar la subida de videos
+Script de debug y generador de carga para la subida de videos
+
+Sin argumentos ejecuta el diagnóstico original (una subida secuencial y un
+GET de /api/videos). Con el subcomando `load` lanza una prueba de carga
+concurrente con una mezcla de subidas, listados, búsquedas, analíticas y
+publicaciones, y reporta throughput y latencias p50/p95/p99 por endpoint.
+
+Uso:
+    python debug_upload.py                       # diagnóstico
+    python debug_upload.py load --concurrency 16 --duration 60
+    python debug_upload.py load --rate 20 --duration 120 --video-size-mb 5
 """
 
+import argparse
+import random
 import requests
 import os
+import shutil
+import subprocess
+import sys
 import tempfile
 import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEFAULT_BASE_URL = "http://localhost:5000"
+
+# Mezcla de operaciones por defecto (pesos relativos)
+DEFAULT_MIX = 'upload=1,list=5,search=3,analytics=1,publish=1'
 
-def test_upload_endpoint():
+# Facebook verifica el token contra graph.facebook.com, así que por defecto
+# solo se publica en plataformas que no salen de la red local
+DEFAULT_PLATFORMS = 'instagram,tiktok,twitter'
+
+SEARCH_TERMS = ['prueba', 'carga', 'video', 'demo', 'test', 'tutorial']
+
+def test_upload_endpoint(base_url=DEFAULT_BASE_URL):
     """Probar el endpoint de subida de videos"""
-    
-    base_url = "http://localhost:5000"
-    
+
     print("🔍 Probando endpoint de subida de videos...")
     print(f"URL base: {base_url}")
     print("-" * 50)
-    
+
     # Crear un archivo de prueba
     test_file_path = create_test_video()
-    
+
     try:
         # Preparar datos de prueba
         with open(test_file_path, 'rb') as f:
@@ -29,13 +58,13 @@ def test_upload_endpoint():
                 'description': 'Este es un video de prueba para diagnosticar el problema',
                 'tags': 'test, debug, prueba'
             }
-            
+
             print("📤 Enviando solicitud POST a /api/videos...")
             print(f"   Archivo: {test_file_path}")
             print(f"   Título: {data['title']}")
             print(f"   Descripción: {data['description']}")
             print(f"   Tags: {data['tags']}")
-            
+
             # Hacer la solicitud
             response = requests.post(
                 f"{base_url}/api/videos",
@@ -43,24 +72,24 @@ def test_upload_endpoint():
                 data=data,
                 timeout=30
             )
-            
+
             print(f"\n📥 Respuesta del servidor:")
             print(f"   Status Code: {response.status_code}")
             print(f"   Headers: {dict(response.headers)}")
-            
+
             try:
                 response_data = response.json()
                 print(f"   Response JSON: {json.dumps(response_data, indent=2)}")
             except:
                 print(f"   Response Text: {response.text}")
-            
+
             if response.status_code == 201:
                 print("✅ ¡Subida exitosa!")
                 return True
             else:
                 print("❌ Error en la subida")
                 return False
-                
+
     except requests.exceptions.RequestException as e:
         print(f"❌ Error de conexión: {e}")
         return False
@@ -72,55 +101,315 @@ def test_upload_endpoint():
         if os.path.exists(test_file_path):
             os.remove(test_file_path)
 
-def create_test_video():
-    """Crear un archivo de video de prueba"""
-    # Crear un archivo MP4 simple (solo headers)
-    test_content = b'\x00\x00\x00\x20ftypmp41\x00\x00\x00\x00mp41isom\x00\x00\x00\x08mdat'
-    
-    # Crear archivo temporal
+def create_test_video(size_bytes=None, duration=5):
+    """
+    Crear un archivo de video de prueba.
+
+    Sin tamaño se genera el MP4 mínimo (solo headers) del diagnóstico. Con
+    `size_bytes` se intenta generar un MP4 real con ffmpeg (video de prueba
+    H.264 + audio AAC con el bitrate ajustado al tamaño pedido); si ffmpeg no
+    está disponible se escribe un MP4 sintético (ftyp + mdat) de ese tamaño
+    con contenido aleatorio.
+    """
     fd, path = tempfile.mkstemp(suffix='.mp4')
-    with os.fdopen(fd, 'wb') as f:
-        f.write(test_content)
-    
+    os.close(fd)
+
+    if size_bytes is None:
+        # Crear un archivo MP4 simple (solo headers)
+        with open(path, 'wb') as f:
+            f.write(b'\x00\x00\x00\x20ftypmp41\x00\x00\x00\x00mp41isom\x00\x00\x00\x08mdat')
+        return path
+
+    if shutil.which('ffmpeg'):
+        bitrate = max(64, int(size_bytes * 8 / duration / 1000) - 128)  # kbps de video
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+            '-c:v', 'libx264', '-b:v', f'{bitrate}k', '-maxrate', f'{bitrate}k',
+            '-bufsize', f'{bitrate * 2}k', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', path
+        ]
+        result = subprocess.run(cmd, capture_output=True, timeout=300)
+        if result.returncode == 0 and os.path.getsize(path) > 0:
+            return path
+
+    # MP4 sintético: ftyp + mdat con datos aleatorios hasta el tamaño pedido
+    ftyp = b'\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isommp41'
+    payload = max(0, size_bytes - len(ftyp) - 8)
+    with open(path, 'wb') as f:
+        f.write(ftyp)
+        f.write((payload + 8).to_bytes(4, 'big') + b'mdat')
+        chunk = os.urandom(1024 * 1024)
+        remaining = payload
+        while remaining > 0:
+            f.write(chunk[:min(remaining, len(chunk))])
+            remaining -= len(chunk)
     return path
 
-def test_server_status():
+def test_server_status(base_url=DEFAULT_BASE_URL):
     """Probar el estado del servidor"""
-    base_url = "http://localhost:5000"
-    
     print("🔍 Probando estado del servidor...")
-    
+
     try:
         # Probar endpoint principal
         response = requests.get(base_url, timeout=5)
         print(f"   Página principal: {response.status_code}")
-        
+
         # Probar endpoint de videos
         response = requests.get(f"{base_url}/api/videos", timeout=5)
         print(f"   GET /api/videos: {response.status_code}")
-        
+
         return True
     except requests.exceptions.RequestException as e:
         print(f"   ❌ Error de conexión: {e}")
         return False
 
-if __name__ == "__main__":
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadTest:
+    """Generador de carga concurrente contra la API"""
+
+    def __init__(self, options):
+        self.options = options
+        self.base_url = options.base_url.rstrip('/')
+        self.mix = self._parse_mix(options.mix)
+        self.platforms = [p.strip() for p in options.platforms.split(',') if p.strip()]
+        self.video_ids = []
+        self.video_ids_lock = threading.Lock()
+        self.samples = defaultdict(list)  # endpoint -> [(latencia, ok, status)]
+        self.samples_lock = threading.Lock()
+        self.local = threading.local()
+        self.video_path = None
+
+    def _parse_mix(self, mix):
+        weights = {}
+        for item in mix.split(','):
+            name, _, weight = item.partition('=')
+            weights[name.strip()] = float(weight or 1)
+        unknown = set(weights) - set(self.operations())
+        if unknown:
+            raise ValueError(f"Operaciones desconocidas en --mix: {', '.join(sorted(unknown))}")
+        return weights
+
+    def operations(self):
+        return {
+            'upload': self.op_upload,
+            'list': self.op_list,
+            'search': self.op_search,
+            'analytics': self.op_analytics,
+            'publish': self.op_publish
+        }
+
+    def session(self):
+        """Una sesión HTTP por hilo para reutilizar conexiones"""
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def pick_operation(self, rng):
+        names = list(self.mix)
+        return rng.choices(names, weights=[self.mix[n] for n in names])[0]
+
+    def record(self, endpoint, latency, ok, status):
+        with self.samples_lock:
+            self.samples[endpoint].append((latency, ok, status))
+
+    def timed_request(self, endpoint, method, path, scheduled=None, **kwargs):
+        """
+        Ejecutar una petición y registrar su latencia. En lazo abierto la
+        latencia se mide desde el instante programado, para incluir el tiempo
+        de espera en cola (evita la omisión coordinada).
+        """
+        started = scheduled if scheduled is not None else time.perf_counter()
+        status = None
+        try:
+            response = self.session().request(
+                method, f"{self.base_url}{path}", timeout=self.options.timeout, **kwargs
+            )
+            status = response.status_code
+            ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            response = None
+            ok = False
+        self.record(endpoint, time.perf_counter() - started, ok, status)
+        return response
+
+    def op_upload(self, rng, scheduled=None):
+        with open(self.video_path, 'rb') as f:
+            response = self.timed_request(
+                'POST /api/videos', 'POST', '/api/videos', scheduled,
+                files={'video': ('carga.mp4', f, 'video/mp4')},
+                data={
+                    'title': f"Prueba de carga {rng.randrange(10 ** 6)}",
+                    'description': 'Video generado por el generador de carga',
+                    'tags': ','.join(rng.sample(['carga', 'test', 'demo', 'video', 'prueba'], 2))
+                }
+            )
+        if response is not None and response.status_code == 201:
+            video_id = response.json().get('data', {}).get('id')
+            if video_id:
+                with self.video_ids_lock:
+                    self.video_ids.append(video_id)
+
+    def op_list(self, rng, scheduled=None):
+        self.timed_request('GET /api/videos', 'GET', '/api/videos', scheduled,
+                           params={'sort_by': rng.choice(['date', 'title']),
+                                   'order': rng.choice(['asc', 'desc'])})
+
+    def op_search(self, rng, scheduled=None):
+        self.timed_request('GET /api/videos?search', 'GET', '/api/videos', scheduled,
+                           params={'search': rng.choice(SEARCH_TERMS)})
+
+    def op_analytics(self, rng, scheduled=None):
+        self.timed_request('GET /api/analytics', 'GET', '/api/analytics', scheduled)
+
+    def op_publish(self, rng, scheduled=None):
+        with self.video_ids_lock:
+            video_id = rng.choice(self.video_ids) if self.video_ids else None
+        if video_id is None or not self.platforms:
+            return self.op_list(rng, scheduled)
+        self.timed_request('POST /api/videos/<id>/publish', 'POST',
+                           f'/api/videos/{video_id}/publish', scheduled,
+                           json={'platforms': rng.sample(self.platforms, rng.randint(1, len(self.platforms)))})
+
+    def prepare(self):
+        """Generar el video de prueba y conocer los videos existentes"""
+        size = int(self.options.video_size_mb * 1024 * 1024)
+        print(f"🎬 Generando video de prueba de {self.options.video_size_mb} MB...")
+        self.video_path = create_test_video(size)
+        response = requests.get(f"{self.base_url}/api/videos", timeout=self.options.timeout)
+        response.raise_for_status()
+        self.video_ids = [video['id'] for video in response.json().get('data', [])]
+        print(f"   {len(self.video_ids)} videos existentes")
+
+    def run_closed_loop(self, deadline):
+        """Lazo cerrado: cada worker lanza la siguiente petición al terminar la anterior"""
+        operations = self.operations()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                operations[self.pick_operation(rng)](rng)
+
+        threads = [
+            threading.Thread(target=worker, args=(self.options.seed + i,), daemon=True)
+            for i in range(self.options.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open_loop(self, deadline):
+        """Lazo abierto: llegadas de Poisson a la tasa pedida, sin esperar respuestas"""
+        operations = self.operations()
+        rng = random.Random(self.options.seed)
+        next_arrival = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options.concurrency) as executor:
+            while next_arrival < deadline:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                op_rng = random.Random(rng.random())
+                executor.submit(operations[self.pick_operation(rng)], op_rng, next_arrival)
+                next_arrival += rng.expovariate(self.options.rate)
+
+    def run(self):
+        self.prepare()
+        mode = 'abierto' if self.options.rate else 'cerrado'
+        print(f"🚀 Carga en lazo {mode} contra {self.base_url} durante {self.options.duration}s "
+              f"(concurrencia {self.options.concurrency}"
+              f"{f', {self.options.rate} req/s' if self.options.rate else ''})")
+        started = time.perf_counter()
+        deadline = started + self.options.duration
+        try:
+            if self.options.rate:
+                self.run_open_loop(deadline)
+            else:
+                self.run_closed_loop(deadline)
+        finally:
+            if self.video_path and os.path.exists(self.video_path):
+                os.remove(self.video_path)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        """Calcular throughput y percentiles por endpoint"""
+        endpoints = {}
+        all_latencies = []
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] * 1000 for s in samples)
+            all_latencies.extend(latencies)
+            errors = sum(1 for s in samples if not s[1])
+            statuses = defaultdict(int)
+            for s in samples:
+                statuses[str(s[2])] += 1
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': errors,
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+                'max_ms': round(latencies[-1], 2),
+                'status_codes': dict(statuses)
+            }
+        all_latencies.sort()
+
+        print(f"\n{'Endpoint':<34}{'req':>7}{'err':>6}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, stats in endpoints.items():
+            print(f"{endpoint:<34}{stats['requests']:>7}{stats['errors']:>6}"
+                  f"{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>10.1f}"
+                  f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+        total = len(all_latencies)
+        return {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'base_url': self.base_url,
+                'mode': 'open' if self.options.rate else 'closed',
+                'concurrency': self.options.concurrency,
+                'rate': self.options.rate,
+                'duration_s': round(elapsed, 2),
+                'mix': self.mix,
+                'platforms': self.platforms,
+                'video_size_mb': self.options.video_size_mb
+            },
+            'total': {
+                'requests': total,
+                'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+                'p50_ms': round(percentile(all_latencies, 50), 2) if total else None,
+                'p95_ms': round(percentile(all_latencies, 95), 2) if total else None,
+                'p99_ms': round(percentile(all_latencies, 99), 2) if total else None
+            },
+            'endpoints': endpoints
+        }
+
+def run_diagnosis(base_url):
+    """Diagnóstico original: estado del servidor y una subida"""
     print("🚀 Iniciando diagnóstico de subida de videos...")
     print("=" * 60)
-    
+
     # Probar estado del servidor
-    if not test_server_status():
+    if not test_server_status(base_url):
         print("\n❌ El servidor no está respondiendo. Asegúrate de que esté ejecutándose.")
-        exit(1)
-    
+        return 1
+
     print("\n" + "=" * 60)
-    
+
     # Probar subida
-    success = test_upload_endpoint()
-    
+    success = test_upload_endpoint(base_url)
+
     print("\n" + "=" * 60)
     if success:
         print("🎉 ¡Diagnóstico completado exitosamente!")
+        return 0
     else:
         print("💥 Hay problemas con la subida de videos")
         print("\n💡 Posibles soluciones:")
@@ -128,3 +417,39 @@ if __name__ == "__main__":
         print("   2. Verificar que el directorio de uploads exista")
         print("   3. Verificar los logs del servidor")
         print("   4. Verificar que ffmpeg esté instalado")
+        return 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Diagnóstico y pruebas de carga de SocialMan')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    subparsers = parser.add_subparsers(dest='command')
+
+    load = subparsers.add_parser('load', help='Prueba de carga concurrente')
+    load.add_argument('--base-url', default=argparse.SUPPRESS)
+    load.add_argument('--concurrency', type=int, default=8,
+                      help='Workers concurrentes (lazo cerrado) o máximo de peticiones en vuelo (lazo abierto)')
+    load.add_argument('--rate', type=float, default=0,
+                      help='Peticiones por segundo; si se indica se usa lazo abierto')
+    load.add_argument('--duration', type=float, default=30, help='Duración en segundos')
+    load.add_argument('--mix', default=DEFAULT_MIX, help='Pesos de operaciones, p. ej. upload=1,list=5')
+    load.add_argument('--platforms', default=DEFAULT_PLATFORMS,
+                      help='Plataformas usadas en las publicaciones')
+    load.add_argument('--video-size-mb', type=float, default=2, help='Tamaño del video subido')
+    load.add_argument('--timeout', type=float, default=120, help='Timeout por petición')
+    load.add_argument('--seed', type=int, default=1)
+    load.add_argument('--output', default='load_results.json', help='Archivo JSON de resultados')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    options = parse_args(argv)
+    if options.command != 'load':
+        return run_diagnosis(options.base_url)
+
+    results = LoadTest(options).run()
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Resultados guardados en {options.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
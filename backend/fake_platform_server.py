@@ -0,0 +1,198 @@
+"""
+Servidor local que imita las APIs de subida por partes de las plataformas
+
+Implementa en memoria los endpoints que usa services/chunked_upload.py
+(X INIT/APPEND/FINALIZE/STATUS y /2/tweets, sesiones reanudables de
+Facebook y la subida de TikTok) y puede fallar a propósito para comprobar
+los reintentos y la reanudación:
+
+    python fake_platform_server.py --port 8900 --fail-rate 0.2
+
+    export CHUNKED_UPLOAD_PLATFORMS=twitter,facebook,tiktok
+    export TWITTER_UPLOAD_URL=http://localhost:8900/1.1/media/upload.json
+    export TWITTER_API_URL=http://localhost:8900
+    export FACEBOOK_GRAPH_VIDEO_URL=http://localhost:8900/v18.0
+    export TIKTOK_API_URL=http://localhost:8900
+
+GET /_uploads devuelve cada archivo recibido con su tamaño y SHA-256 para
+compararlo con el checksum del video.
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import uuid
+
+from flask import Flask, jsonify, request
+
+FACEBOOK_CHUNK_SIZE = 4 * 1024 * 1024
+
+def create_fake_app(fail_rate=0.0, seed=None):
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    uploads = {}  # id -> {'platform', 'size', 'chunks': {offset: bytes}, 'finished'}
+
+    def assemble(upload):
+        return b''.join(chunk for _, chunk in sorted(upload['chunks'].items()))
+
+    def should_fail():
+        with lock:
+            return rng.random() < fail_rate
+
+    def store(upload_id, offset, data):
+        with lock:
+            uploads[upload_id]['chunks'][offset] = data
+
+    @app.before_request
+    def _inject_failures():
+        # Solo las partes fallan: así se prueban los reintentos sin perder sesiones
+        chunk_request = (
+            request.form.get('command') == 'APPEND'
+            or request.form.get('upload_phase') == 'transfer'
+            or request.method == 'PUT'
+        )
+        if chunk_request and should_fail():
+            return jsonify({'error': 'Fallo simulado'}), 503
+
+    # X (Twitter)
+    @app.route('/1.1/media/upload.json', methods=['GET', 'POST'])
+    def twitter_media_upload():
+        command = request.values.get('command')
+        media_id = request.values.get('media_id')
+        if command == 'INIT':
+            media_id = str(uuid.uuid4().int)[:18]
+            uploads[media_id] = {
+                'platform': 'twitter', 'size': int(request.form['total_bytes']),
+                'chunks': {}, 'finished': False
+            }
+            return jsonify({'media_id': int(media_id), 'media_id_string': media_id}), 202
+        upload = uploads.get(media_id)
+        if upload is None:
+            return jsonify({'errors': [{'message': 'media_id desconocido'}]}), 400
+        if command == 'APPEND':
+            data = request.files['media'].read()
+            # Los segmentos se ordenan por índice al ensamblar
+            store(media_id, int(request.form['segment_index']), data)
+            return '', 204
+        if command == 'FINALIZE':
+            received = sum(len(chunk) for chunk in upload['chunks'].values())
+            if received != upload['size']:
+                return jsonify({'errors': [{'message': f'Recibidos {received} de {upload["size"]} bytes'}]}), 400
+            upload['finished'] = True
+            return jsonify({
+                'media_id_string': media_id,
+                'processing_info': {'state': 'pending', 'check_after_secs': 0}
+            })
+        if command == 'STATUS':
+            return jsonify({'media_id_string': media_id, 'processing_info': {'state': 'succeeded'}})
+        return jsonify({'errors': [{'message': 'Comando no válido'}]}), 400
+
+    @app.route('/2/tweets', methods=['POST'])
+    def twitter_tweet():
+        media_ids = request.get_json().get('media', {}).get('media_ids', [])
+        if not all(uploads.get(media_id, {}).get('finished') for media_id in media_ids):
+            return jsonify({'detail': 'Media sin finalizar'}), 400
+        return jsonify({'data': {'id': str(uuid.uuid4().int)[:19], 'text': request.get_json()['text']}}), 201
+
+    # Facebook
+    @app.route('/v18.0/<page_id>/videos', methods=['POST'])
+    def facebook_videos(page_id):
+        phase = request.form.get('upload_phase')
+        if phase == 'start':
+            session_id = uuid.uuid4().hex
+            size = int(request.form['file_size'])
+            uploads[session_id] = {
+                'platform': 'facebook', 'size': size, 'chunks': {},
+                'finished': False, 'video_id': str(uuid.uuid4().int)[:15], 'offset': 0
+            }
+            return jsonify({
+                'upload_session_id': session_id,
+                'video_id': uploads[session_id]['video_id'],
+                'start_offset': '0',
+                'end_offset': str(min(FACEBOOK_CHUNK_SIZE, size))
+            })
+        upload = uploads.get(request.form.get('upload_session_id'))
+        if upload is None:
+            return jsonify({'error': {'message': 'Sesión de subida no válida'}}), 400
+        if phase == 'transfer':
+            start = int(request.form['start_offset'])
+            if start != upload['offset']:
+                return jsonify({'error': {'message': f'start_offset esperado {upload["offset"]}'}}), 400
+            data = request.files['video_file_chunk'].read()
+            store(request.form['upload_session_id'], start, data)
+            upload['offset'] = start + len(data)
+            end = min(upload['offset'] + FACEBOOK_CHUNK_SIZE, upload['size'])
+            return jsonify({'start_offset': str(upload['offset']), 'end_offset': str(end)})
+        if phase == 'finish':
+            if upload['offset'] != upload['size']:
+                return jsonify({'error': {'message': 'Subida incompleta'}}), 400
+            upload['finished'] = True
+            upload['title'] = request.form.get('title')
+            return jsonify({'success': True})
+        return jsonify({'error': {'message': 'upload_phase no válida'}}), 400
+
+    # TikTok
+    @app.route('/v2/post/publish/video/init/', methods=['POST'])
+    def tiktok_init():
+        source = request.get_json()['source_info']
+        publish_id = f"v_pub_file~v2-1.{uuid.uuid4().int % 10 ** 18}"
+        uploads[publish_id] = {
+            'platform': 'tiktok', 'size': source['video_size'], 'chunks': {},
+            'finished': False, 'offset': 0
+        }
+        return jsonify({'data': {
+            'publish_id': publish_id,
+            'upload_url': f"{request.host_url}tiktok/upload/{publish_id}"
+        }, 'error': {'code': 'ok'}})
+
+    @app.route('/tiktok/upload/<publish_id>', methods=['PUT'])
+    def tiktok_upload(publish_id):
+        upload = uploads.get(publish_id)
+        if upload is None:
+            return jsonify({'error': {'code': 'invalid_upload'}}), 404
+        unit, _, spec = request.headers.get('Content-Range', '').partition(' ')
+        byte_range, _, total = spec.partition('/')
+        start, _, end = byte_range.partition('-')
+        start, end = int(start), int(end)
+        if unit != 'bytes' or int(total) != upload['size'] or start != upload['offset']:
+            return jsonify({'error': {'code': 'range_mismatch', 'expected_offset': upload['offset']}}), 416
+        data = request.get_data()
+        if len(data) != end - start + 1:
+            return jsonify({'error': {'code': 'size_mismatch'}}), 400
+        store(publish_id, start, data)
+        upload['offset'] = end + 1
+        if upload['offset'] == upload['size']:
+            upload['finished'] = True
+            return '', 201
+        return '', 206
+
+    @app.route('/_uploads', methods=['GET'])
+    def list_uploads():
+        with lock:
+            items = list(uploads.items())
+        result = []
+        for upload_id, upload in items:
+            data = assemble(upload)
+            result.append({
+                'id': upload_id,
+                'platform': upload['platform'],
+                'size': upload['size'],
+                'received': len(data),
+                'finished': upload['finished'],
+                'sha256': hashlib.sha256(data).hexdigest()
+            })
+        return jsonify(result)
+
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='APIs de subida de plataformas simuladas')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='Fracción de partes que responden 503')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    create_fake_app(args.fail_rate, args.seed).run(host=args.host, port=args.port, threaded=True)
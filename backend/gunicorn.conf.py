@@ -0,0 +1,38 @@
+"""
+Configuración de gunicorn para SocialMan
+
+Por defecto se usan workers con hilos (gthread): una subida lenta, una
+publicación que espera a la API de la plataforma o un ffprobe ocupan un hilo
+y no un proceso completo, así que el resto de la API sigue respondiendo.
+GUNICORN_WORKER_CLASS=sync recupera el modo anterior (un request por proceso).
+
+Cada hilo usa su propia sesión de SQLAlchemy (Flask-SQLAlchemy la asocia al
+contexto de aplicación), por lo que el pool de cada worker debe admitir
+GUNICORN_THREADS conexiones: DB_POOL_SIZE toma ese valor por defecto (el
+valor por defecto de threads, 8, está repetido en config.py).
+"""
+
+import os
+import time
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+def post_worker_init(worker):
+    """Registrar cuánto tarda cada worker en cargar la aplicación"""
+    worker.log.info(
+        "Worker %s listo en %.3fs", worker.pid, time.perf_counter() - worker.boot_started
+    )
+
+def child_exit(server, worker):
+    """Limpiar las métricas de los workers que terminan (modo multiproceso)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
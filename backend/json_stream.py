@@ -0,0 +1,109 @@
+"""
+Respuestas JSON en streaming para listados grandes
+
+`jsonify` construye la lista completa y la serializa en una sola cadena
+antes de enviar el primer byte, así que la memoria de cada worker crece con
+el tamaño del resultado. En modo streaming el servicio entrega los videos
+con un cursor del servidor (yield_per) y aquí se serializan uno a uno:
+
+- ndjson: un objeto JSON por línea (application/x-ndjson), para
+  exportaciones y la sincronización inicial de la app móvil.
+- json: el mismo sobre {"data": [...]} que la respuesta normal, emitido
+  por partes.
+
+Si el cliente acepta gzip, la salida se comprime de forma incremental.
+La memoria máxima depende del tamaño del lote, no del número de filas.
+"""
+
+import json
+import logging
+import zlib
+
+from flask import Response, request, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = ('ndjson', 'json')
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Se acumula salida hasta este tamaño antes de enviarla (evita escrituras diminutas)
+FLUSH_BYTES = 64 * 1024
+
+def requested_stream_format():
+    """
+    Formato de streaming pedido (?stream=ndjson|json o Accept:
+    application/x-ndjson), None para la respuesta normal. Lanza ValueError
+    si el formato no es válido.
+    """
+    stream_format = request.args.get('stream', '').strip().lower()
+    if stream_format:
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(f'stream debe ser {" o ".join(STREAM_FORMATS)}')
+        return stream_format
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return None
+
+def _encode(item):
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+def _ndjson_chunks(items):
+    try:
+        for item in items:
+            yield _encode(item) + '\n'
+    except Exception as e:
+        # El estado ya se envió: el error se comunica como última línea
+        logger.exception("Error durante el streaming NDJSON")
+        yield _encode({'error': str(e)}) + '\n'
+
+def _json_array_chunks(items):
+    yield '{"data":['
+    separator = ''
+    try:
+        for item in items:
+            yield separator + _encode(item)
+            separator = ','
+    except Exception as e:
+        logger.exception("Error durante el streaming JSON")
+        yield '],"error":' + _encode(str(e)) + '}'
+        return
+    yield ']}'
+
+def _buffered(chunks, compress):
+    """Agrupar los fragmentos en bloques de FLUSH_BYTES, comprimidos si se pide"""
+    # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            if compressor:
+                # Z_SYNC_FLUSH: el cliente puede descomprimir lo recibido hasta ahora
+                block = compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+def stream_response(items, stream_format):
+    """Response que serializa `items` (iterable de dicts) a medida que se consume"""
+    chunks = _ndjson_chunks(items) if stream_format == 'ndjson' else _json_array_chunks(items)
+    compress = 'gzip' in request.accept_encodings
+    response = Response(
+        stream_with_context(_buffered(chunks, compress)),
+        mimetype=NDJSON_MIMETYPE if stream_format == 'ndjson' else 'application/json'
+    )
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    # Que nginx no acumule la respuesta completa antes de reenviarla
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,199 @@
+"""
+Logging estructurado y no bloqueante
+
+Los registros se encolan en memoria con un QueueHandler y un hilo en segundo
+plano (QueueListener) los formatea como JSON y los escribe en stderr o en
+archivo, de modo que el formateo y la escritura no añaden latencia a la
+petición. Cada registro lleva el request_id de la petición en curso (cabecera
+X-Request-ID si es un identificador válido; si no, uno nuevo), que llega a
+los servicios a través de una contextvar. Los eventos DEBUG se muestrean con
+LOG_DEBUG_SAMPLE_RATE.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, request
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# X-Request-ID aceptados del cliente (se repiten en la respuesta y en los logs)
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+# Atributos estándar de LogRecord; el resto se considera contexto extra
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'request_id'}
+
+# Formatea las trazas al encolar (el JSON se genera después)
+_exception_formatter = logging.Formatter()
+
+_listeners = []
+
+def get_request_id():
+    """request_id de la petición en curso (None fuera de una petición)"""
+    return request_id_var.get()
+
+class RequestIdFilter(logging.Filter):
+    """Añadir el request_id de la petición en curso a cada registro"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Dejar pasar solo una fracción de los eventos DEBUG"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """Formatear cada registro como una línea JSON"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text  # Ya formateada al encolar
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler que nunca bloquea la petición: si la cola está llena el
+    registro se descarta. El registro se serializa como JSON y se escribe en
+    el hilo de escritura.
+    """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record):
+        # Como QueueHandler.prepare, el mensaje y la traza se resuelven ya: los
+        # argumentos pueden cambiar después y la traza retiene sus frames.
+        # Solo el JSON y la escritura quedan para el QueueListener.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def queued(handler, queue_size=10000):
+    """Envolver un handler síncrono para que escriba desde un hilo propio"""
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.listener = listener
+    queue_handler.addFilter(RequestIdFilter())
+    return queue_handler
+
+def _stop_listeners():
+    # Vacía las colas pendientes al terminar el proceso
+    while _listeners:
+        _listeners.pop().stop()
+
+atexit.register(_stop_listeners)
+
+def configure_logging(app):
+    """Configurar el logging de la aplicación y la correlación por petición"""
+    config = app.config
+    level = getattr(logging, str(config.get('LOG_LEVEL', 'INFO')).upper(), logging.INFO)
+
+    if config.get('LOG_FORMAT', 'json') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+        )
+
+    log_file = config.get('LOG_FILE')
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        handler = RotatingFileHandler(log_file, maxBytes=10240000, backupCount=10)
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+
+    # Reconfigurar sin duplicar handlers ni hilos si se crea otra app
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, NonBlockingQueueHandler):
+            root.removeHandler(existing)
+            existing.listener.stop()
+            _listeners.remove(existing.listener)
+
+    queue_handler = queued(handler, config.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler.addFilter(DebugSamplingFilter(config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)))
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    access_logger = logging.getLogger('socialman.access')
+
+    @app.before_request
+    def _assign_request_id():
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_id_token = request_id_var.set(request_id)
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+            access_logger.info(
+                '%s %s %s', request.method, request.path, response.status_code,
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 2)
+                }
+            )
+        return response
+
+    @app.teardown_request
+    def _reset_request_id(exception=None):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
@@ -0,0 +1,225 @@
+"""
+Métricas de rendimiento de la aplicación en formato Prometheus
+
+Las métricas se agregan correctamente entre los workers de gunicorn usando el
+modo multiproceso de prometheus_client: cada worker escribe sus valores en
+PROMETHEUS_MULTIPROC_DIR y el endpoint /metrics los combina al exportar.
+"""
+
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+# Buckets de latencia pensados para una API web (5ms - 60s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Buckets de tamaño de archivo (64KB - 100MB, el máximo permitido)
+SIZE_BUCKETS = tuple(
+    size * 1024 * 1024 for size in (0.0625, 0.25, 1, 5, 10, 25, 50, 75, 100)
+)
+
+# Peticiones HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    'socialman_http_request_duration_seconds',
+    'Latencia de las peticiones HTTP por ruta',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    'socialman_http_requests_in_progress',
+    'Peticiones HTTP en curso',
+    ['method', 'route'],
+    multiprocess_mode='livesum'
+)
+
+# Subida de videos
+UPLOAD_BYTES = Histogram(
+    'socialman_upload_bytes',
+    'Tamaño de los videos subidos en bytes',
+    buckets=SIZE_BUCKETS
+)
+UPLOAD_DURATION = Histogram(
+    'socialman_upload_duration_seconds',
+    'Tiempo de procesamiento de una subida de video',
+    ['outcome'],
+    buckets=LATENCY_BUCKETS
+)
+FFPROBE_DURATION = Histogram(
+    'socialman_ffprobe_duration_seconds',
+    'Tiempo empleado en ejecutar ffprobe',
+    ['outcome'],
+    buckets=LATENCY_BUCKETS
+)
+FINGERPRINT_DURATION = Histogram(
+    'socialman_fingerprint_duration_seconds',
+    'Tiempo de extracción de fotogramas clave y cálculo de huellas perceptuales',
+    ['outcome'],
+    buckets=LATENCY_BUCKETS
+)
+
+# Publicación en redes sociales
+PUBLISH_DURATION = Histogram(
+    'socialman_publish_duration_seconds',
+    'Latencia de publicación por plataforma',
+    ['platform', 'outcome'],
+    buckets=LATENCY_BUCKETS
+)
+PUBLISH_TOTAL = Counter(
+    'socialman_publish_total',
+    'Publicaciones realizadas por plataforma y resultado',
+    ['platform', 'outcome']
+)
+
+# Caché de versiones recodificadas por plataforma
+RENDITION_CACHE_REQUESTS = Counter(
+    'socialman_rendition_cache_requests_total',
+    'Consultas a la caché de versiones por preset y resultado (hit/miss)',
+    ['preset', 'result']
+)
+RENDITION_CACHE_EVICTIONS = Counter(
+    'socialman_rendition_cache_evictions_total',
+    'Versiones expulsadas de la caché por el presupuesto de disco'
+)
+RENDITION_TRANSCODE_DURATION = Histogram(
+    'socialman_rendition_transcode_seconds',
+    'Tiempo de recodificación de una versión',
+    ['preset', 'outcome'],
+    buckets=LATENCY_BUCKETS + (120, 300, 600, 1800)
+)
+
+# Niveles de almacenamiento
+STORAGE_TIER_MOVES = Counter(
+    'socialman_storage_tier_moves_total',
+    'Videos movidos entre niveles de almacenamiento (promote/demote)',
+    ['direction']
+)
+
+# Base de datos
+DB_QUERIES = Counter(
+    'socialman_db_queries_total',
+    'Consultas SQL ejecutadas por tipo de sentencia',
+    ['operation']
+)
+DB_QUERY_DURATION = Histogram(
+    'socialman_db_query_duration_seconds',
+    'Duración de las consultas SQL',
+    ['operation'],
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'socialman_db_pool_connections_in_use',
+    'Conexiones del pool actualmente en uso',
+    multiprocess_mode='livesum'
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'socialman_db_pool_connections_open',
+    'Conexiones abiertas por los pools de SQLAlchemy',
+    multiprocess_mode='livesum'
+)
+
+# Arranque
+APP_STARTUP_SECONDS = Gauge(
+    'socialman_app_startup_seconds',
+    'Tiempo de creación de la aplicación en cada worker',
+    multiprocess_mode='liveall'
+)
+
+def _statement_operation(statement):
+    """Obtener el tipo de sentencia SQL (select, insert, update...)"""
+    parts = statement.lstrip().split(None, 1)
+    if not parts:
+        return 'other'
+    operation = parts[0].lower()
+    if operation in ('select', 'insert', 'update', 'delete', 'with'):
+        return operation
+    return 'other'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    operation = _statement_operation(statement)
+    DB_QUERIES.labels(operation=operation).inc()
+    DB_QUERY_DURATION.labels(operation=operation).observe(elapsed)
+
+@event.listens_for(Pool, 'connect')
+def _pool_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.inc()
+
+@event.listens_for(Pool, 'close')
+def _pool_close(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS.dec()
+
+@event.listens_for(Pool, 'checkout')
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+@event.listens_for(Pool, 'checkin')
+def _pool_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+def _route_label():
+    """Usar la regla de la ruta (no la URL) para no disparar la cardinalidad"""
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+def init_metrics(app):
+    """Registrar los hooks de medición y el endpoint /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = _route_label()
+        HTTP_REQUESTS_IN_PROGRESS.labels(
+            method=request.method, route=g.metrics_route
+        ).inc()
+
+    @app.teardown_request
+    def _observe_request(exception=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        route = g.pop('metrics_route', 'unmatched')
+        status = g.pop('metrics_status', 500 if exception else 200)
+        HTTP_REQUESTS_IN_PROGRESS.labels(method=request.method, route=route).dec()
+        HTTP_REQUEST_DURATION.labels(
+            method=request.method, route=route, status=str(status)
+        ).observe(time.perf_counter() - start)
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Exportar métricas en formato de texto de Prometheus"""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
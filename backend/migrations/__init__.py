@@ -0,0 +1 @@
+# Paquete de migraciones versionadas del esquema
\ No newline at end of file
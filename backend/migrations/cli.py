@@ -0,0 +1,73 @@
+"""
+Comandos de Flask para las migraciones del esquema
+
+    flask --app app db upgrade   # aplicar migraciones pendientes
+    flask --app app db status    # ver el estado de cada migración
+    flask --app app db partitions  # particiones mensuales de publications
+"""
+
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import OperationalError
+
+from migrations.partitions import PartitionManager
+from migrations.runner import MigrationRunner
+
+db_cli = AppGroup('db', help='Migraciones versionadas del esquema')
+
+def _runner():
+    from models import db
+    return MigrationRunner(db.engine, log=click.echo)
+
+@db_cli.command('upgrade')
+@click.option('--retries', default=5, show_default=True,
+              help='Reintentos mientras la base de datos arranca')
+@click.option('--retry-delay', default=3.0, show_default=True)
+def upgrade_command(retries, retry_delay):
+    """Aplicar las migraciones pendientes y preparar directorios"""
+    started = time.perf_counter()
+    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    for attempt in range(retries):
+        try:
+            _runner().upgrade()
+            break
+        except OperationalError as e:
+            if attempt < retries - 1:
+                click.echo(f"Base de datos no disponible ({e.orig}), reintentando en {retry_delay}s...")
+                time.sleep(retry_delay)
+            else:
+                raise
+
+    click.echo(f"Paso de migración completado en {time.perf_counter() - started:.2f}s")
+
+@db_cli.command('status')
+def status_command():
+    """Mostrar las migraciones aplicadas y pendientes"""
+    for version, name, applied in _runner().status():
+        click.echo(f"{'✅' if applied else '⏳'} {version} {name}")
+
+@db_cli.command('partitions')
+@click.option('--months-ahead', type=int, default=None,
+              help='Meses futuros con partición creada (PUBLICATIONS_PARTITION_MONTHS_AHEAD)')
+@click.option('--retention-months', type=int, default=None,
+              help='Meses conservados antes de archivar; 0 no archiva (PUBLICATIONS_RETENTION_MONTHS)')
+@click.option('--export-dir', default=None,
+              help='Directorio donde exportar las publicaciones archivadas (.ndjson.gz)')
+def partitions_command(months_ahead, retention_months, export_dir):
+    """Crear particiones futuras de publications y archivar las antiguas (para cron)"""
+    from models import db
+    config = current_app.config
+    if months_ahead is None:
+        months_ahead = config.get('PUBLICATIONS_PARTITION_MONTHS_AHEAD', 3)
+    if retention_months is None:
+        retention_months = config.get('PUBLICATIONS_RETENTION_MONTHS', 24)
+
+    result = PartitionManager(db.engine, log=click.echo).maintain(
+        months_ahead, retention_months, export_dir
+    )
+    click.echo(f"Particiones creadas: {result['created']}, archivadas: {len(result['archived'])}")
@@ -0,0 +1,139 @@
+"""
+Mantenimiento de las particiones mensuales de publications (PostgreSQL)
+
+    flask --app app db partitions   # crear meses futuros y archivar los antiguos
+
+Crea por adelantado las particiones de los próximos meses para que las
+inserciones nunca caigan en la partición por defecto, y archiva los meses
+que superan la retención: sus publicaciones se resumen por video y
+plataforma en publication_archive (opcionalmente se exportan completas a
+un .ndjson.gz) y la partición se separa y se elimina, lo que cuesta lo mismo
+sin importar cuántas filas tenga. Las analíticas no pierden nada porque
+publication_rollups se actualiza antes de archivar.
+"""
+
+import gzip
+import logging
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r'^publications_(\d{4})_(\d{2})$')
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+class PartitionManager:
+    """Particiones mensuales de publications sobre un engine de SQLAlchemy"""
+
+    def __init__(self, engine, log=logger.info):
+        self.engine = engine
+        self.log = log
+
+    @property
+    def supported(self):
+        return self.engine.dialect.name == 'postgresql'
+
+    def ensure_future(self, months_ahead=3):
+        """Crear las particiones del mes actual y los months_ahead siguientes"""
+        with self.engine.begin() as connection:
+            created = connection.execute(
+                text("SELECT ensure_publication_partitions(CURRENT_DATE, :months)"),
+                {'months': months_ahead + 1}
+            ).scalar()
+        if created:
+            self.log(f"Creadas {created} particiones de publications")
+        return created
+
+    def list_partitions(self):
+        """[(mes, nombre)] de las particiones mensuales, de la más antigua a la más reciente"""
+        with self.engine.connect() as connection:
+            names = connection.execute(text("""
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = 'publications'
+            """)).scalars()
+            partitions = []
+            for name in names:
+                match = PARTITION_NAME.match(name)
+                if match:
+                    partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+        return sorted(partitions)
+
+    def archive(self, retention_months, export_dir=None):
+        """
+        Archivar las particiones anteriores a retention_months meses.
+        Devuelve los nombres de las particiones archivadas.
+        """
+        cutoff = _add_months(date.today().replace(day=1), -retention_months)
+        expired = [(month, name) for month, name in self.list_partitions() if month < cutoff]
+        if not expired:
+            return []
+
+        # Los agregados horarios deben incluir estas filas antes de borrarlas
+        from services.publication_analytics import publication_analytics
+        publication_analytics.refresh()
+
+        archived = []
+        for month, name in expired:
+            # Cada mes en su propia transacción: un fallo no deja meses a medias
+            with self.engine.begin() as connection:
+                summaries = self._summarize(connection, month, name)
+                if export_dir:
+                    self._export(connection, name, export_dir)
+                connection.execute(text(f'ALTER TABLE publications DETACH PARTITION "{name}"'))
+                connection.execute(text(f'DROP TABLE "{name}"'))
+            self.log(f"Partición {name} archivada ({summaries} resúmenes)")
+            archived.append(name)
+        return archived
+
+    def _summarize(self, connection, month, name):
+        return connection.execute(text(f"""
+            INSERT INTO publication_archive (
+                month, video_id, platform, total, published, failed, pending,
+                last_status, last_platform_post_id, last_published_at,
+                first_requested_at, last_requested_at
+            )
+            SELECT
+                :month, video_id, platform, COUNT(*),
+                COUNT(*) FILTER (WHERE status = 'published'),
+                COUNT(*) FILTER (WHERE status = 'failed'),
+                COUNT(*) FILTER (WHERE status = 'pending'),
+                (array_agg(status ORDER BY requested_at DESC))[1],
+                (array_agg(platform_post_id ORDER BY requested_at DESC)
+                    FILTER (WHERE platform_post_id IS NOT NULL))[1],
+                MAX(published_at),
+                MIN(requested_at),
+                MAX(requested_at)
+            FROM "{name}"
+            GROUP BY video_id, platform
+            ON CONFLICT (month, video_id, platform) DO NOTHING
+        """), {'month': month}).rowcount
+
+    def _export(self, connection, name, export_dir):
+        os.makedirs(export_dir, exist_ok=True)
+        path = os.path.join(export_dir, f"{name}.ndjson.gz")
+        rows = connection.execution_options(stream_results=True, yield_per=1000).execute(
+            text(f'SELECT row_to_json(p)::text FROM "{name}" p ORDER BY requested_at')
+        ).scalars()
+        with gzip.open(path, 'wt', encoding='utf-8') as export_file:
+            for row in rows:
+                export_file.write(row)
+                export_file.write('\n')
+        self.log(f"Partición {name} exportada a {path}")
+
+    def maintain(self, months_ahead=3, retention_months=24, export_dir=None):
+        """Crear las particiones futuras y archivar las que superan la retención"""
+        if not self.supported:
+            self.log("Particionado de publications solo disponible en PostgreSQL; nada que hacer")
+            return {'created': 0, 'archived': []}
+        created = self.ensure_future(months_ahead)
+        archived = self.archive(retention_months, export_dir) if retention_months else []
+        return {'created': created, 'archived': archived}
@@ -0,0 +1,160 @@
+"""
+Ejecutor de migraciones versionadas del esquema
+
+Cada migración es un archivo `versions/NNNN_descripcion.py` con una función
+`upgrade(connection)`. Las migraciones aplicadas se registran en la tabla
+schema_migrations y cada una se ejecuta en su propia transacción. Se ejecuta
+una sola vez como paso de arranque (`flask --app app db upgrade`), nunca
+desde los workers; un bloqueo evita que dos procesos migren a la vez.
+"""
+
+import fcntl
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, MetaData, String, Table, inspect, select, text
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'versions')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# Clave arbitraria para pg_advisory_lock
+ADVISORY_LOCK_KEY = 727274
+
+schema_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', schema_metadata,
+    Column('version', String(32), primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, nullable=False),
+    Column('duration_ms', Float)
+)
+
+class Migration:
+    """Una migración cargada desde el directorio de versiones"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(
+                f"migrations.versions.m{self.version}_{self.name}", self.path
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self._module = module
+        return self._module
+
+    @property
+    def description(self):
+        doc = (self.module.__doc__ or self.name).strip()
+        return doc.splitlines()[0][:200]
+
+    def upgrade(self, connection):
+        self.module.upgrade(connection)
+
+def discover_migrations(directory=VERSIONS_DIR):
+    """Listar las migraciones disponibles ordenadas por versión"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2),
+                                        os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Versiones de migración duplicadas en {directory}")
+    return migrations
+
+class MigrationRunner:
+    """Aplicar las migraciones pendientes sobre un engine de SQLAlchemy"""
+
+    def __init__(self, engine, directory=VERSIONS_DIR, log=print):
+        self.engine = engine
+        self.directory = directory
+        self.log = log
+
+    @contextmanager
+    def _lock(self):
+        """Bloqueo exclusivo entre procesos durante la migración"""
+        if self.engine.dialect.name == 'postgresql':
+            with self.engine.connect() as connection:
+                connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                connection.commit()
+                try:
+                    yield
+                finally:
+                    connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                    connection.commit()
+        else:
+            url_hash = hashlib.sha1(str(self.engine.url).encode()).hexdigest()[:12]
+            lock_path = os.path.join(tempfile.gettempdir(), f"socialman-migrate-{url_hash}.lock")
+            with open(lock_path, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def applied_versions(self):
+        """Versiones ya aplicadas en la base de datos"""
+        with self.engine.connect() as connection:
+            if not inspect(connection).has_table('schema_migrations'):
+                return set()
+            rows = connection.execute(select(schema_migrations.c.version))
+            return {row.version for row in rows}
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [m for m in discover_migrations(self.directory) if m.version not in applied]
+
+    def upgrade(self):
+        """Aplicar todas las migraciones pendientes; devuelve las aplicadas"""
+        applied = []
+        with self._lock():
+            schema_metadata.create_all(self.engine, checkfirst=True)
+            for migration in self.pending():
+                started = time.perf_counter()
+                with self.engine.begin() as connection:
+                    migration.upgrade(connection)
+                    duration_ms = (time.perf_counter() - started) * 1000
+                    connection.execute(schema_migrations.insert().values(
+                        version=migration.version,
+                        description=migration.description,
+                        applied_at=datetime.utcnow(),
+                        duration_ms=duration_ms
+                    ))
+                self.log(f"Migración {migration.version} ({migration.name}) aplicada en {duration_ms:.0f} ms")
+                applied.append(migration.version)
+        if not applied:
+            self.log("El esquema está al día")
+        return applied
+
+    def status(self):
+        """Estado de cada migración: (versión, nombre, aplicada)"""
+        applied = self.applied_versions()
+        return [(m.version, m.name, m.version in applied) for m in discover_migrations(self.directory)]
+
+def add_column_if_missing(connection, table_name, column_name, column_ddl):
+    """Añadir una columna solo si no existe (bases creadas con create_all)"""
+    columns = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if column_name not in columns:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}"))
+
+def create_index_if_missing(connection, index_name, table_name, columns_ddl, unique=False):
+    """Crear un índice si no existe (sintaxis común a SQLite y PostgreSQL)"""
+    unique_sql = 'UNIQUE ' if unique else ''
+    connection.execute(text(
+        f"CREATE {unique_sql}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns_ddl})"
+    ))
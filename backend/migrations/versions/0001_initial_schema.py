@@ -0,0 +1,90 @@
+"""
+Esquema inicial: videos, publicaciones, plataformas y tags
+
+Las tablas se definen aquí como estaban en esta versión (no desde models.py)
+para que las migraciones posteriores puedan modificarlas. Se crean con
+checkfirst, así que también sirve para bases ya creadas por init.sql o por el
+antiguo db.create_all().
+"""
+
+import json
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text, select
+)
+
+metadata = MetaData()
+
+videos = Table(
+    'videos', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('title', String(200), nullable=False),
+    Column('description', Text),
+    Column('filename', String(255), nullable=False),
+    Column('original_filename', String(255), nullable=False),
+    Column('file_path', String(500), nullable=False),
+    Column('file_size', Integer),
+    Column('duration', Float),
+    Column('tags', String(500)),
+    Column('upload_date', DateTime),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+publications = Table(
+    'publications', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('video_id', Integer, ForeignKey('videos.id'), nullable=False),
+    Column('platform', String(50), nullable=False),
+    Column('platform_post_id', String(100)),
+    Column('status', String(20)),
+    Column('message', Text),
+    Column('published_at', DateTime),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+platforms = Table(
+    'platforms', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(50), unique=True, nullable=False),
+    Column('display_name', String(100), nullable=False),
+    Column('is_active', Boolean),
+    Column('api_config', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+video_tags = Table(
+    'video_tags', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('tag', String(100), unique=True, nullable=False),
+    Column('usage_count', Integer),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+DEFAULT_PLATFORMS = [
+    ('instagram', 'Instagram', 'https://graph.facebook.com/v18.0'),
+    ('tiktok', 'TikTok', 'https://open-api.tiktok.com'),
+    ('facebook', 'Facebook', 'https://graph.facebook.com/v18.0'),
+    ('twitter', 'X (Twitter)', 'https://api.twitter.com/2')
+]
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
+
+    # Plataformas predeterminadas (init.sql ya las inserta en PostgreSQL)
+    existing = set(connection.execute(select(platforms.c.name)).scalars())
+    now = datetime.utcnow()
+    for name, display_name, endpoint in DEFAULT_PLATFORMS:
+        if name not in existing:
+            connection.execute(platforms.insert().values(
+                name=name,
+                display_name=display_name,
+                is_active=True,
+                api_config=json.dumps({'endpoint': endpoint, 'requires_auth': True}),
+                created_at=now,
+                updated_at=now
+            ))
@@ -0,0 +1,12 @@
+"""
+Checksum SHA-256 de cada video
+
+Se calcula durante la subida (upload_pipeline) en la misma pasada en la que
+se escribe el archivo. Los videos anteriores quedan con checksum NULL.
+"""
+
+from migrations.runner import add_column_if_missing, create_index_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'videos', 'checksum', 'VARCHAR(64)')
+    create_index_if_missing(connection, 'ix_videos_checksum', 'videos', 'checksum')
@@ -0,0 +1,44 @@
+"""
+Tabla video_metadata: salida completa de ffprobe y matriz de compatibilidad
+
+Los videos subidos antes de esta versión no tienen fila; se pueden rellenar
+volviendo a ejecutar ffprobe sobre sus archivos si hace falta.
+"""
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text
+)
+
+metadata = MetaData()
+
+Table('videos', metadata, Column('id', Integer, primary_key=True))
+
+video_metadata = Table(
+    'video_metadata', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('video_id', Integer, ForeignKey('videos.id', ondelete='CASCADE'), nullable=False, unique=True),
+    Column('container', String(20)),
+    Column('format_name', String(100)),
+    Column('duration', Float),
+    Column('size', BigInteger),
+    Column('bit_rate', BigInteger),
+    Column('video_codec', String(50)),
+    Column('video_profile', String(50)),
+    Column('pixel_format', String(50)),
+    Column('width', Integer),
+    Column('height', Integer),
+    Column('rotation', Integer),
+    Column('frame_rate', Float),
+    Column('audio_codec', String(50)),
+    Column('audio_channels', Integer),
+    Column('audio_sample_rate', Integer),
+    Column('audio_bit_rate', BigInteger),
+    Column('probe', Text),
+    Column('compatibility', Text),
+    Column('limits_version', Integer),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+def upgrade(connection):
+    video_metadata.create(connection, checkfirst=True)
@@ -0,0 +1,27 @@
+"""
+Índices para las consultas por fecha y la carga de publicaciones
+
+En PostgreSQL init.sql ya crea idx_videos_upload_date e
+idx_publications_video_id; solo se añaden si la columna no tiene ya un
+índice propio (SQLite o bases creadas con create_all).
+"""
+
+from sqlalchemy import inspect
+
+from migrations.runner import create_index_if_missing
+
+INDEXES = [
+    ('ix_videos_upload_date', 'videos', 'upload_date'),
+    ('ix_publications_video_id', 'publications', 'video_id')
+]
+
+def _has_index_on(connection, table_name, column_name):
+    return any(
+        index['column_names'] == [column_name]
+        for index in inspect(connection).get_indexes(table_name)
+    )
+
+def upgrade(connection):
+    for index_name, table_name, column_name in INDEXES:
+        if not _has_index_on(connection, table_name, column_name):
+            create_index_if_missing(connection, index_name, table_name, column_name)
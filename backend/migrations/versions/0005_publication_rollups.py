@@ -0,0 +1,63 @@
+"""
+Tiempos de publicación y agregados horarios para analíticas
+
+Añade requested_at/completed_at a publications (las existentes se rellenan
+con created_at y, si ya terminaron, updated_at) y crea las tablas de
+agregados que lee /api/analytics/publications.
+"""
+
+from sqlalchemy import (
+    Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, UniqueConstraint, text
+)
+
+from migrations.runner import add_column_if_missing, create_index_if_missing
+
+metadata = MetaData()
+
+publication_rollups = Table(
+    'publication_rollups', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('bucket_start', DateTime, nullable=False),
+    Column('platform', String(50), nullable=False),
+    Column('total', Integer),
+    Column('published', Integer),
+    Column('failed', Integer),
+    Column('pending', Integer),
+    Column('latency_count', Integer),
+    Column('latency_sum_ms', Float),
+    Column('latency_histogram', Text),
+    Column('refreshed_at', DateTime),
+    UniqueConstraint('bucket_start', 'platform', name='uq_publication_rollups_bucket')
+)
+
+publication_failure_rollups = Table(
+    'publication_failure_rollups', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('bucket_start', DateTime, nullable=False),
+    Column('platform', String(50), nullable=False),
+    Column('reason', String(200), nullable=False),
+    Column('count', Integer),
+    Index('ix_publication_failure_rollups_bucket', 'bucket_start', 'platform')
+)
+
+rollup_state = Table(
+    'rollup_state', metadata,
+    Column('name', String(50), primary_key=True),
+    Column('watermark', DateTime),
+    Column('refreshed_at', DateTime)
+)
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'publications', 'requested_at', 'TIMESTAMP')
+    add_column_if_missing(connection, 'publications', 'completed_at', 'TIMESTAMP')
+    connection.execute(text(
+        "UPDATE publications SET requested_at = created_at WHERE requested_at IS NULL"
+    ))
+    connection.execute(text(
+        "UPDATE publications SET completed_at = COALESCE(published_at, updated_at) "
+        "WHERE completed_at IS NULL AND status IN ('published', 'failed')"
+    ))
+    # La actualización incremental busca publicaciones por updated_at
+    create_index_if_missing(connection, 'ix_publications_updated_at', 'publications', 'updated_at')
+
+    metadata.create_all(connection, checkfirst=True)
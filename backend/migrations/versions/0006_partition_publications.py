@@ -0,0 +1,167 @@
+"""
+Particionado mensual de publications en PostgreSQL
+
+Convierte la tabla publications en una tabla particionada por rango mensual
+de requested_at (con una partición por defecto), copia las filas existentes
+y crea la tabla publication_archive con los resúmenes de los meses
+archivados. La clave primaria pasa a ser (id, requested_at), como exige
+PostgreSQL; id sigue saliendo de la misma secuencia.
+
+Los índices por plataforma y estado no se recrean: los agregados se leen de
+publication_rollups. En SQLite no hace nada.
+"""
+
+from sqlalchemy import text
+
+PARTITION_FUNCTION = """
+-- Crear las particiones mensuales de publications desde from_month durante
+-- `months` meses. Las filas de esos meses que hubieran caído en la partición
+-- por defecto se mueven a su partición
+CREATE OR REPLACE FUNCTION ensure_publication_partitions(from_month DATE, months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months - 1 LOOP
+        month_start := (date_trunc('month', from_month) + make_interval(months => i))::DATE;
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := 'publications_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        CREATE TEMP TABLE IF NOT EXISTS publications_relocated (LIKE publications) ON COMMIT DROP;
+        TRUNCATE publications_relocated;
+        WITH moved AS (
+            DELETE FROM publications_default
+            WHERE requested_at >= month_start AND requested_at < month_end
+            RETURNING *
+        )
+        INSERT INTO publications_relocated SELECT * FROM moved;
+
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF publications FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_end
+        );
+        INSERT INTO publications SELECT * FROM publications_relocated;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+PUBLICATION_COLUMNS = (
+    'id, video_id, platform, platform_post_id, status, message, published_at, '
+    'requested_at, completed_at, created_at, updated_at'
+)
+
+ARCHIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS publication_archive (
+    id SERIAL PRIMARY KEY,
+    month DATE NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    platform VARCHAR(50) NOT NULL,
+    total INTEGER NOT NULL,
+    published INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    pending INTEGER NOT NULL,
+    last_status VARCHAR(20),
+    last_platform_post_id VARCHAR(100),
+    last_published_at TIMESTAMP WITH TIME ZONE,
+    first_requested_at TIMESTAMP WITH TIME ZONE,
+    last_requested_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_publication_archive UNIQUE (month, video_id, platform)
+)
+"""
+
+PUBLICATION_STATS_VIEW = """
+CREATE OR REPLACE VIEW publication_stats AS
+SELECT 
+    platform,
+    COUNT(*) as total_publications,
+    COUNT(CASE WHEN status = 'published' THEN 1 END) as successful_publications,
+    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed_publications,
+    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending_publications
+FROM publications
+GROUP BY platform
+"""
+
+def _is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('publications')"
+    )).scalar()
+
+def _convert(connection):
+    sequence = connection.execute(text(
+        "SELECT pg_get_serial_sequence('publications', 'id')"
+    )).scalar() or 'publications_id_seq'
+
+    # La vista depende de la tabla: se recrea al final
+    connection.execute(text("DROP VIEW IF EXISTS publication_stats"))
+    connection.execute(text("ALTER TABLE publications RENAME TO publications_legacy"))
+    connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    connection.execute(text(f"""
+        CREATE TABLE publications (
+            id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+            platform VARCHAR(50) NOT NULL,
+            platform_post_id VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'pending',
+            message TEXT,
+            published_at TIMESTAMP WITH TIME ZONE,
+            requested_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP WITH TIME ZONE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, requested_at)
+        ) PARTITION BY RANGE (requested_at)
+    """))
+    connection.execute(text("CREATE TABLE publications_default PARTITION OF publications DEFAULT"))
+    connection.execute(text(PARTITION_FUNCTION))
+
+    # Un mes por cada mes con datos y los tres siguientes al actual
+    connection.execute(text("""
+        SELECT ensure_publication_partitions(
+            first_month::DATE,
+            ((EXTRACT(YEAR FROM age(date_trunc('month', CURRENT_DATE), first_month)) * 12
+              + EXTRACT(MONTH FROM age(date_trunc('month', CURRENT_DATE), first_month)))::INTEGER + 4)
+        )
+        FROM (
+            SELECT date_trunc('month', COALESCE(MIN(COALESCE(requested_at, created_at)), CURRENT_DATE)) AS first_month
+            FROM publications_legacy
+        ) AS bounds
+    """))
+
+    connection.execute(text(f"""
+        INSERT INTO publications ({PUBLICATION_COLUMNS})
+        SELECT id, video_id, platform, platform_post_id, status, message, published_at,
+               COALESCE(requested_at, created_at, CURRENT_TIMESTAMP), completed_at,
+               created_at, updated_at
+        FROM publications_legacy
+    """))
+    connection.execute(text("DROP TABLE publications_legacy"))
+    connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY publications.id"))
+
+    connection.execute(text("CREATE INDEX idx_publications_video_id ON publications (video_id)"))
+    connection.execute(text("CREATE INDEX ix_publications_updated_at ON publications (updated_at)"))
+    if connection.execute(text("SELECT to_regproc('update_updated_at_column') IS NOT NULL")).scalar():
+        connection.execute(text("""
+            CREATE TRIGGER update_publications_updated_at
+                BEFORE UPDATE ON publications
+                FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
+        """))
+    connection.execute(text(PUBLICATION_STATS_VIEW))
+
+def upgrade(connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    if not _is_partitioned(connection):
+        _convert(connection)
+    else:
+        # Bases creadas con init.sql: asegurar la versión actual de la función
+        connection.execute(text(PARTITION_FUNCTION))
+    connection.execute(text(ARCHIVE_TABLE))
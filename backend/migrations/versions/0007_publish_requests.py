@@ -0,0 +1,33 @@
+"""
+Peticiones de publicación idempotentes
+
+Crea publish_requests, cuya restricción única sobre (video, plataforma,
+clave) garantiza una sola publicación en curso por clave entre workers y
+guarda el resultado para los reintentos con Idempotency-Key.
+"""
+
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, UniqueConstraint
+)
+
+metadata = MetaData()
+
+Table('videos', metadata, Column('id', Integer, primary_key=True))
+
+publish_requests = Table(
+    'publish_requests', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('video_id', Integer, ForeignKey('videos.id', ondelete='CASCADE'), nullable=False),
+    Column('platform', String(50), nullable=False),
+    Column('idempotency_key', String(100), nullable=False),
+    Column('status', String(20), nullable=False, server_default='in_progress'),
+    Column('publication_id', Integer),
+    Column('result', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    UniqueConstraint('video_id', 'platform', 'idempotency_key', name='uq_publish_requests_key'),
+    Index('ix_publish_requests_updated_at', 'updated_at')
+)
+
+def upgrade(connection):
+    publish_requests.create(connection, checkfirst=True)
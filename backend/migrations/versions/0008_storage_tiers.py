@@ -0,0 +1,24 @@
+"""
+Almacenamiento por niveles (caliente/frío) de los videos
+
+Añade storage_tier y last_accessed_at a videos. Los existentes empiezan en
+el nivel caliente con su fecha de subida como último acceso, de modo que los
+que nadie ha vuelto a usar pasan a frío en la primera ejecución de
+`flask --app app storage demote`.
+"""
+
+from sqlalchemy import text
+
+from migrations.runner import add_column_if_missing, create_index_if_missing
+
+def upgrade(connection):
+    add_column_if_missing(connection, 'videos', 'storage_tier', "VARCHAR(10) NOT NULL DEFAULT 'hot'")
+    add_column_if_missing(connection, 'videos', 'last_accessed_at', 'TIMESTAMP')
+    connection.execute(text(
+        "UPDATE videos SET last_accessed_at = COALESCE(upload_date, created_at) "
+        "WHERE last_accessed_at IS NULL"
+    ))
+    # La democión busca videos calientes por antigüedad del último acceso
+    create_index_if_missing(connection, 'ix_videos_tier_accessed', 'videos', 'storage_tier, last_accessed_at')
+    # /uploads/<filename> busca el video por nombre de archivo
+    create_index_if_missing(connection, 'ix_videos_filename', 'videos', 'filename')
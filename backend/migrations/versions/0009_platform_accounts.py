@@ -0,0 +1,47 @@
+"""
+Varias cuentas por plataforma
+
+Crea platform_accounts (credenciales, concurrencia y cuota de cada cuenta)
+y añade publications.account_id con la cuenta usada en cada publicación.
+Las cuentas se dan de alta con `flask --app app accounts add` o, a partir de
+las variables de entorno, con `flask --app app accounts import-env`.
+"""
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    UniqueConstraint
+)
+
+from migrations.runner import add_column_if_missing
+
+metadata = MetaData()
+
+Table('platforms', metadata, Column('id', Integer, primary_key=True), Column('name', String(50)))
+
+platform_accounts = Table(
+    'platform_accounts', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('platform', String(50), ForeignKey('platforms.name'), nullable=False),
+    Column('name', String(100), nullable=False),
+    Column('brand', String(100)),
+    Column('credentials', Text, nullable=False),
+    Column('is_active', Boolean, nullable=False, server_default='1'),
+    Column('max_concurrency', Integer, nullable=False, server_default='2'),
+    Column('quota_limit', Integer),
+    Column('quota_window_seconds', Integer, nullable=False, server_default='86400'),
+    Column('quota_used', Integer, nullable=False, server_default='0'),
+    Column('quota_reset_at', DateTime),
+    Column('in_flight', Integer, nullable=False, server_default='0'),
+    Column('in_flight_updated_at', DateTime),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    UniqueConstraint('platform', 'name', name='uq_platform_accounts_name'),
+    Index('ix_platform_accounts_platform_brand', 'platform', 'brand')
+)
+
+def upgrade(connection):
+    platform_accounts.create(connection, checkfirst=True)
+    add_column_if_missing(
+        connection, 'publications', 'account_id',
+        'INTEGER REFERENCES platform_accounts(id) ON DELETE SET NULL'
+    )
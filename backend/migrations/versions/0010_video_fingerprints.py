@@ -0,0 +1,25 @@
+"""
+Tabla video_fingerprints: hashes perceptuales de los fotogramas clave
+
+Los videos subidos antes de esta versión no tienen huellas; se calculan con
+`flask --app app fingerprints backfill`.
+"""
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, MetaData, Table
+
+metadata = MetaData()
+
+Table('videos', metadata, Column('id', Integer, primary_key=True))
+
+video_fingerprints = Table(
+    'video_fingerprints', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('video_id', Integer, ForeignKey('videos.id', ondelete='CASCADE'), nullable=False, index=True),
+    Column('frame_index', Integer, nullable=False),
+    Column('hash', BigInteger, nullable=False),
+    Column('version', Integer, nullable=False),
+    Column('created_at', DateTime)
+)
+
+def upgrade(connection):
+    video_fingerprints.create(connection, checkfirst=True)
@@ -0,0 +1,47 @@
+"""
+Tabla video_tag_map: una fila por cada tag de cada video
+
+videos.tags sigue siendo la fuente (texto separado por comas); esta copia
+normalizada permite filtrar por tag exacto y contar tags en SQL. Se rellena
+a partir de los videos existentes.
+"""
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, select
+
+metadata = MetaData()
+
+videos = Table('videos', metadata, Column('id', Integer, primary_key=True), Column('tags', String(500)))
+
+video_tag_map = Table(
+    'video_tag_map', metadata,
+    Column('video_id', Integer, ForeignKey('videos.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag', String(100), primary_key=True),
+    Index('ix_video_tag_map_tag_video', 'tag', 'video_id')
+)
+
+BACKFILL_BATCH = 1000
+
+def upgrade(connection):
+    video_tag_map.create(connection, checkfirst=True)
+    if connection.execute(select(video_tag_map.c.video_id).limit(1)).first():
+        return
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(videos.c.id, videos.c.tags)
+            .where(videos.c.id > last_id)
+            .order_by(videos.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        links = [
+            {'video_id': video_id, 'tag': tag}
+            for video_id, tags in rows
+            # Mismo criterio que Video.get_tags_list, sin repetidos
+            for tag in dict.fromkeys(t.strip() for t in (tags or '').split(',') if t.strip())
+        ]
+        if links:
+            connection.execute(video_tag_map.insert(), links)
+        last_id = rows[-1].id
@@ -0,0 +1,36 @@
+"""
+Reservas de cuentas con caducidad
+
+Crea platform_account_leases: una fila por publicación en curso con cada
+cuenta, renovada mientras el worker publica. Sustituye al reinicio del
+contador in_flight cuando llevaba un tiempo sin cambios, que descontaba
+también las publicaciones largas que seguían en curso. Los contadores
+anteriores no tienen reservas detrás, así que se ponen a cero (la migración
+se ejecuta con los workers parados).
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, inspect, update
+
+metadata = MetaData()
+
+platform_accounts = Table(
+    'platform_accounts', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('in_flight', Integer)
+)
+
+platform_account_leases = Table(
+    'platform_account_leases', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('account_id', Integer, ForeignKey('platform_accounts.id', ondelete='CASCADE'), nullable=False),
+    Column('holder', String(100)),
+    Column('acquired_at', DateTime, nullable=False),
+    Column('expires_at', DateTime, nullable=False),
+    Index('ix_platform_account_leases_account_expires', 'account_id', 'expires_at')
+)
+
+def upgrade(connection):
+    if inspect(connection).has_table('platform_account_leases'):
+        return
+    platform_account_leases.create(connection)
+    connection.execute(update(platform_accounts).values(in_flight=0))
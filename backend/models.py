@@ -1,8 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import json
+import logging
+from db_routing import RoutingSession
+from services.platform_limits import LIMITS_VERSION, compute_compatibility
 
-db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Video(db.Model):
     """Modelo para almacenar información de videos"""
@@ -15,15 +20,35 @@ class Video(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer)  # Tamaño en bytes
+    checksum = db.Column(db.String(64), index=True)  # SHA-256 del archivo
     duration = db.Column(db.Float)  # Duración en segundos
     tags = db.Column(db.String(500))  # Tags separados por comas
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Nivel de almacenamiento (hot: UPLOAD_FOLDER, cold: COLD_STORAGE_FOLDER)
+    storage_tier = db.Column(db.String(10), nullable=False, default='hot')
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow)  # Descarga o publicación
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_videos_tier_accessed', 'storage_tier', 'last_accessed_at'),
+        db.Index('ix_videos_filename', 'filename'),
+    )
+    
     # Relación con publicaciones
     publications = db.relationship('Publication', backref='video', lazy=True, cascade='all, delete-orphan')
     
+    # Metadatos de ffprobe y compatibilidad con cada plataforma
+    video_metadata = db.relationship('VideoMetadata', backref='video', uselist=False, lazy=True,
+                                     cascade='all, delete-orphan')
+    
+    # Tags normalizados (una fila por tag) para filtros exactos y facetas
+    tag_links = db.relationship('VideoTagMap', lazy=True, cascade='all, delete-orphan')
+    
+    # Huellas perceptuales de los fotogramas clave (detección de duplicados)
+    fingerprints = db.relationship('VideoFingerprint', backref='video', lazy=True,
+                                   cascade='all, delete-orphan')
+    
     def to_dict(self):
         """Convertir el objeto a diccionario"""
         return {
@@ -34,9 +59,12 @@ class Video(db.Model):
             'original_filename': self.original_filename,
             'file_path': self.file_path,
             'file_size': self.file_size,
+            'checksum': self.checksum,
             'duration': self.duration,
             'tags': self.tags.split(',') if self.tags else [],
             'upload_date': self.upload_date.isoformat(),
+            'storage_tier': self.storage_tier,
+            'last_accessed_at': self.last_accessed_at.isoformat() if self.last_accessed_at else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'publications': [pub.to_dict() for pub in self.publications]
@@ -54,20 +82,36 @@ class Video(db.Model):
             self.tags = ','.join([tag.strip() for tag in tags_list if tag.strip()])
         else:
             self.tags = ''
+    
+    def sync_tag_links(self):
+        """Reflejar self.tags en video_tag_map (llamar tras modificar tags)"""
+        wanted = list(dict.fromkeys(self.get_tags_list()))
+        current = {link.tag: link for link in self.tag_links}
+        for tag, link in current.items():
+            if tag not in wanted:
+                self.tag_links.remove(link)
+        for tag in wanted:
+            if tag not in current:
+                self.tag_links.append(VideoTagMap(tag=tag))
 
 class Publication(db.Model):
     """Modelo para almacenar información de publicaciones en redes sociales"""
     __tablename__ = 'publications'
     
     id = db.Column(db.Integer, primary_key=True)
-    video_id = db.Column(db.Integer, db.ForeignKey('videos.id'), nullable=False)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id'), nullable=False, index=True)
     platform = db.Column(db.String(50), nullable=False)  # instagram, tiktok, facebook, twitter
     platform_post_id = db.Column(db.String(100))  # ID del post en la plataforma
+    # Cuenta usada (None: credenciales de las variables de entorno)
+    account_id = db.Column(db.Integer, db.ForeignKey('platform_accounts.id', ondelete='SET NULL'))
     status = db.Column(db.String(20), default='pending')  # pending, published, failed
     message = db.Column(db.Text)  # Mensaje de estado o error
     published_at = db.Column(db.DateTime)
+    # Inicio de la publicación; en PostgreSQL es la clave de partición mensual
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)  # Fin (publicada o fallida)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def to_dict(self):
         """Convertir el objeto a diccionario"""
@@ -76,12 +120,22 @@ class Publication(db.Model):
             'video_id': self.video_id,
             'platform': self.platform,
             'platform_post_id': self.platform_post_id,
+            'account_id': self.account_id,
             'status': self.status,
             'message': self.message,
             'published_at': self.published_at.isoformat() if self.published_at else None,
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'latency_ms': self.latency_ms(),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+    
+    def latency_ms(self):
+        """Tiempo entre la solicitud y el resultado de la publicación"""
+        if not self.requested_at or not self.completed_at:
+            return None
+        return round((self.completed_at - self.requested_at).total_seconds() * 1000, 1)
 
 class Platform(db.Model):
     """Modelo para almacenar configuración de plataformas de redes sociales"""
@@ -119,6 +173,80 @@ class Platform(db.Model):
         """Establecer configuración de API desde diccionario"""
         self.api_config = json.dumps(config_dict)
 
+class PlatformAccount(db.Model):
+    """
+    Cuenta de una plataforma con sus credenciales. Cada cuenta tiene su
+    propio límite de publicaciones simultáneas y su cuota de llamadas por
+    ventana; in_flight y quota_used se actualizan con UPDATE condicionales
+    para que varios workers compartan los límites sin bloqueos. Cada hueco
+    ocupado de in_flight tiene su fila en platform_account_leases.
+    """
+    __tablename__ = 'platform_accounts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(50), db.ForeignKey('platforms.name'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    brand = db.Column(db.String(100))  # Marca a la que pertenece la cuenta
+    credentials = db.Column(db.Text, nullable=False)  # JSON: access_token, page_id...
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    max_concurrency = db.Column(db.Integer, nullable=False, default=2)
+    quota_limit = db.Column(db.Integer)  # Publicaciones por ventana (None: sin límite)
+    quota_window_seconds = db.Column(db.Integer, nullable=False, default=86400)
+    quota_used = db.Column(db.Integer, nullable=False, default=0)
+    quota_reset_at = db.Column(db.DateTime)  # Fin de la ventana de cuota actual
+    in_flight = db.Column(db.Integer, nullable=False, default=0)  # Publicaciones en curso
+    in_flight_updated_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('platform', 'name', name='uq_platform_accounts_name'),
+        db.Index('ix_platform_accounts_platform_brand', 'platform', 'brand'),
+    )
+    
+    def get_credentials(self):
+        """Credenciales como diccionario"""
+        try:
+            return json.loads(self.credentials or '{}')
+        except json.JSONDecodeError:
+            return {}
+    
+    def to_dict(self):
+        """Convertir el objeto a diccionario (sin credenciales)"""
+        return {
+            'id': self.id,
+            'platform': self.platform,
+            'name': self.name,
+            'brand': self.brand,
+            'is_active': self.is_active,
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'quota_limit': self.quota_limit,
+            'quota_window_seconds': self.quota_window_seconds,
+            'quota_used': self.quota_used,
+            'quota_reset_at': self.quota_reset_at.isoformat() if self.quota_reset_at else None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class PlatformAccountLease(db.Model):
+    """
+    Publicación en curso con una cuenta. El worker que la tiene renueva
+    expires_at mientras publica; una reserva caducada es de un worker caído
+    y se elimina devolviendo su hueco en in_flight.
+    """
+    __tablename__ = 'platform_account_leases'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('platform_accounts.id', ondelete='CASCADE'), nullable=False)
+    holder = db.Column(db.String(100))  # host:pid del worker, para diagnóstico
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_platform_account_leases_account_expires', 'account_id', 'expires_at'),
+    )
+
 class VideoTag(db.Model):
     """Modelo para almacenar tags únicos y su frecuencia de uso"""
     __tablename__ = 'video_tags'
@@ -139,6 +267,225 @@ class VideoTag(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+class VideoTagMap(db.Model):
+    """Relación video-tag (copia normalizada de Video.tags)"""
+    __tablename__ = 'video_tag_map'
+    
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    
+    __table_args__ = (
+        # Filtro por tag y recuento por tag sin leer la tabla
+        db.Index('ix_video_tag_map_tag_video', 'tag', 'video_id'),
+    )
+
+class PublishRequest(db.Model):
+    """
+    Petición de publicación de un video en una plataforma. La restricción
+    única sobre (video, plataforma, clave) garantiza una sola operación en
+    curso por clave entre todos los workers; el resultado se guarda para
+    devolverlo en los reintentos.
+    """
+    __tablename__ = 'publish_requests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), nullable=False)
+    platform = db.Column(db.String(50), nullable=False)
+    idempotency_key = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, completed
+    publication_id = db.Column(db.Integer)  # Sin FK: la PK de publications es compuesta en PostgreSQL
+    result = db.Column(db.Text)  # JSON: respuesta devuelta al cliente
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('video_id', 'platform', 'idempotency_key', name='uq_publish_requests_key'),
+    )
+
+class PublicationRollup(db.Model):
+    """Agregado horario de publicaciones por plataforma (para analíticas)"""
+    __tablename__ = 'publication_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime, nullable=False)  # Hora de requested_at
+    platform = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Integer, default=0)
+    published = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    pending = db.Column(db.Integer, default=0)
+    latency_count = db.Column(db.Integer, default=0)
+    latency_sum_ms = db.Column(db.Float, default=0)
+    latency_histogram = db.Column(db.Text)  # JSON: conteos por bucket de latencia
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('bucket_start', 'platform', name='uq_publication_rollups_bucket'),
+    )
+
+class PublicationFailureRollup(db.Model):
+    """Agregado horario de motivos de fallo por plataforma"""
+    __tablename__ = 'publication_failure_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    platform = db.Column(db.String(50), nullable=False)
+    reason = db.Column(db.String(200), nullable=False)
+    count = db.Column(db.Integer, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_publication_failure_rollups_bucket', 'bucket_start', 'platform'),
+    )
+
+class RollupState(db.Model):
+    """Marca de agua de cada proceso de agregación"""
+    __tablename__ = 'rollup_state'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    watermark = db.Column(db.DateTime)  # updated_at más reciente ya agregado
+    refreshed_at = db.Column(db.DateTime)
+
+def _parse_frame_rate(value):
+    """Convertir una fracción de ffprobe ('30000/1001') a float"""
+    try:
+        numerator, _, denominator = (value or '').partition('/')
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class VideoMetadata(db.Model):
+    """Modelo para almacenar los metadatos de ffprobe de cada video"""
+    __tablename__ = 'video_metadata'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), nullable=False, unique=True)
+    container = db.Column(db.String(20))  # mp4, mov, webm...
+    format_name = db.Column(db.String(100))  # format_name de ffprobe
+    duration = db.Column(db.Float)  # Duración en segundos
+    size = db.Column(db.BigInteger)  # Tamaño en bytes
+    bit_rate = db.Column(db.BigInteger)  # Bitrate total en bits/s
+    video_codec = db.Column(db.String(50))
+    video_profile = db.Column(db.String(50))
+    pixel_format = db.Column(db.String(50))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    rotation = db.Column(db.Integer, default=0)  # Grados (0, 90, 180, 270)
+    frame_rate = db.Column(db.Float)
+    audio_codec = db.Column(db.String(50))
+    audio_channels = db.Column(db.Integer)
+    audio_sample_rate = db.Column(db.Integer)
+    audio_bit_rate = db.Column(db.BigInteger)
+    probe = db.Column(db.Text)  # JSON completo devuelto por ffprobe
+    compatibility = db.Column(db.Text)  # JSON con la matriz de compatibilidad
+    limits_version = db.Column(db.Integer)  # Versión de los límites usada en la matriz
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def from_ffprobe(cls, probe, container=None, size=None):
+        """Crear los metadatos a partir de la salida JSON de ffprobe"""
+        format_info = probe.get('format', {})
+        streams = probe.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+        
+        # La rotación llega como tag (ffmpeg antiguo) o como side data
+        rotation = _int_or_none(video.get('tags', {}).get('rotate'))
+        if rotation is None:
+            rotation = next((_int_or_none(side_data.get('rotation'))
+                             for side_data in video.get('side_data_list', [])
+                             if 'rotation' in side_data), 0) or 0
+        
+        metadata = cls(
+            # ffprobe agrupa formatos ('mov,mp4,m4a,...'): se prefiere la extensión ya validada
+            container=container or (format_info.get('format_name') or '').split(',')[0] or None,
+            format_name=format_info.get('format_name'),
+            duration=_float_or_none(format_info.get('duration')),
+            size=_int_or_none(format_info.get('size')) or size,
+            bit_rate=_int_or_none(format_info.get('bit_rate')),
+            video_codec=video.get('codec_name'),
+            video_profile=video.get('profile'),
+            pixel_format=video.get('pix_fmt'),
+            width=_int_or_none(video.get('width')),
+            height=_int_or_none(video.get('height')),
+            rotation=abs(rotation) % 360,
+            frame_rate=_parse_frame_rate(video.get('avg_frame_rate')) or _parse_frame_rate(video.get('r_frame_rate')),
+            audio_codec=audio.get('codec_name'),
+            audio_channels=_int_or_none(audio.get('channels')),
+            audio_sample_rate=_int_or_none(audio.get('sample_rate')),
+            audio_bit_rate=_int_or_none(audio.get('bit_rate')),
+            probe=json.dumps(probe)
+        )
+        metadata.refresh_compatibility()
+        return metadata
+    
+    def display_size(self):
+        """Resolución tal como se reproduce (teniendo en cuenta la rotación)"""
+        if self.rotation in (90, 270):
+            return self.height, self.width
+        return self.width, self.height
+    
+    def refresh_compatibility(self):
+        """Recalcular la matriz de compatibilidad con los límites actuales"""
+        self.compatibility = json.dumps(compute_compatibility(self.to_dict(include_compatibility=False)))
+        self.limits_version = LIMITS_VERSION
+    
+    def get_compatibility(self):
+        """Matriz de compatibilidad (recalculada si los límites cambiaron)"""
+        if self.limits_version != LIMITS_VERSION or not self.compatibility:
+            return compute_compatibility(self.to_dict(include_compatibility=False))
+        return json.loads(self.compatibility)
+    
+    def to_dict(self, include_compatibility=True):
+        """Convertir el objeto a diccionario"""
+        display_width, display_height = self.display_size()
+        data = {
+            'video_id': self.video_id,
+            'container': self.container,
+            'format_name': self.format_name,
+            'duration': self.duration,
+            'size': self.size,
+            'bit_rate': self.bit_rate,
+            'video_codec': self.video_codec,
+            'video_profile': self.video_profile,
+            'pixel_format': self.pixel_format,
+            'width': self.width,
+            'height': self.height,
+            'display_width': display_width,
+            'display_height': display_height,
+            'rotation': self.rotation,
+            'frame_rate': self.frame_rate,
+            'audio_codec': self.audio_codec,
+            'audio_channels': self.audio_channels,
+            'audio_sample_rate': self.audio_sample_rate,
+            'audio_bit_rate': self.audio_bit_rate
+        }
+        if include_compatibility:
+            data['compatibility'] = self.get_compatibility()
+        return data
+
+class VideoFingerprint(db.Model):
+    """Hash perceptual (dHash de 64 bits) de un fotograma clave de un video"""
+    __tablename__ = 'video_fingerprints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), nullable=False, index=True)
+    frame_index = db.Column(db.Integer, nullable=False)  # Orden del fotograma clave en el video
+    hash = db.Column(db.BigInteger, nullable=False)  # 64 bits guardados con signo (BIGINT)
+    version = db.Column(db.Integer, nullable=False)  # Versión del algoritmo que generó el hash
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # Función para inicializar datos predeterminados
 def init_default_data():
     """Inicializar datos predeterminados en la base de datos"""
@@ -193,4 +540,4 @@ def init_default_data():
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        print(f"Error inicializando datos predeterminados: {e}")
\ No newline at end of file
+        logger.error("Error inicializando datos predeterminados: %s", e)
\ No newline at end of file
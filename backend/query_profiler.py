@@ -0,0 +1,152 @@
+"""
+Instrumentación de consultas SQL por petición y detector de N+1
+
+Cada petición acumula el número de consultas, el tiempo total en base de
+datos y las sentencias más lentas. Si una misma forma de sentencia se repite
+muchas veces dentro de una petición se marca como probable N+1 y se escribe
+en el log de consultas lentas.
+"""
+
+import heapq
+import logging
+import re
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logging_setup import JsonFormatter, queued
+
+slow_query_logger = logging.getLogger('socialman.slow_queries')
+
+# Expresiones para reducir una sentencia a su "forma" (sin literales)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+|%s|__\[POSTCOMPILE_\w+\])(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|%s))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement):
+    """Normalizar una sentencia SQL para agrupar consultas equivalentes"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PARAM_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+class QueryProfile:
+    """Estadísticas de las consultas SQL ejecutadas durante una petición"""
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.slowest = []  # heap de (duración, sentencia)
+
+    def record(self, statement, elapsed):
+        """Registrar una consulta ejecutada"""
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+        entry = (elapsed, statement)
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, entry)
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def repeated_shapes(self, threshold):
+        """Formas de sentencia repetidas al menos `threshold` veces"""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def slowest_statements(self):
+        """Sentencias más lentas, de mayor a menor duración"""
+        return sorted(self.slowest, reverse=True)
+
+    def to_dict(self):
+        """Convertir el perfil a diccionario"""
+        return {
+            'query_count': self.count,
+            'db_time_ms': round(self.total_time * 1000, 2),
+            'slowest': [
+                {'duration_ms': round(elapsed * 1000, 2), 'statement': statement}
+                for elapsed, statement in self.slowest_statements()
+            ]
+        }
+
+def _current_profile():
+    if not has_request_context():
+        return None
+    return g.get('query_profile')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    started = conn.info.get('profiler_query_start')
+    if profile is None or not started:
+        return
+    profile.record(statement, time.perf_counter() - started.pop())
+
+def _report(profile):
+    """Escribir en el log de consultas lentas los N+1 y sentencias lentas"""
+    config = current_app.config
+    route = f"{request.method} {request.path}"
+
+    for shape, count in profile.repeated_shapes(config['N_PLUS_ONE_THRESHOLD']):
+        slow_query_logger.warning(
+            'Posible N+1 en %s: %d ejecuciones de %s', route, count, shape
+        )
+
+    threshold = config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+    for elapsed, statement in profile.slowest_statements():
+        if elapsed < threshold:
+            break
+        slow_query_logger.warning(
+            'Consulta lenta en %s (%.1f ms): %s', route, elapsed * 1000,
+            _WHITESPACE.sub(' ', statement).strip()
+        )
+
+def init_query_profiler(app):
+    """Registrar la instrumentación de consultas en la aplicación"""
+    if not app.config.get('QUERY_PROFILING_ENABLED', True):
+        return
+
+    log_path = app.config.get('SLOW_QUERY_LOG')
+    if log_path and not slow_query_logger.handlers:
+        handler = RotatingFileHandler(log_path, maxBytes=10240000, backupCount=5)
+        handler.setFormatter(JsonFormatter())
+        # Escritura en segundo plano, como el resto de logs
+        slow_query_logger.addHandler(queued(handler))
+        slow_query_logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def _start_query_profile():
+        g.query_profile = QueryProfile(app.config.get('QUERY_PROFILE_TOP_N', 5))
+        g.query_profile_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_query_profile(response):
+        profile = g.pop('query_profile', None)
+        started = g.pop('query_profile_start', None)
+        if profile is None:
+            return response
+
+        _report(profile)
+
+        if app.config.get('SERVER_TIMING_ENABLED'):
+            total_ms = (time.perf_counter() - started) * 1000
+            response.headers['Server-Timing'] = (
+                f'db;dur={profile.total_time * 1000:.2f};desc="{profile.count} queries", '
+                f'app;dur={total_ms:.2f}'
+            )
+        return response
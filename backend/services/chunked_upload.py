@@ -0,0 +1,422 @@
+"""
+Subida por partes de videos a las plataformas
+
+Motor común para los protocolos de subida por partes de las plataformas:
+X (INIT/APPEND/FINALIZE), sesiones reanudables de Facebook y subida por
+partes de TikTok. Cada protocolo define cómo se abre la sesión, cómo se
+envía una parte y cómo se cierra; el motor se encarga de:
+
+- Leer las partes del archivo con mmap, sin cargarlo entero en memoria
+  (cada parte es una vista del mapeo, no una copia).
+- Enviar varias partes en paralelo cuando el protocolo lo permite (X
+  numera los segmentos; Facebook y TikTok exigen orden).
+- Reintentar con espera exponencial los errores transitorios (conexión,
+  5xx, 429).
+- Reanudar: la sesión y las partes confirmadas se guardan en
+  CHUNKED_UPLOAD_STATE_DIR, de modo que un nuevo intento continúa desde la
+  última parte confirmada en lugar de volver a subir el archivo.
+
+Para probarlo sin las APIs reales está fake_platform_server.py.
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+REQUEST_TIMEOUT = 60
+
+class ChunkedUploadError(Exception):
+    """Error de subida; retryable indica si tiene sentido reintentar"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+def _request(method, url, **kwargs):
+    """Petición HTTP que convierte los fallos en ChunkedUploadError"""
+    try:
+        response = requests.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise ChunkedUploadError(f"Error de conexión: {e}", retryable=True)
+    if response.status_code >= 500 or response.status_code == 429:
+        raise ChunkedUploadError(f"HTTP {response.status_code}: {response.text[:200]}", retryable=True)
+    if response.status_code >= 400:
+        raise ChunkedUploadError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response
+
+class MappedFile:
+    """Archivo de solo lectura mapeado en memoria"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if not self.size:
+            self._file.close()
+            raise ChunkedUploadError("El archivo está vacío")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+    def chunk(self, start, end):
+        """Vista de los bytes [start, end) sin copiarlos"""
+        return self._view[start:end]
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Alguna vista sigue viva (petición abortada): se cierra al recolectarla
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ChunkedProtocol:
+    """
+    Protocolo de subida por partes de una plataforma. El estado de la sesión
+    es un diccionario serializable a JSON para poder reanudarla.
+    """
+
+    name = 'base'
+    parallel = False
+    default_chunk_size = 4 * MB
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or self.default_chunk_size
+
+    def start(self, size, mime_type):
+        """Abrir la sesión de subida y devolver su estado"""
+        raise NotImplementedError
+
+    def ranges(self, size):
+        """Partes [(índice, inicio, fin)] para los protocolos paralelos"""
+        return [
+            (index, start, min(start + self.chunk_size, size))
+            for index, start in enumerate(range(0, size, self.chunk_size))
+        ]
+
+    def next_range(self, state, size):
+        """Siguiente parte (inicio, fin) de un protocolo secuencial, o None"""
+        offset = state.get('offset', 0)
+        if offset >= size:
+            return None
+        return offset, min(offset + self.chunk_size, size)
+
+    def upload_chunk(self, state, index, start, end, size, data):
+        """Enviar una parte; devuelve el estado actualizado"""
+        raise NotImplementedError
+
+    def finish(self, state):
+        """Cerrar la sesión; devuelve {'media_id': ...}"""
+        raise NotImplementedError
+
+class TwitterChunkedProtocol(ChunkedProtocol):
+    """X media upload: INIT, APPEND por segmentos (en paralelo) y FINALIZE"""
+
+    name = 'twitter'
+    parallel = True
+    default_chunk_size = 4 * MB  # Máximo 5 MB por segmento
+
+    # Espera máxima al procesado del video tras FINALIZE
+    MAX_PROCESSING_SECONDS = 300
+
+    def __init__(self, upload_url, bearer_token, chunk_size=None, media_category='tweet_video'):
+        super().__init__(chunk_size)
+        self.upload_url = upload_url
+        self.media_category = media_category
+        self.headers = {'Authorization': f'Bearer {bearer_token}'}
+
+    def start(self, size, mime_type):
+        response = _request('POST', self.upload_url, headers=self.headers, data={
+            'command': 'INIT',
+            'total_bytes': size,
+            'media_type': mime_type,
+            'media_category': self.media_category
+        })
+        return {'media_id': response.json()['media_id_string']}
+
+    def upload_chunk(self, state, index, start, end, size, data):
+        _request('POST', self.upload_url, headers=self.headers, data={
+            'command': 'APPEND',
+            'media_id': state['media_id'],
+            'segment_index': index
+        }, files={'media': ('chunk', data, 'application/octet-stream')})
+        return state
+
+    def finish(self, state):
+        response = _request('POST', self.upload_url, headers=self.headers, data={
+            'command': 'FINALIZE',
+            'media_id': state['media_id']
+        })
+        processing = response.json().get('processing_info')
+        deadline = time.monotonic() + self.MAX_PROCESSING_SECONDS
+        while processing and processing.get('state') in ('pending', 'in_progress'):
+            if time.monotonic() > deadline:
+                raise ChunkedUploadError("X no terminó de procesar el video a tiempo")
+            time.sleep(processing.get('check_after_secs', 1))
+            processing = _request('GET', self.upload_url, headers=self.headers, params={
+                'command': 'STATUS',
+                'media_id': state['media_id']
+            }).json().get('processing_info')
+        if processing and processing.get('state') == 'failed':
+            error = processing.get('error', {}).get('message', 'error desconocido')
+            raise ChunkedUploadError(f"X rechazó el video: {error}")
+        return {'media_id': state['media_id']}
+
+class FacebookResumableProtocol(ChunkedProtocol):
+    """
+    Sesión reanudable de la Graph API (upload_phase start/transfer/finish).
+    El servidor indica el rango de cada parte, así que es secuencial.
+    """
+
+    name = 'facebook'
+
+    def __init__(self, graph_url, page_id, access_token, title='', description=''):
+        super().__init__()
+        self.videos_url = f"{graph_url}/{page_id}/videos"
+        self.access_token = access_token
+        self.title = title
+        self.description = description
+
+    def start(self, size, mime_type):
+        data = _request('POST', self.videos_url, data={
+            'upload_phase': 'start',
+            'file_size': size,
+            'access_token': self.access_token
+        }).json()
+        return {
+            'upload_session_id': data['upload_session_id'],
+            'video_id': data['video_id'],
+            'offset': int(data['start_offset']),
+            'end_offset': int(data['end_offset'])
+        }
+
+    def next_range(self, state, size):
+        if state['offset'] >= size or state['offset'] >= state['end_offset']:
+            return None
+        return state['offset'], state['end_offset']
+
+    def upload_chunk(self, state, index, start, end, size, data):
+        response = _request('POST', self.videos_url, data={
+            'upload_phase': 'transfer',
+            'upload_session_id': state['upload_session_id'],
+            'start_offset': start,
+            'access_token': self.access_token
+        }, files={'video_file_chunk': ('chunk', data, 'application/octet-stream')}).json()
+        return dict(state, offset=int(response['start_offset']), end_offset=int(response['end_offset']))
+
+    def finish(self, state):
+        _request('POST', self.videos_url, data={
+            'upload_phase': 'finish',
+            'upload_session_id': state['upload_session_id'],
+            'title': self.title,
+            'description': self.description,
+            'access_token': self.access_token
+        })
+        return {'media_id': state['video_id']}
+
+class TikTokChunkedProtocol(ChunkedProtocol):
+    """
+    Content Posting API con source FILE_UPLOAD: las partes se envían en
+    orden con PUT y Content-Range. TikTok cuenta floor(tamaño / chunk_size)
+    partes y la última absorbe el resto; por debajo de 5 MB va entero.
+    """
+
+    name = 'tiktok'
+    default_chunk_size = 10 * MB  # Entre 5 y 64 MB
+
+    MIN_CHUNK_SIZE = 5 * MB
+
+    def __init__(self, api_url, access_token, chunk_size=None, title='', privacy_level='SELF_ONLY'):
+        super().__init__(chunk_size)
+        self.api_url = api_url
+        self.title = title
+        self.privacy_level = privacy_level
+        self.headers = {'Authorization': f'Bearer {access_token}'}
+
+    def _layout(self, size):
+        chunk_size = self.chunk_size if size >= max(self.chunk_size, self.MIN_CHUNK_SIZE) else size
+        return chunk_size, max(size // chunk_size, 1)
+
+    def start(self, size, mime_type):
+        chunk_size, total_chunks = self._layout(size)
+        data = _request('POST', f"{self.api_url}/v2/post/publish/video/init/", headers=self.headers, json={
+            'post_info': {'title': self.title, 'privacy_level': self.privacy_level},
+            'source_info': {
+                'source': 'FILE_UPLOAD',
+                'video_size': size,
+                'chunk_size': chunk_size,
+                'total_chunk_count': total_chunks
+            }
+        }).json()['data']
+        return {
+            'publish_id': data['publish_id'],
+            'upload_url': data['upload_url'],
+            'mime_type': mime_type,
+            'offset': 0
+        }
+
+    def next_range(self, state, size):
+        offset = state['offset']
+        if offset >= size:
+            return None
+        chunk_size, total_chunks = self._layout(size)
+        last = offset // chunk_size >= total_chunks - 1
+        return offset, size if last else offset + chunk_size
+
+    def upload_chunk(self, state, index, start, end, size, data):
+        _request('PUT', state['upload_url'], data=data, headers={
+            'Content-Type': state['mime_type'],
+            'Content-Range': f"bytes {start}-{end - 1}/{size}"
+        })
+        return dict(state, offset=end)
+
+    def finish(self, state):
+        return {'media_id': state['publish_id']}
+
+class ChunkedUploader:
+    """Motor de subida por partes con lectura mmap, paralelismo y reanudación"""
+
+    def __init__(self, protocol, state_dir, max_workers=4, max_retries=5, backoff=0.5):
+        self.protocol = protocol
+        self.state_dir = state_dir
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def upload(self, path, resume_key, mime_type='video/mp4'):
+        """Subir el archivo y devolver el resultado de protocol.finish()"""
+        started = time.perf_counter()
+        stat = os.stat(path)
+        record = self._load(resume_key, stat)
+        resumed = record is not None
+
+        try:
+            result = self._upload(path, resume_key, mime_type, stat, record)
+        except ChunkedUploadError as e:
+            if not resumed or e.retryable:
+                raise
+            # La sesión guardada ya no es válida (caducada): empezar de cero
+            logger.warning("Sesión de %s no reanudable (%s); se reinicia la subida",
+                           self.protocol.name, e)
+            self._discard(resume_key)
+            result = self._upload(path, resume_key, mime_type, stat, None)
+
+        self._discard(resume_key)
+        logger.info("Subida por partes a %s completada: %d bytes en %.1f s",
+                    self.protocol.name, stat.st_size, time.perf_counter() - started)
+        return result
+
+    def _upload(self, path, resume_key, mime_type, stat, record):
+        if record is None:
+            state = self._retry(lambda: self.protocol.start(stat.st_size, mime_type))
+            record = {
+                'protocol': self.protocol.name,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'state': state,
+                'acked': []
+            }
+            self._save(resume_key, record)
+        else:
+            logger.info("Reanudando subida a %s (%s)", self.protocol.name, resume_key)
+
+        with MappedFile(path) as mapped:
+            if self.protocol.parallel:
+                self._upload_parallel(mapped, resume_key, record)
+            else:
+                self._upload_sequential(mapped, resume_key, record)
+
+        return self._retry(lambda: self.protocol.finish(record['state']))
+
+    def _upload_parallel(self, mapped, resume_key, record):
+        acked = set(record['acked'])
+        pending = [part for part in self.protocol.ranges(mapped.size) if part[0] not in acked]
+        lock = threading.Lock()
+
+        def send(part):
+            index, start, end = part
+            with mapped.chunk(start, end) as data:
+                self._retry(lambda: self.protocol.upload_chunk(
+                    record['state'], index, start, end, mapped.size, data
+                ))
+            with lock:
+                acked.add(index)
+                record['acked'] = sorted(acked)
+                self._save(resume_key, record)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(send, part) for part in pending]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                # Las partes confirmadas quedan guardadas para reanudar
+                future.result()
+
+    def _upload_sequential(self, mapped, resume_key, record):
+        while True:
+            part = self.protocol.next_range(record['state'], mapped.size)
+            if part is None:
+                return
+            start, end = part
+            with mapped.chunk(start, end) as data:
+                record['state'] = self._retry(lambda: self.protocol.upload_chunk(
+                    record['state'], start // self.protocol.chunk_size, start, end, mapped.size, data
+                ))
+            self._save(resume_key, record)
+
+    def _retry(self, operation):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return operation()
+            except ChunkedUploadError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.debug("Reintento %d de %s en %.1f s: %s",
+                             attempt + 1, self.protocol.name, delay, e)
+                time.sleep(delay)
+
+    def _path(self, resume_key):
+        return os.path.join(self.state_dir, f"{resume_key}.json")
+
+    def _load(self, resume_key, stat):
+        try:
+            with open(self._path(resume_key)) as state_file:
+                record = json.load(state_file)
+        except (OSError, ValueError):
+            return None
+        # Solo se reanuda si es el mismo archivo y el mismo protocolo
+        if (record.get('protocol') != self.protocol.name or record.get('size') != stat.st_size
+                or record.get('mtime') != stat.st_mtime):
+            return None
+        return record
+
+    def _save(self, resume_key, record):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._path(resume_key)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as state_file:
+            json.dump(record, state_file)
+        os.replace(temporary, path)
+
+    def _discard(self, resume_key):
+        try:
+            os.remove(self._path(resume_key))
+        except FileNotFoundError:
+            pass
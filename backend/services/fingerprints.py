@@ -0,0 +1,473 @@
+"""
+Huellas perceptuales para detectar videos casi duplicados
+
+El checksum solo detecta copias idénticas byte a byte; una copia
+recodificada, recortada o con otro contenedor tiene otro checksum. Al subir
+un video se extraen sus fotogramas clave con ffmpeg (sin decodificar el
+resto) y de cada uno se calcula con Pillow un dHash de 64 bits: dos
+fotogramas parecidos tienen hashes a poca distancia de Hamming aunque
+cambien la resolución, el bitrate o el códec.
+
+Los hashes se guardan en video_fingerprints y se cargan en un índice en
+memoria de multi-index hashing: cada hash se parte en CHUNKS trozos de 16
+bits y cada trozo indexa una tabla. Si dos hashes están a distancia <= r,
+algún trozo está a distancia <= r // CHUNKS (principio del palomar), así
+que basta con consultar en cada tabla las pocas claves a esa distancia del
+trozo buscado y verificar solo esos candidatos, sin recorrer todos los
+videos.
+
+La similitud entre dos videos es la fracción de fotogramas de uno que
+tienen pareja en el otro (la mayor de las dos direcciones, para que un
+recorte de un video largo también cuente como duplicado).
+"""
+
+import logging
+import subprocess
+import threading
+import time
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+import click
+from flask.cli import AppGroup
+from PIL import Image, ImageStat
+from sqlalchemy import func, insert
+
+from metrics import FINGERPRINT_DURATION
+from models import db, Video, VideoFingerprint
+from services.storage_tiers import GZIP_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# Subir al cambiar la extracción o el hash: las huellas anteriores dejan de
+# usarse hasta regenerarlas con `flask fingerprints backfill`
+FINGERPRINT_VERSION = 1
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Tamaño al que ffmpeg reduce cada fotograma (escala de grises, 1 byte por píxel)
+FRAME_SIZE = 32
+# Fotogramas casi uniformes (negro, fundidos): su hash es ruido y coincide con todo
+FLAT_FRAME_STDDEV = 6.0
+# Fotogramas clave consecutivos a esta distancia o menos se guardan una sola vez
+CONSECUTIVE_DUPLICATE_DISTANCE = 4
+# Fotogramas clave decodificados por cada hash guardado (margen para los
+# descartados por uniformes o repetidos); acota el trabajo de ffmpeg
+DECODED_FRAMES_PER_HASH = 4
+
+class FingerprintError(Exception):
+    """No se pudieron extraer los fotogramas del video"""
+
+def to_signed(value):
+    """Hash sin signo de 64 bits -> valor para una columna BIGINT"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+def to_unsigned(value):
+    """Valor leído de BIGINT -> hash sin signo de 64 bits"""
+    return value & ((1 << HASH_BITS) - 1)
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def dhash(image):
+    """dHash: cada bit indica si un píxel es más claro que su vecino de la derecha"""
+    pixels = image.resize((9, 8), Image.Resampling.BOX).tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for column in range(8):
+            value = (value << 1) | (pixels[offset + column] < pixels[offset + column + 1])
+    return value
+
+def _keyframes(file_path, timeout, max_frames, duration=None):
+    """
+    Fotogramas clave del video como imágenes FRAME_SIZE x FRAME_SIZE en gris:
+    como mucho max_frames * DECODED_FRAMES_PER_HASH, repartidos por todo el
+    video si se conoce su duración
+    """
+    limit = max_frames * DECODED_FRAMES_PER_HASH
+    filters = f'scale={FRAME_SIZE}:{FRAME_SIZE}:flags=area,format=gray'
+    if duration:
+        # Saltar los fotogramas clave demasiado cercanos al anterior elegido
+        interval = duration / limit
+        filters = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',{filters}"
+    cmd = [
+        'ffmpeg', '-v', 'error', '-nostdin',
+        # Solo se decodifican los fotogramas clave
+        '-skip_frame', 'nokey', '-i', file_path,
+        '-an', '-sn', '-vsync', 'passthrough',
+        '-vf', filters,
+        # ffmpeg termina al llegar al límite aunque el video siga
+        '-frames:v', str(limit),
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise FingerprintError("ffmpeg no está instalado")
+    except subprocess.TimeoutExpired:
+        raise FingerprintError(f"ffmpeg superó {timeout} s")
+    if result.returncode != 0:
+        raise FingerprintError(f"ffmpeg falló: {result.stderr.decode(errors='replace').strip()[-300:]}")
+
+    frame_bytes = FRAME_SIZE * FRAME_SIZE
+    data = result.stdout
+    return [
+        Image.frombytes('L', (FRAME_SIZE, FRAME_SIZE), data[start:start + frame_bytes])
+        for start in range(0, len(data) - frame_bytes + 1, frame_bytes)
+    ]
+
+def compute_hashes(file_path, max_frames, timeout=20, duration=None):
+    """Hashes de los fotogramas clave, como mucho max_frames repartidos por todo el video"""
+    hashes = []
+    for frame in _keyframes(file_path, timeout, max_frames, duration):
+        if ImageStat.Stat(frame).stddev[0] < FLAT_FRAME_STDDEV:
+            continue
+        value = dhash(frame)
+        if hashes and hamming(hashes[-1], value) <= CONSECUTIVE_DUPLICATE_DISTANCE:
+            continue
+        hashes.append(value)
+
+    if len(hashes) > max_frames:
+        step = (len(hashes) - 1) / (max_frames - 1) if max_frames > 1 else 0
+        hashes = [hashes[round(position * step)] for position in range(max_frames)]
+    return hashes
+
+@lru_cache(maxsize=None)
+def _chunk_masks(radius):
+    """Máscaras de CHUNK_BITS bits con como mucho `radius` bits activos"""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return tuple(masks)
+
+class HashIndex:
+    """
+    Multi-index hashing sobre los hashes de todos los videos.
+
+    Las entradas se guardan en arrays compactos (8 bytes por hash y 8 por
+    video) y cada tabla asocia un trozo de 16 bits con los índices de las
+    entradas que lo contienen. Volver a indexar un video no borra sus
+    entradas anteriores: se ignoran (first_entry) hasta la siguiente
+    reconstrucción completa.
+    """
+
+    def __init__(self):
+        self.hashes = array('Q')
+        self.videos = array('q')
+        self.tables = [defaultdict(lambda: array('I')) for _ in range(CHUNKS)]
+        self.first_entry = {}  # video_id -> índice de su primera entrada vigente
+        self.frame_counts = {}  # video_id -> número de hashes vigentes
+
+    def add(self, video_id, hashes):
+        self.first_entry[video_id] = len(self.hashes)
+        self.frame_counts[video_id] = len(hashes)
+        for value in hashes:
+            entry = len(self.hashes)
+            self.hashes.append(value)
+            self.videos.append(video_id)
+            for chunk, table in enumerate(self.tables):
+                table[(value >> (chunk * CHUNK_BITS)) & CHUNK_MASK].append(entry)
+
+    def remove(self, video_id):
+        self.first_entry.pop(video_id, None)
+        self.frame_counts.pop(video_id, None)
+
+    def matches(self, hashes, max_distance, exclude=None):
+        """
+        Por cada video con algún fotograma a <= max_distance: fotogramas de
+        la consulta con pareja, entradas del video con pareja y distancia mínima
+        """
+        masks = _chunk_masks(max_distance // CHUNKS)
+        found = {}
+        for position, value in enumerate(hashes):
+            seen = set()
+            for chunk, table in enumerate(self.tables):
+                key = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+                for mask in masks:
+                    bucket = table.get(key ^ mask)
+                    if not bucket:
+                        continue
+                    for entry in bucket:
+                        if entry in seen:
+                            continue
+                        seen.add(entry)
+                        video_id = self.videos[entry]
+                        first = self.first_entry.get(video_id)
+                        if video_id == exclude or first is None or entry < first:
+                            continue
+                        distance = hamming(self.hashes[entry], value)
+                        if distance > max_distance:
+                            continue
+                        match = found.get(video_id)
+                        if match is None:
+                            found[video_id] = match = [set(), set(), distance]
+                        match[0].add(position)
+                        match[1].add(entry)
+                        match[2] = min(match[2], distance)
+        return found
+
+class FingerprintIndex:
+    """
+    Índice de huellas de cada worker, cargado al primer uso.
+
+    Cada refresh_seconds se leen las huellas nuevas de otros workers (id
+    mayor que el último leído) y cada rebuild_seconds se reconstruye
+    entero, lo que recoge también las transacciones que confirmaron tarde y
+    libera las entradas de videos borrados o regenerados. Los videos
+    borrados en otros workers se descartan al leer sus títulos.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.max_frames = 32
+        self.max_distance = 10
+        self.duplicate_min_similarity = 0.6
+        self.refresh_seconds = 30
+        self.rebuild_seconds = 3600
+        self.timeout = 20
+        self._index = HashIndex()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._watermark = 0
+        self._indexed_up_to = {}  # video_id -> mayor id de huella ya indexado
+        self._last_refresh = 0.0
+        self._built_at = 0.0
+
+    def configure(self, config):
+        self.enabled = config.get('FINGERPRINTS_ENABLED', True)
+        self.max_frames = config.get('FINGERPRINT_MAX_FRAMES', 32)
+        self.max_distance = config.get('FINGERPRINT_MAX_DISTANCE', 10)
+        self.duplicate_min_similarity = config.get('DUPLICATE_MIN_SIMILARITY', 0.6)
+        self.refresh_seconds = config.get('FINGERPRINT_INDEX_REFRESH_SECONDS', 30)
+        self.rebuild_seconds = config.get('FINGERPRINT_INDEX_REBUILD_SECONDS', 3600)
+        self.timeout = config.get('FINGERPRINT_TIMEOUT_SECONDS', 20)
+
+    def fingerprint_video(self, video, file_path=None):
+        """Calcular, guardar (reemplazando las anteriores) e indexar las huellas de un video"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            hashes = compute_hashes(file_path or video.file_path, self.max_frames, self.timeout, video.duration)
+            outcome = 'success'
+        finally:
+            FINGERPRINT_DURATION.labels(outcome=outcome).observe(time.perf_counter() - started)
+
+        VideoFingerprint.query.filter_by(video_id=video.id).delete(synchronize_session=False)
+        row_ids = []
+        if hashes:
+            # Un solo INSERT de varias filas en lugar de uno por fotograma
+            row_ids = db.session.scalars(
+                insert(VideoFingerprint).returning(VideoFingerprint.id),
+                [{'video_id': video.id, 'frame_index': position, 'hash': to_signed(value),
+                  'version': FINGERPRINT_VERSION}
+                 for position, value in enumerate(hashes)]
+            ).all()
+        db.session.commit()
+
+        with self._lock:
+            self._index.add(video.id, hashes)
+            self._indexed_up_to[video.id] = max(row_ids, default=0)
+        return hashes
+
+    def check_upload(self, video):
+        """
+        Huellas de un video recién subido y los videos que parecen el mismo
+        clip. Un fallo no debe anular la subida: se registra y se devuelve [].
+        """
+        try:
+            hashes = self.fingerprint_video(video)
+            if not hashes:
+                return []
+            return self.similar_to(hashes, exclude=video.id,
+                                   min_similarity=self.duplicate_min_similarity)
+        except FingerprintError as e:
+            logger.warning("No se pudieron calcular las huellas del video %s: %s", video.id, e)
+            return []
+        except Exception:
+            db.session.rollback()
+            logger.warning("No se pudieron calcular las huellas del video %s", video.id, exc_info=True)
+            return []
+
+    def similar(self, video_id, max_distance=None, limit=20, min_similarity=None):
+        """Videos parecidos a uno ya indexado (None si no tiene huellas)"""
+        hashes = [
+            to_unsigned(value) for value, in
+            db.session.query(VideoFingerprint.hash)
+            .filter_by(video_id=video_id, version=FINGERPRINT_VERSION)
+            .order_by(VideoFingerprint.frame_index)
+        ]
+        if not hashes:
+            return None
+        return self.similar_to(hashes, exclude=video_id, max_distance=max_distance,
+                               limit=limit, min_similarity=min_similarity)
+
+    def similar_to(self, hashes, exclude=None, max_distance=None, limit=20, min_similarity=None):
+        """Videos con fotogramas a max_distance o menos, ordenados por similitud"""
+        self._ensure_fresh()
+        max_distance = self.max_distance if max_distance is None else max_distance
+        min_similarity = min_similarity or 0.0
+        with self._lock:
+            found = self._index.matches(hashes, max_distance, exclude=exclude)
+            frame_counts = {video_id: self._index.frame_counts.get(video_id, 0) for video_id in found}
+
+        scored = []
+        for video_id, (query_frames, video_entries, distance) in found.items():
+            similarity = max(len(query_frames) / len(hashes),
+                             len(video_entries) / frame_counts[video_id] if frame_counts[video_id] else 0)
+            if similarity >= min_similarity:
+                scored.append((similarity, -distance, video_id, len(query_frames)))
+        scored.sort(reverse=True)
+        scored = scored[:limit]
+        if not scored:
+            return []
+
+        titles = dict(
+            db.session.query(Video.id, Video.title)
+            .filter(Video.id.in_([video_id for _, _, video_id, _ in scored]))
+        )
+        return [
+            {
+                'video_id': video_id,
+                'title': titles[video_id],
+                'similarity': round(similarity, 3),
+                'matched_frames': matched_frames,
+                'min_distance': -negative_distance
+            }
+            for similarity, negative_distance, video_id, matched_frames in scored
+            if video_id in titles
+        ]
+
+    def remove(self, video_id):
+        """Dejar de devolver un video borrado (en este worker; el resto lo filtra al leer)"""
+        with self._lock:
+            self._index.remove(video_id)
+            self._indexed_up_to.pop(video_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'videos': len(self._index.frame_counts),
+                'entries': len(self._index.hashes),
+                'live_entries': sum(self._index.frame_counts.values())
+            }
+
+    def _ensure_fresh(self):
+        """Cargar el índice o leer las huellas nuevas si toca"""
+        now = time.monotonic()
+        if self._loaded and now - self._last_refresh < self.refresh_seconds:
+            return
+        # Solo un hilo sincroniza; el resto responde con el índice actual
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            now = time.monotonic()
+            if not self._loaded or now - self._built_at >= self.rebuild_seconds:
+                self._rebuild()
+            elif now - self._last_refresh >= self.refresh_seconds:
+                self._sync()
+        finally:
+            self._refresh_lock.release()
+
+    def _rows(self, video_ids=None):
+        query = (
+            db.session.query(VideoFingerprint.id, VideoFingerprint.video_id, VideoFingerprint.hash)
+            .filter(VideoFingerprint.version == FINGERPRINT_VERSION)
+        )
+        if video_ids is not None:
+            query = query.filter(VideoFingerprint.video_id.in_(video_ids))
+        return query.order_by(VideoFingerprint.video_id, VideoFingerprint.id).yield_per(10000)
+
+    def _grouped(self, rows):
+        """(video_id, [hashes], mayor id) por video, a partir de filas ordenadas por video"""
+        current, hashes, last_id = None, [], 0
+        for row_id, video_id, value in rows:
+            if video_id != current and hashes:
+                yield current, hashes, last_id
+                hashes = []
+            current, last_id = video_id, row_id
+            hashes.append(to_unsigned(value))
+        if hashes:
+            yield current, hashes, last_id
+
+    def _rebuild(self):
+        started = time.perf_counter()
+        index = HashIndex()
+        indexed_up_to = {}
+        watermark = 0
+        # Se construye fuera del bloqueo: las búsquedas siguen usando el anterior
+        for video_id, hashes, last_id in self._grouped(self._rows()):
+            index.add(video_id, hashes)
+            indexed_up_to[video_id] = last_id
+            watermark = max(watermark, last_id)
+        with self._lock:
+            self._index = index
+            self._indexed_up_to = indexed_up_to
+            self._watermark = watermark
+            self._loaded = True
+            self._built_at = self._last_refresh = time.monotonic()
+        logger.info("Índice de huellas construido: %d videos, %d hashes en %.1f ms",
+                    len(index.frame_counts), len(index.hashes), (time.perf_counter() - started) * 1000)
+
+    def _sync(self):
+        # Videos con huellas nuevas que este worker no tiene (las que indexó
+        # al subir un video ya están); se vuelven a leer todas las suyas
+        new_rows = (
+            db.session.query(VideoFingerprint.video_id, func.max(VideoFingerprint.id))
+            .filter(VideoFingerprint.version == FINGERPRINT_VERSION,
+                    VideoFingerprint.id > self._watermark)
+            .group_by(VideoFingerprint.video_id)
+            .all()
+        )
+        changed = [video_id for video_id, last_id in new_rows
+                   if last_id > self._indexed_up_to.get(video_id, 0)]
+        groups = list(self._grouped(self._rows(changed))) if changed else []
+        with self._lock:
+            for video_id, hashes, last_id in groups:
+                self._index.add(video_id, hashes)
+                self._indexed_up_to[video_id] = last_id
+            self._watermark = max([self._watermark] + [last_id for _, last_id in new_rows])
+            self._last_refresh = time.monotonic()
+
+fingerprint_index = FingerprintIndex()
+
+def init_fingerprints(app):
+    """Aplicar la configuración de las huellas (el índice se carga al primer uso)"""
+    fingerprint_index.configure(app.config)
+
+fingerprints_cli = AppGroup('fingerprints', help='Huellas perceptuales de los videos')
+
+@fingerprints_cli.command('backfill')
+@click.option('--force', is_flag=True, help='Regenerar también los videos que ya tienen huellas')
+def backfill_command(force):
+    """Calcular las huellas de los videos que no las tienen (o son de otra versión)"""
+    query = Video.query.order_by(Video.id)
+    if not force:
+        current = db.session.query(VideoFingerprint.video_id).filter_by(version=FINGERPRINT_VERSION)
+        query = query.filter(Video.id.notin_(current))
+
+    done = skipped = failed = 0
+    for video in query.all():
+        if video.file_path.endswith(GZIP_SUFFIX):
+            # Comprimido en el nivel frío: ffmpeg no puede leerlo sin promoverlo
+            skipped += 1
+            continue
+        try:
+            hashes = fingerprint_index.fingerprint_video(video)
+            done += 1
+            click.echo(f"Video {video.id}: {len(hashes)} fotogramas")
+        except FingerprintError as e:
+            db.session.rollback()
+            failed += 1
+            click.echo(f"Video {video.id}: {e}", err=True)
+    click.echo(f"Huellas calculadas: {done}, omitidos (frío comprimido): {skipped}, fallidos: {failed}")
@@ -0,0 +1,67 @@
+"""
+Latidos de las operaciones largas
+
+Las reservas que se dan por abandonadas tras un tiempo sin cambios (la fila
+en curso de publish_requests, las reservas de cuentas) se renuevan mientras
+la operación sigue viva desde un hilo aparte, así que el tiempo para darlas
+por abandonadas solo tiene que superar el intervalo entre latidos y no la
+duración de la operación más larga (subidas por partes, recodificaciones).
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+class Heartbeat:
+    """
+    Hilo que ejecuta el UPDATE de statement() cada interval segundos mientras
+    dura el bloque with
+    """
+
+    def __init__(self, engine, statement, interval, name='heartbeat'):
+        self.engine = engine
+        self.statement = statement
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.engine.begin() as connection:
+                    if connection.execute(self.statement()).rowcount == 0:
+                        # La reserva ya no existe (se liberó o se dio por abandonada)
+                        logger.warning("%s: la reserva ya no existe, se dejan de enviar latidos", self.name)
+                        return
+            except Exception as e:
+                logger.error("%s: error renovando la reserva: %s", self.name, e)
+
+def touch_row(engine, column, row_id, interval, name='heartbeat', delay=0):
+    """
+    Heartbeat que pone column (fecha UTC) de la fila row_id a ahora + delay
+    segundos
+    """
+    model = column.class_
+    return Heartbeat(
+        engine,
+        lambda: update(model).where(model.id == row_id).values(
+            {column.key: datetime.utcnow() + timedelta(seconds=delay)}
+        ),
+        interval,
+        name
+    )
@@ -0,0 +1,331 @@
+"""
+Registro de cuentas de las plataformas y reparto de publicaciones
+
+Cada plataforma puede tener varias cuentas (platform_accounts), por ejemplo
+una por marca. Las credenciales de las cuentas activas se guardan en memoria
+y se recargan cada PLATFORM_ACCOUNTS_REFRESH_SECONDS (o al modificarlas
+desde la CLI de este worker), así que publicar no consulta credenciales en
+cada llamada.
+
+Cada publicación toma una cuenta entre las candidatas (todas las de la
+plataforma, las de una marca o las indicadas en la petición), empezando por
+la menos ocupada. Tomarla es un UPDATE condicional que solo tiene éxito si
+la cuenta está por debajo de max_concurrency publicaciones en curso y le
+queda cuota en la ventana actual, de modo que los límites se respetan entre
+todos los workers sin bloqueos. Si todas están ocupadas se espera hasta
+PLATFORM_ACCOUNT_WAIT_SECONDS; si todas agotaron su cuota se falla en el
+acto. Con N cuentas caben N * max_concurrency publicaciones simultáneas.
+
+Cada hueco ocupado de in_flight tiene su reserva en platform_account_leases,
+que el worker renueva mientras publica (cada cuarto de
+PLATFORM_ACCOUNT_LEASE_SECONDS). Una reserva sin renovar durante ese tiempo
+es de un worker caído: se elimina y su hueco vuelve a in_flight sin tocar
+los de las publicaciones que siguen en curso.
+
+Si una plataforma no tiene cuentas se usan las credenciales de las variables
+de entorno, como antes (sin límites de concurrencia ni cuota).
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, insert, or_, select, update
+
+from models import db, PlatformAccount, PlatformAccountLease
+from services.heartbeat import touch_row
+
+logger = logging.getLogger(__name__)
+
+# Credenciales de cada plataforma -> variable de entorno equivalente
+ENV_CREDENTIALS = {
+    'instagram': {'access_token': 'INSTAGRAM_ACCESS_TOKEN', 'business_account_id': 'INSTAGRAM_BUSINESS_ACCOUNT_ID'},
+    'tiktok': {'access_token': 'TIKTOK_ACCESS_TOKEN'},
+    'facebook': {'access_token': 'FACEBOOK_ACCESS_TOKEN', 'page_id': 'FACEBOOK_PAGE_ID'},
+    'twitter': {'bearer_token': 'TWITTER_BEARER_TOKEN'}
+}
+
+POLL_INTERVAL = 0.5
+
+class AccountUnavailable(Exception):
+    """Ninguna cuenta candidata puede publicar ahora"""
+
+class AccountLease:
+    """Cuenta asignada a una publicación (account_id None: variables de entorno)"""
+    __slots__ = ('account_id', 'platform', 'name', 'credentials')
+
+    def __init__(self, account_id, platform, name, credentials):
+        self.account_id = account_id
+        self.platform = platform
+        self.name = name
+        self.credentials = credentials
+
+class AccountRegistry:
+    """Credenciales en memoria y reparto de publicaciones entre cuentas"""
+
+    def __init__(self, refresh_seconds=60, wait_seconds=30, lease_seconds=120):
+        self.refresh_seconds = refresh_seconds
+        self.wait_seconds = wait_seconds
+        self.lease_seconds = lease_seconds
+        self._accounts = {}  # plataforma -> [dict de cuenta activa]
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        self.refresh_seconds = config.get('PLATFORM_ACCOUNTS_REFRESH_SECONDS', 60)
+        self.wait_seconds = config.get('PLATFORM_ACCOUNT_WAIT_SECONDS', 30)
+        self.lease_seconds = config.get('PLATFORM_ACCOUNT_LEASE_SECONDS', 120)
+
+    def invalidate(self):
+        """Recargar las cuentas en el próximo uso"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return self._accounts
+        rows = db.session.execute(
+            select(PlatformAccount.id, PlatformAccount.platform, PlatformAccount.name,
+                   PlatformAccount.brand, PlatformAccount.credentials)
+            .where(PlatformAccount.is_active.is_(True))
+            .order_by(PlatformAccount.id)
+        ).all()
+        accounts = {}
+        for row in rows:
+            try:
+                credentials = json.loads(row.credentials or '{}')
+            except json.JSONDecodeError:
+                logger.error("Credenciales no válidas en la cuenta %s (%s)", row.id, row.name)
+                continue
+            accounts.setdefault(row.platform, []).append({
+                'id': row.id, 'name': row.name, 'brand': row.brand, 'credentials': credentials
+            })
+        with self._lock:
+            self._accounts = accounts
+            self._loaded_at = time.monotonic()
+        return accounts
+
+    def candidates(self, platform, brand=None, account_ids=None):
+        """Cuentas activas de la plataforma que pueden usarse para la petición"""
+        accounts = self._ensure_fresh().get(platform, [])
+        if brand:
+            accounts = [account for account in accounts if account['brand'] == brand]
+        if account_ids:
+            accounts = [account for account in accounts if account['id'] in account_ids]
+        return accounts
+
+    @contextmanager
+    def lease(self, platform, brand=None, account_ids=None):
+        """Reservar una cuenta de la plataforma durante la publicación"""
+        candidates = self.candidates(platform, brand, account_ids)
+        if not candidates:
+            if brand or account_ids:
+                raise AccountUnavailable(f"No hay cuentas activas de {platform} para esta publicación")
+            if self._ensure_fresh().get(platform):
+                raise AccountUnavailable(f"No hay cuentas activas de {platform}")
+            yield self._env_lease(platform)
+            return
+
+        account, lease_id = self._acquire(platform, candidates)
+        try:
+            # La reserva se renueva mientras dure la publicación, por larga que sea
+            with touch_row(db.engine, PlatformAccountLease.expires_at, lease_id, self.lease_seconds / 4,
+                           name=f"account-lease-{lease_id}", delay=self.lease_seconds):
+                yield AccountLease(account['id'], platform, account['name'], account['credentials'])
+        finally:
+            self._release(account['id'], lease_id)
+
+    def _env_lease(self, platform):
+        config = current_app.config
+        credentials = {key: config.get(name) for key, name in ENV_CREDENTIALS.get(platform, {}).items()}
+        return AccountLease(None, platform, 'env', credentials)
+
+    def _acquire(self, platform, candidates):
+        deadline = time.monotonic() + self.wait_seconds
+        ids = [account['id'] for account in candidates]
+        by_id = {account['id']: account for account in candidates}
+        while True:
+            now = datetime.utcnow()
+            self._reclaim_expired(ids, now)
+            # Las menos ocupadas primero (uso leído de todos los workers)
+            with db.engine.connect() as connection:
+                usage = connection.execute(
+                    select(PlatformAccount.id, PlatformAccount.in_flight, PlatformAccount.max_concurrency,
+                           PlatformAccount.quota_limit, PlatformAccount.quota_used,
+                           PlatformAccount.quota_reset_at, PlatformAccount.quota_window_seconds)
+                    .where(PlatformAccount.id.in_(ids), PlatformAccount.is_active.is_(True))
+                ).all()
+            usage.sort(key=lambda row: (row.in_flight / max(row.max_concurrency, 1), row.quota_used))
+
+            exhausted = 0
+            for row in usage:
+                window_open = row.quota_reset_at is not None and row.quota_reset_at > now
+                if row.quota_limit is not None and window_open and row.quota_used >= row.quota_limit:
+                    exhausted += 1
+                    continue
+                lease_id = self._try_acquire(row.id, row.quota_window_seconds, now)
+                if lease_id is not None:
+                    return by_id[row.id], lease_id
+
+            if exhausted == len(usage):
+                raise AccountUnavailable(f"Cuota agotada en todas las cuentas de {platform}")
+            if time.monotonic() >= deadline:
+                raise AccountUnavailable(f"Todas las cuentas de {platform} están ocupadas; reinténtalo más tarde")
+            time.sleep(POLL_INTERVAL)
+
+    def _try_acquire(self, account_id, window_seconds, now):
+        """
+        Sumar una publicación en curso y una a la cuota si la cuenta lo
+        permite y registrar su reserva. Devuelve el id de la reserva o None.
+        """
+        window_expired = or_(PlatformAccount.quota_reset_at.is_(None), PlatformAccount.quota_reset_at <= now)
+        with db.engine.begin() as connection:
+            taken = connection.execute(
+                update(PlatformAccount)
+                .where(
+                    PlatformAccount.id == account_id,
+                    PlatformAccount.is_active.is_(True),
+                    PlatformAccount.in_flight < PlatformAccount.max_concurrency,
+                    or_(PlatformAccount.quota_limit.is_(None), window_expired,
+                        PlatformAccount.quota_used < PlatformAccount.quota_limit)
+                )
+                .values(
+                    in_flight=PlatformAccount.in_flight + 1,
+                    in_flight_updated_at=now,
+                    quota_used=case((window_expired, 1), else_=PlatformAccount.quota_used + 1),
+                    quota_reset_at=case(
+                        (window_expired, now + timedelta(seconds=window_seconds)),
+                        else_=PlatformAccount.quota_reset_at
+                    )
+                )
+            ).rowcount == 1
+            if not taken:
+                return None
+            return connection.execute(
+                insert(PlatformAccountLease).values(
+                    account_id=account_id,
+                    holder=f"{socket.gethostname()}:{os.getpid()}",
+                    acquired_at=now,
+                    expires_at=now + timedelta(seconds=self.lease_seconds)
+                )
+            ).inserted_primary_key[0]
+
+    def _reclaim_expired(self, account_ids, now):
+        """Devolver los huecos de las reservas caducadas (workers caídos)"""
+        with db.engine.begin() as connection:
+            expired = connection.execute(
+                select(PlatformAccountLease.id, PlatformAccountLease.account_id, PlatformAccountLease.holder)
+                .where(PlatformAccountLease.account_id.in_(account_ids), PlatformAccountLease.expires_at < now)
+            ).all()
+            for lease in expired:
+                if self._drop_lease(connection, lease.account_id, lease.id):
+                    logger.warning("Liberada la reserva caducada %s de la cuenta %s (worker %s)",
+                                   lease.id, lease.account_id, lease.holder)
+
+    def _drop_lease(self, connection, account_id, lease_id):
+        """
+        Eliminar una reserva y devolver su hueco. Solo descuenta quien la
+        elimina, así que liberarla y reclamarla a la vez no descuenta dos veces.
+        """
+        if connection.execute(delete(PlatformAccountLease).where(PlatformAccountLease.id == lease_id)).rowcount == 0:
+            return False
+        connection.execute(
+            update(PlatformAccount)
+            .where(PlatformAccount.id == account_id)
+            .values(
+                in_flight=case((PlatformAccount.in_flight > 0, PlatformAccount.in_flight - 1), else_=0),
+                in_flight_updated_at=datetime.utcnow()
+            )
+        )
+        return True
+
+    def _release(self, account_id, lease_id):
+        try:
+            with db.engine.begin() as connection:
+                self._drop_lease(connection, account_id, lease_id)
+        except Exception as e:
+            logger.error("Error liberando la cuenta %s: %s", account_id, e)
+
+account_registry = AccountRegistry()
+
+def init_account_registry(app):
+    """Aplicar la configuración del registro de cuentas"""
+    account_registry.configure(app.config)
+
+accounts_cli = AppGroup('accounts', help='Cuentas de las plataformas')
+
+@accounts_cli.command('add')
+@click.option('--platform', required=True, type=click.Choice(sorted(ENV_CREDENTIALS)))
+@click.option('--name', required=True)
+@click.option('--brand', default=None)
+@click.option('--credentials', required=True, help='JSON, p. ej. {"access_token": "..."}')
+@click.option('--max-concurrency', type=int, default=2, show_default=True)
+@click.option('--quota-limit', type=int, default=None, help='Publicaciones por ventana (sin límite por defecto)')
+@click.option('--quota-window', type=int, default=86400, show_default=True, help='Segundos')
+def add_command(platform, name, brand, credentials, max_concurrency, quota_limit, quota_window):
+    """Dar de alta una cuenta"""
+    try:
+        parsed = json.loads(credentials)
+    except json.JSONDecodeError as e:
+        raise click.ClickException(f"Credenciales no válidas: {e}")
+    missing = sorted(set(ENV_CREDENTIALS[platform]) - set(parsed))
+    if missing:
+        raise click.ClickException(f"Faltan credenciales: {', '.join(missing)}")
+    account = PlatformAccount(
+        platform=platform, name=name, brand=brand, credentials=json.dumps(parsed),
+        max_concurrency=max_concurrency, quota_limit=quota_limit, quota_window_seconds=quota_window
+    )
+    db.session.add(account)
+    db.session.commit()
+    account_registry.invalidate()
+    click.echo(f"Cuenta {account.id} creada ({platform}/{name})")
+
+@accounts_cli.command('import-env')
+@click.option('--brand', default=None)
+def import_env_command(brand):
+    """Crear una cuenta 'env' por plataforma con las credenciales de las variables de entorno"""
+    config = current_app.config
+    for platform, names in sorted(ENV_CREDENTIALS.items()):
+        credentials = {key: config.get(name) for key, name in names.items()}
+        if not all(credentials.values()):
+            continue
+        if PlatformAccount.query.filter_by(platform=platform, name='env').first():
+            click.echo(f"{platform}: ya importada")
+            continue
+        db.session.add(PlatformAccount(platform=platform, name='env', brand=brand,
+                                       credentials=json.dumps(credentials)))
+        db.session.commit()
+        click.echo(f"{platform}: importada")
+    account_registry.invalidate()
+
+@accounts_cli.command('disable')
+@click.argument('account_id', type=int)
+def disable_command(account_id):
+    """Dejar de usar una cuenta"""
+    account = db.session.get(PlatformAccount, account_id)
+    if account is None:
+        raise click.ClickException('Cuenta no encontrada')
+    account.is_active = False
+    db.session.commit()
+    account_registry.invalidate()
+    click.echo(f"Cuenta {account_id} desactivada")
+
+@accounts_cli.command('list')
+def list_command():
+    """Mostrar las cuentas con su uso de concurrencia y cuota"""
+    for account in PlatformAccount.query.order_by(PlatformAccount.platform, PlatformAccount.id):
+        quota = f"{account.quota_used}/{account.quota_limit}" if account.quota_limit else 'sin límite'
+        click.echo(
+            f"{account.id:>4} {account.platform:<10} {account.name:<20} {account.brand or '-':<15} "
+            f"{'activa' if account.is_active else 'inactiva':<9} en curso {account.in_flight}/"
+            f"{account.max_concurrency}, cuota {quota}"
+        )
@@ -0,0 +1,117 @@
+"""
+Límites publicados por cada plataforma y cálculo de compatibilidad
+
+La matriz de compatibilidad se calcula una vez a partir de los metadatos de
+ffprobe guardados en video_metadata, sin volver a leer el archivo. Si se
+cambian los límites hay que subir LIMITS_VERSION: las matrices guardadas con
+otra versión se recalculan al leerlas.
+
+Algunos incumplimientos (formato, códecs, resolución, fps) se corrigen
+recodificando el video con el preset de la plataforma (services/renditions);
+la matriz indica si todos los de una plataforma son de ese tipo.
+"""
+
+LIMITS_VERSION = 2
+
+MB = 1024 * 1024
+
+# Fuentes: documentación de Instagram Graph API (Reels), TikTok Content
+# Posting API, Facebook Video API y X (Twitter) media upload
+PLATFORM_LIMITS = {
+    'instagram': {
+        'min_duration': 3,
+        'max_duration': 15 * 60,
+        'max_size': 300 * MB,
+        'min_aspect_ratio': 0.01,
+        'max_aspect_ratio': 10.0,
+        'max_frame_rate': 60,
+        'containers': {'mp4', 'mov'},
+        'video_codecs': {'h264', 'hevc'},
+        'audio_codecs': {'aac'}
+    },
+    'tiktok': {
+        'min_duration': 3,
+        'max_duration': 10 * 60,
+        'max_size': 4096 * MB,
+        'min_height': 360,
+        'max_frame_rate': 60,
+        'containers': {'mp4', 'mov', 'webm'},
+        'video_codecs': {'h264', 'hevc', 'vp8', 'vp9'}
+    },
+    'facebook': {
+        'min_duration': 1,
+        'max_duration': 240 * 60,
+        'max_size': 10240 * MB,
+        'min_aspect_ratio': 9 / 16,
+        'max_aspect_ratio': 16 / 9,
+        'containers': {'mp4', 'mov', 'avi', 'wmv', 'flv', 'webm', 'mkv'}
+    },
+    'twitter': {
+        'min_duration': 0.5,
+        'max_duration': 140,
+        'max_size': 512 * MB,
+        'min_aspect_ratio': 1 / 3,
+        'max_aspect_ratio': 3.0,
+        'max_width': 1920,
+        'max_height': 1200,
+        'max_frame_rate': 60,
+        'containers': {'mp4', 'mov'},
+        'video_codecs': {'h264'},
+        'audio_codecs': {'aac'}
+    }
+}
+
+def _check_platform(limits, metadata):
+    """
+    Lista de (motivo, corregible) por los que el video no cumple los
+    límites; corregible indica que una recodificación lo resuelve
+    """
+    issues = []
+    duration = metadata.get('duration')
+    size = metadata.get('size')
+    width = metadata.get('display_width')
+    height = metadata.get('display_height')
+    frame_rate = metadata.get('frame_rate')
+
+    if duration is not None:
+        if duration < limits.get('min_duration', 0):
+            issues.append((f"Duración mínima {limits['min_duration']}s (el video dura {duration:.1f}s)", False))
+        if 'max_duration' in limits and duration > limits['max_duration']:
+            issues.append((f"Duración máxima {limits['max_duration']}s (el video dura {duration:.1f}s)", False))
+    if size is not None and 'max_size' in limits and size > limits['max_size']:
+        issues.append((f"Tamaño máximo {limits['max_size'] // MB} MB", False))
+    if width and height:
+        aspect_ratio = width / height
+        if aspect_ratio < limits.get('min_aspect_ratio', 0) or aspect_ratio > limits.get('max_aspect_ratio', float('inf')):
+            issues.append((f"Relación de aspecto no admitida ({width}x{height})", False))
+        if width > limits.get('max_width', width) or height > limits.get('max_height', height):
+            issues.append((f"Resolución máxima {limits['max_width']}x{limits['max_height']}", True))
+        if height < limits.get('min_height', 0):
+            issues.append((f"Altura mínima {limits['min_height']}px", False))
+    if frame_rate and frame_rate > limits.get('max_frame_rate', frame_rate):
+        issues.append((f"Máximo {limits['max_frame_rate']} fps", True))
+    if metadata.get('container') and 'containers' in limits and metadata['container'] not in limits['containers']:
+        issues.append((f"Formato {metadata['container']} no admitido", True))
+    if metadata.get('video_codec') and 'video_codecs' in limits and metadata['video_codec'] not in limits['video_codecs']:
+        issues.append((f"Códec de video {metadata['video_codec']} no admitido", True))
+    if metadata.get('audio_codec') and 'audio_codecs' in limits and metadata['audio_codec'] not in limits['audio_codecs']:
+        issues.append((f"Códec de audio {metadata['audio_codec']} no admitido", True))
+    return issues
+
+def compute_compatibility(metadata):
+    """
+    Calcular la matriz de compatibilidad de un video con cada plataforma.
+
+    metadata es el diccionario de VideoMetadata.to_dict(). Devuelve
+    {plataforma: {'compatible': bool, 'issues': [...], 'transcodable': bool}},
+    donde transcodable indica que recodificar resuelve todos los problemas.
+    """
+    matrix = {}
+    for platform, limits in PLATFORM_LIMITS.items():
+        issues = _check_platform(limits, metadata)
+        matrix[platform] = {
+            'compatible': not issues,
+            'issues': [message for message, _ in issues],
+            'transcodable': bool(issues) and all(fixable for _, fixable in issues)
+        }
+    return matrix
@@ -0,0 +1,300 @@
+"""
+Analíticas de publicaciones a partir de agregados horarios
+
+Las publicaciones se agregan por hora (de requested_at) y plataforma en
+publication_rollups y publication_failure_rollups, con un histograma de
+latencias que permite combinar horas y calcular p50/p95 de cualquier ventana.
+El endpoint lee solo los agregados.
+
+La actualización es incremental: se recalculan únicamente las horas con
+publicaciones modificadas desde la última marca de agua (una publicación
+pendiente que termina horas después actualiza su hora de origen). Se ejecuta
+con `flask --app app analytics refresh` (cron) o, si los agregados tienen más
+de ANALYTICS_MAX_STALENESS_SECONDS, al consultar el endpoint.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, inspect, text
+
+from db_routing import read_only
+from models import db, Publication, PublicationRollup, PublicationFailureRollup, RollupState
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = 'publications_hourly'
+
+# Límites superiores (ms) de los buckets de latencia; el último es +inf
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000, 120000)
+
+WINDOWS = {
+    '24h': (timedelta(hours=24), 'hour'),
+    '7d': (timedelta(days=7), 'day'),
+    '30d': (timedelta(days=30), 'day')
+}
+
+# Horas recalculadas por consulta
+REBUILD_BATCH_HOURS = 168
+
+# Solapamiento con la marca de agua por transacciones que confirman tarde
+WATERMARK_OVERLAP = timedelta(seconds=30)
+
+_refresh_lock = threading.Lock()
+
+def _hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _failure_reason(message):
+    """Motivo agregable: el texto antes de los detalles variables (tras ':')"""
+    if not message:
+        return 'Error desconocido'
+    return message.split(':', 1)[0].strip()[:200]
+
+def _bucket_index(latency_ms):
+    for index, upper in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= upper:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+def _percentile(histogram, fraction):
+    """Percentil aproximado interpolando dentro del bucket"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index else 0
+            upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else lower * 2
+            return round(lower + (upper - lower) * (target - cumulative) / count, 1)
+        cumulative += count
+    return None
+
+class PublicationAnalytics:
+    """Mantenimiento y consulta de los agregados de publicaciones"""
+
+    def refresh(self):
+        """
+        Recalcular las horas con publicaciones nuevas o modificadas.
+        Devuelve el número de horas recalculadas.
+        """
+        started = time.perf_counter()
+        state = db.session.get(RollupState, ROLLUP_NAME)
+        if state is None:
+            state = RollupState(name=ROLLUP_NAME)
+            db.session.add(state)
+
+        changed = db.session.query(Publication.requested_at, Publication.updated_at)
+        if state.watermark is not None:
+            changed = changed.filter(Publication.updated_at >= state.watermark - WATERMARK_OVERLAP)
+        changed = changed.all()
+
+        hours = sorted({_hour(requested_at) for requested_at, _ in changed if requested_at})
+        # Por lotes para acotar la memoria en la primera carga
+        for offset in range(0, len(hours), REBUILD_BATCH_HOURS):
+            self._rebuild_hours(hours[offset:offset + REBUILD_BATCH_HOURS])
+
+        watermark = max((updated_at for _, updated_at in changed if updated_at), default=None)
+        if watermark and (state.watermark is None or watermark > state.watermark):
+            state.watermark = watermark
+        state.refreshed_at = datetime.utcnow()
+        db.session.commit()
+
+        logger.info("Agregados de publicaciones actualizados: %d horas en %.1f ms",
+                    len(hours), (time.perf_counter() - started) * 1000)
+        return len(hours)
+
+    def _rebuild_hours(self, hours):
+        """Sustituir los agregados de varias horas por los de las publicaciones actuales"""
+        hour_set = set(hours)
+        publications = db.session.query(
+            Publication.platform, Publication.status, Publication.message,
+            Publication.requested_at, Publication.completed_at
+        ).filter(
+            Publication.requested_at >= min(hours),
+            Publication.requested_at < max(hours) + timedelta(hours=1)
+        ).all()
+
+        rollups = {}
+        failures = {}
+        for platform, status, message, requested_at, completed_at in publications:
+            hour = _hour(requested_at)
+            if hour not in hour_set:
+                continue
+            rollup = rollups.setdefault((hour, platform), {
+                'bucket_start': hour, 'platform': platform,
+                'total': 0, 'published': 0, 'failed': 0, 'pending': 0,
+                'latency_count': 0, 'latency_sum_ms': 0.0,
+                'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            })
+            rollup['total'] += 1
+            if status in ('published', 'failed', 'pending'):
+                rollup[status] += 1
+            if status == 'failed':
+                key = (hour, platform, _failure_reason(message))
+                failures[key] = failures.get(key, 0) + 1
+            if completed_at and status != 'pending':
+                latency_ms = max((completed_at - requested_at).total_seconds() * 1000, 0)
+                rollup['latency_count'] += 1
+                rollup['latency_sum_ms'] += latency_ms
+                rollup['histogram'][_bucket_index(latency_ms)] += 1
+
+        db.session.execute(delete(PublicationRollup).where(PublicationRollup.bucket_start.in_(hours)))
+        db.session.execute(delete(PublicationFailureRollup).where(
+            PublicationFailureRollup.bucket_start.in_(hours)
+        ))
+        now = datetime.utcnow()
+        if rollups:
+            db.session.execute(insert(PublicationRollup), [
+                {
+                    **{key: value for key, value in rollup.items() if key != 'histogram'},
+                    'latency_histogram': json.dumps(rollup['histogram']),
+                    'refreshed_at': now
+                }
+                for rollup in rollups.values()
+            ])
+        if failures:
+            db.session.execute(insert(PublicationFailureRollup), [
+                {'bucket_start': hour, 'platform': platform, 'reason': reason, 'count': count}
+                for (hour, platform, reason), count in failures.items()
+            ])
+
+    def refresh_if_stale(self):
+        """Actualizar los agregados si superan la antigüedad máxima configurada"""
+        max_staleness = current_app.config.get('ANALYTICS_MAX_STALENESS_SECONDS', 60)
+        state = db.session.get(RollupState, ROLLUP_NAME)
+        if state and state.refreshed_at and \
+                datetime.utcnow() - state.refreshed_at < timedelta(seconds=max_staleness):
+            return False
+        # Un solo hilo por worker; entre workers, un advisory lock en PostgreSQL
+        if not _refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self._try_database_lock():
+                return False
+            self.refresh()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error actualizando agregados de publicaciones: %s", e)
+            return False
+        finally:
+            _refresh_lock.release()
+
+    def _try_database_lock(self):
+        if db.session.get_bind(mapper=inspect(PublicationRollup)).dialect.name != 'postgresql':
+            return True
+        # Se libera con el commit de refresh()
+        return db.session.execute(
+            text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {'name': ROLLUP_NAME}
+        ).scalar()
+
+    @read_only
+    def get_analytics(self, window='7d'):
+        """
+        Resumen por plataforma (tasa de éxito, motivos de fallo, p50/p95) y
+        serie temporal de la ventana, leídos de los agregados
+        """
+        span, granularity = WINDOWS[window]
+        end = _hour(datetime.utcnow()) + timedelta(hours=1)
+        start = end - span
+
+        rollups = PublicationRollup.query.filter(
+            PublicationRollup.bucket_start >= start,
+            PublicationRollup.bucket_start < end
+        ).all()
+        failures = db.session.query(
+            PublicationFailureRollup.platform,
+            PublicationFailureRollup.reason,
+            func.sum(PublicationFailureRollup.count)
+        ).filter(
+            PublicationFailureRollup.bucket_start >= start,
+            PublicationFailureRollup.bucket_start < end
+        ).group_by(PublicationFailureRollup.platform, PublicationFailureRollup.reason).all()
+        state = db.session.get(RollupState, ROLLUP_NAME)
+
+        platforms = {}
+        series = {}
+        for rollup in rollups:
+            histogram = json.loads(rollup.latency_histogram or '[]')
+            summary = platforms.setdefault(rollup.platform, self._empty_summary())
+            self._accumulate(summary, rollup, histogram)
+
+            if granularity == 'day':
+                period = rollup.bucket_start.replace(hour=0)
+            else:
+                period = rollup.bucket_start
+            point = series.setdefault((period, rollup.platform), self._empty_summary())
+            self._accumulate(point, rollup, histogram)
+
+        for platform, reason, count in failures:
+            platforms.setdefault(platform, self._empty_summary())['failure_reasons'].append(
+                {'reason': reason, 'count': int(count)}
+            )
+
+        return {
+            'window': window,
+            'granularity': granularity,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'refreshed_at': state.refreshed_at.isoformat() if state and state.refreshed_at else None,
+            'platforms': {
+                platform: self._finish(summary) for platform, summary in sorted(platforms.items())
+            },
+            'series': [
+                {'period': period.isoformat(), 'platform': platform, **self._finish(point)}
+                for (period, platform), point in sorted(series.items())
+            ]
+        }
+
+    def _empty_summary(self):
+        return {
+            'total': 0, 'published': 0, 'failed': 0, 'pending': 0,
+            'latency_count': 0, 'latency_sum_ms': 0.0,
+            'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            'failure_reasons': []
+        }
+
+    def _accumulate(self, summary, rollup, histogram):
+        for field in ('total', 'published', 'failed', 'pending', 'latency_count'):
+            summary[field] += getattr(rollup, field) or 0
+        summary['latency_sum_ms'] += rollup.latency_sum_ms or 0
+        for index, count in enumerate(histogram):
+            summary['histogram'][index] += count
+
+    def _finish(self, summary):
+        completed = summary['published'] + summary['failed']
+        result = {
+            'total': summary['total'],
+            'published': summary['published'],
+            'failed': summary['failed'],
+            'pending': summary['pending'],
+            'success_rate': round(summary['published'] / completed, 4) if completed else None,
+            'latency_avg_ms': round(summary['latency_sum_ms'] / summary['latency_count'], 1)
+                              if summary['latency_count'] else None,
+            'latency_p50_ms': _percentile(summary['histogram'], 0.50),
+            'latency_p95_ms': _percentile(summary['histogram'], 0.95)
+        }
+        if summary['failure_reasons']:
+            result['failure_reasons'] = sorted(
+                summary['failure_reasons'], key=lambda item: item['count'], reverse=True
+            )
+        return result
+
+publication_analytics = PublicationAnalytics()
+
+analytics_cli = AppGroup('analytics', help='Agregados de analíticas')
+
+@analytics_cli.command('refresh')
+def refresh_command():
+    """Actualizar los agregados de publicaciones (para cron)"""
+    hours = publication_analytics.refresh()
+    click.echo(f"Agregados actualizados ({hours} horas recalculadas)")
@@ -0,0 +1,185 @@
+"""
+Notificación de cambios de estado de publicaciones (pending, published, failed)
+
+Los cambios se detectan con eventos de sesión de SQLAlchemy y se reparten a
+los suscriptores de cada worker a través de un broadcaster en memoria:
+
+- En PostgreSQL cada cambio se envía con pg_notify dentro de la misma
+  transacción (solo se entrega si hace commit) y un hilo por worker escucha
+  el canal con LISTEN, de modo que todos los workers reciben todos los
+  eventos.
+- En SQLite (desarrollo) los eventos se entregan en memoria tras el commit;
+  solo los reciben los suscriptores del mismo proceso.
+"""
+
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.pool import NullPool
+
+from db_routing import RoutingSession
+from models import Publication
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'publication_events'
+
+class PublicationBroadcaster:
+    """Reparte eventos a las colas de los suscriptores del proceso"""
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, video_id=None):
+        """Crear una suscripción (opcionalmente filtrada por video)"""
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[subscription] = video_id
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def dispatch(self, event_data):
+        """Entregar un evento a los suscriptores interesados"""
+        with self._lock:
+            targets = [
+                subscription for subscription, video_id in self._subscribers.items()
+                if video_id is None or video_id == event_data.get('video_id')
+            ]
+        for subscription in targets:
+            try:
+                subscription.put_nowait(event_data)
+            except queue.Full:
+                # Un cliente lento no debe frenar al resto: se descarta el evento
+                logger.warning("Cola de eventos llena, se descarta un evento para un suscriptor")
+
+class PostgresListener:
+    """Hilo que escucha NOTIFY en PostgreSQL y alimenta el broadcaster local"""
+
+    def __init__(self, database_url, broadcaster):
+        self.database_url = database_url
+        self.broadcaster = broadcaster
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='publication-events-listener', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        # Conexión dedicada fuera del pool: LISTEN la mantiene ocupada siempre
+        engine = create_engine(self.database_url, poolclass=NullPool)
+        delay = 1
+        while True:
+            try:
+                connection = engine.raw_connection()
+                try:
+                    dbapi_connection = connection.dbapi_connection
+                    dbapi_connection.autocommit = True
+                    cursor = dbapi_connection.cursor()
+                    cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                    delay = 1
+                    while True:
+                        if select.select([dbapi_connection], [], [], 30) == ([], [], []):
+                            continue
+                        dbapi_connection.poll()
+                        while dbapi_connection.notifies:
+                            notify = dbapi_connection.notifies.pop(0)
+                            self.broadcaster.dispatch(json.loads(notify.payload))
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.error("Listener de publicaciones desconectado: %s; reintentando en %ss", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+broadcaster = PublicationBroadcaster()
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+def _event_from_publication(publication):
+    return {
+        'publication_id': publication.id,
+        'video_id': publication.video_id,
+        'platform': publication.platform,
+        'status': publication.status,
+        'message': publication.message,
+        'platform_post_id': publication.platform_post_id,
+        'timestamp': time.time()
+    }
+
+def _status_changes(session):
+    """Publicaciones nuevas o cuyo estado cambió en este flush"""
+    for publication in list(session.new) + list(session.dirty):
+        if not isinstance(publication, Publication):
+            continue
+        if publication in session.new or inspect(publication).attrs.status.history.has_changes():
+            yield publication
+
+def _uses_postgres(session):
+    return session.get_bind(mapper=inspect(Publication)).dialect.name == 'postgresql'
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _on_before_flush(session, flush_context, instances):
+    # El historial de atributos se pierde al hacer flush: se captura antes
+    session.info.setdefault('publication_status_changes', []).extend(_status_changes(session))
+
+@event.listens_for(RoutingSession, 'after_flush_postexec')
+def _on_after_flush_postexec(session, flush_context):
+    changes = session.info.pop('publication_status_changes', [])
+    if not changes:
+        return
+    events = [_event_from_publication(publication) for publication in changes]
+    if _uses_postgres(session):
+        connection = session.connection(bind_arguments={'mapper': inspect(Publication)})
+        for event_data in events:
+            connection.execute(
+                text('SELECT pg_notify(:channel, :payload)'),
+                {'channel': NOTIFY_CHANNEL, 'payload': json.dumps(event_data)}
+            )
+    else:
+        session.info.setdefault('pending_publication_events', []).extend(events)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _on_after_commit(session):
+    for event_data in session.info.pop('pending_publication_events', []):
+        broadcaster.dispatch(event_data)
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _on_after_rollback(session, previous_transaction):
+    session.info.pop('pending_publication_events', None)
+    session.info.pop('publication_status_changes', None)
+
+def subscribe(engine, video_id=None):
+    """
+    Suscribirse a los eventos de publicación. En PostgreSQL arranca (una vez
+    por proceso) el hilo que escucha el canal de NOTIFY.
+    """
+    if engine.dialect.name == 'postgresql':
+        url = engine.url.render_as_string(hide_password=False)
+        with _listeners_lock:
+            listener = _listeners.get(url)
+            if listener is None:
+                listener = _listeners[url] = PostgresListener(url, broadcaster)
+        listener.ensure_started()
+    return broadcaster.subscribe(video_id)
+
+def unsubscribe(subscription):
+    broadcaster.unsubscribe(subscription)
@@ -0,0 +1,251 @@
+"""
+Idempotencia y agrupación de publicaciones en curso
+
+Cada publicación de un video en una plataforma se registra antes de llamar
+a la plataforma en publish_requests, cuya restricción única sobre
+(video, plataforma, clave) hace de bloqueo entre workers:
+
+- Con cabecera Idempotency-Key, la fila se conserva con el resultado
+  durante PUBLISH_IDEMPOTENCY_TTL_HOURS y los reintentos con la misma clave
+  reciben ese resultado sin repetir la publicación. Si la publicación falló,
+  el siguiente reintento con la clave la vuelve a ejecutar.
+- Sin clave se usa una clave fija mientras la operación está en curso y se
+  libera al terminar: dos pulsaciones seguidas de "publicar" comparten una
+  sola llamada a la plataforma, pero se puede volver a publicar después.
+
+Las peticiones idénticas que llegan mientras otra está en curso esperan su
+resultado: en el mismo worker con un Event y en otros workers consultando
+la fila. Mientras la operación sigue viva su fila se renueva cada cuarto de
+PUBLISH_INFLIGHT_TIMEOUT_SECONDS, por larga que sea (subidas por partes);
+una fila sin renovar durante ese tiempo se da por abandonada (worker caído)
+y la siguiente petición la retoma.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, PublishRequest
+from services.heartbeat import touch_row
+
+logger = logging.getLogger(__name__)
+
+# Clave de las publicaciones sin Idempotency-Key mientras están en curso
+# ('*' no se admite en las claves de los clientes)
+INFLIGHT_KEY = '*inflight'
+
+POLL_INTERVAL = 0.25
+
+# Como mucho una limpieza de claves caducadas por hora y worker
+PURGE_INTERVAL = 3600
+
+class _InFlight:
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+class PublishRequestCoordinator:
+    """Una sola operación por (video, plataforma, clave) con resultado compartido"""
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def run(self, video_id, platform, idempotency_key, operation, scope=None):
+        """
+        Ejecutar operation() (que devuelve el resultado de la publicación) o
+        devolver el de la operación idéntica en curso o ya terminada. Sin
+        clave, scope distingue publicaciones distintas del mismo video en la
+        misma plataforma (p. ej. con otras cuentas).
+        """
+        key = idempotency_key or (f"{INFLIGHT_KEY}@{scope}" if scope else INFLIGHT_KEY)
+        local_key = (video_id, platform, key)
+        with self._lock:
+            inflight = self._inflight.get(local_key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[local_key] = _InFlight()
+
+        if not leader:
+            inflight.event.wait(current_app.config.get('PUBLISH_WAIT_SECONDS', 60))
+            if inflight.result is not None and not inflight.result.get('in_progress'):
+                return dict(inflight.result, replayed=True)
+            # La operación falló o sigue en curso: se resuelve con la base de datos
+            return self._run_shared(video_id, platform, key, operation)
+
+        try:
+            inflight.result = self._run_shared(video_id, platform, key, operation)
+            return inflight.result
+        finally:
+            with self._lock:
+                self._inflight.pop(local_key, None)
+            inflight.event.set()
+
+    def _run_shared(self, video_id, platform, key, operation):
+        self._purge_expired()
+        deadline = time.monotonic() + current_app.config.get('PUBLISH_WAIT_SECONDS', 60)
+        while True:
+            request_id, stored, running_id = self._claim(video_id, platform, key)
+            if stored is not None:
+                return dict(stored, replayed=True)
+            if request_id is not None:
+                return self._execute(request_id, key, operation)
+
+            # Otra petición la está ejecutando: esperar a que su fila termine
+            # (se sigue por id porque sin clave la fila cambia de clave al terminar)
+            while running_id is not None and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                status, stored = self._poll(running_id)
+                if status == 'completed':
+                    return dict(stored, replayed=True)
+                if status is None:
+                    running_id = None  # Liberada sin resultado: volver a reclamarla
+            if time.monotonic() >= deadline:
+                logger.info("Publicación de video %s en %s sigue en curso en otra petición",
+                            video_id, platform)
+                return {
+                    'platform': platform,
+                    'success': False,
+                    'in_progress': True,
+                    'message': 'La publicación ya está en curso; consulta su estado más tarde'
+                }
+
+    def _claim(self, video_id, platform, key):
+        """
+        Intentar quedarse con la operación. Devuelve (id, None, None) si hay
+        que ejecutarla, (None, resultado, None) si ya terminó y
+        (None, None, id_en_curso) si la está ejecutando otra petición.
+        """
+        config = current_app.config
+        claim = PublishRequest(video_id=video_id, platform=platform, idempotency_key=key)
+        db.session.add(claim)
+        try:
+            db.session.commit()
+            return claim.id, None, None
+        except IntegrityError:
+            db.session.rollback()
+
+        existing = db.session.execute(
+            select(PublishRequest.id, PublishRequest.status, PublishRequest.result,
+                   PublishRequest.updated_at)
+            .where(PublishRequest.video_id == video_id,
+                   PublishRequest.platform == platform,
+                   PublishRequest.idempotency_key == key)
+        ).first()
+        # Terminar la transacción de lectura para no bloquear al que escribe (SQLite)
+        db.session.rollback()
+        if existing is None:
+            return None, None, None  # Se liberó entre medias: se reintenta
+
+        now = datetime.utcnow()
+        if existing.status == 'completed':
+            ttl = timedelta(hours=config.get('PUBLISH_IDEMPOTENCY_TTL_HOURS', 24))
+            if existing.updated_at and existing.updated_at < now - ttl:
+                self._release(existing.id)
+                return None, None, None
+            stored = json.loads(existing.result)
+            if stored.get('success'):
+                return None, stored, None
+            # Falló: se reintenta y solo una petición gana la actualización condicional
+            retried = db.session.execute(
+                update(PublishRequest)
+                .where(PublishRequest.id == existing.id,
+                       PublishRequest.status == 'completed',
+                       PublishRequest.updated_at == existing.updated_at)
+                .values(status='in_progress', result=None, publication_id=None, updated_at=now)
+            ).rowcount
+            db.session.commit()
+            if retried:
+                return existing.id, None, None
+            return None, None, existing.id
+
+        timeout = timedelta(seconds=config.get('PUBLISH_INFLIGHT_TIMEOUT_SECONDS', 300))
+        if existing.updated_at and existing.updated_at < now - timeout:
+            # Abandonada: solo una petición gana la actualización condicional
+            taken = db.session.execute(
+                update(PublishRequest)
+                .where(PublishRequest.id == existing.id,
+                       PublishRequest.status == 'in_progress',
+                       PublishRequest.updated_at == existing.updated_at)
+                .values(updated_at=now)
+            ).rowcount
+            db.session.commit()
+            if taken:
+                logger.warning("Retomando publicación abandonada %s (video %s, %s)",
+                               existing.id, video_id, platform)
+                return existing.id, None, None
+        return None, None, existing.id
+
+    def _poll(self, request_id):
+        """(estado, resultado) de una petición; (None, None) si ya no existe"""
+        row = db.session.execute(
+            select(PublishRequest.status, PublishRequest.result)
+            .where(PublishRequest.id == request_id)
+        ).first()
+        db.session.rollback()
+        if row is None:
+            return None, None
+        return row.status, json.loads(row.result) if row.result else None
+
+    def _execute(self, request_id, key, operation):
+        timeout = current_app.config.get('PUBLISH_INFLIGHT_TIMEOUT_SECONDS', 300)
+        try:
+            with touch_row(db.engine, PublishRequest.updated_at, request_id, timeout / 4,
+                           name=f"publish-request-{request_id}"):
+                result = operation()
+        except Exception:
+            db.session.rollback()
+            # Sin resultado que compartir: liberar para que se pueda reintentar
+            self._release(request_id)
+            raise
+
+        db.session.execute(
+            update(PublishRequest)
+            .where(PublishRequest.id == request_id)
+            .values(
+                status='completed',
+                result=json.dumps(result),
+                publication_id=result.get('publication_id'),
+                # Sin clave del cliente, la fila deja libre el hueco en curso
+                idempotency_key=f"{key}:{request_id}" if key.startswith(INFLIGHT_KEY) else key,
+                updated_at=datetime.utcnow()
+            )
+        )
+        db.session.commit()
+        return result
+
+    def _release(self, request_id):
+        try:
+            db.session.execute(delete(PublishRequest).where(PublishRequest.id == request_id))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error liberando la petición de publicación %s: %s", request_id, e)
+
+    def _purge_expired(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        ttl = timedelta(hours=current_app.config.get('PUBLISH_IDEMPOTENCY_TTL_HOURS', 24))
+        try:
+            deleted = db.session.execute(
+                delete(PublishRequest).where(PublishRequest.status == 'completed',
+                                             PublishRequest.updated_at < datetime.utcnow() - ttl)
+            ).rowcount
+            db.session.commit()
+            if deleted:
+                logger.info("Eliminadas %d peticiones de publicación caducadas", deleted)
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error eliminando peticiones de publicación caducadas: %s", e)
+
+publish_requests = PublishRequestCoordinator()
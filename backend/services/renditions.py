@@ -0,0 +1,254 @@
+"""
+Caché en disco de versiones recodificadas para cada plataforma
+
+Cuando un video no cumple el formato de una plataforma pero se puede
+corregir recodificándolo (códecs, contenedor, resolución o fps), el
+publisher pide aquí la versión para ese preset. Las versiones se guardan en
+RENDITION_CACHE_DIR con clave (checksum del original, preset, versión del
+preset), así que volver a publicar el mismo video en la misma plataforma no
+vuelve a codificarlo.
+
+- Un bloqueo fcntl por clave hace que las publicaciones simultáneas del
+  mismo video (en cualquier worker) compartan una sola codificación: la
+  primera codifica y el resto espera y la reutiliza.
+- El tamaño total se limita a RENDITION_CACHE_MAX_MB expulsando las
+  versiones usadas hace más tiempo (LRU por mtime, que se actualiza en cada
+  acierto). Las usadas en los últimos EVICTION_GRACE_SECONDS no se
+  expulsan porque pueden estar subiéndose.
+- Aciertos, fallos y expulsiones se acumulan en stats.json (compartido
+  entre workers) y en métricas de Prometheus.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+
+from metrics import RENDITION_CACHE_EVICTIONS, RENDITION_CACHE_REQUESTS, RENDITION_TRANSCODE_DURATION
+from services.platform_limits import PLATFORM_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# Subir al cambiar los argumentos de ffmpeg: las versiones anteriores dejan
+# de usarse y acaban expulsadas
+PRESET_VERSION = 1
+
+RENDITION_EXTENSION = 'mp4'
+
+EVICTION_GRACE_SECONDS = 300
+
+TRANSCODE_TIMEOUT = 30 * 60
+
+class RenditionError(Exception):
+    """No se pudo generar la versión recodificada"""
+
+def preset_for(platform):
+    """Parámetros de recodificación de una plataforma (a partir de sus límites)"""
+    limits = PLATFORM_LIMITS[platform]
+    return {
+        'max_width': limits.get('max_width', 1920),
+        'max_height': limits.get('max_height', 1920),
+        'max_frame_rate': limits.get('max_frame_rate', 60)
+    }
+
+def ffmpeg_args(source_path, output_path, preset):
+    """Comando ffmpeg que produce un MP4 H.264/AAC dentro de los límites del preset"""
+    max_width, max_height = preset['max_width'], preset['max_height']
+    video_filter = (
+        f"scale='min(iw,{max_width})':'min(ih,{max_height})':force_original_aspect_ratio=decrease,"
+        "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    )
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', source_path,
+        '-vf', video_filter, '-fpsmax', str(preset['max_frame_rate']),
+        '-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '128k', '-ac', '2',
+        '-movflags', '+faststart', '-f', 'mp4', output_path
+    ]
+
+class RenditionCache:
+    """Versiones recodificadas por (contenido, preset) con presupuesto de disco"""
+
+    def __init__(self, directory='instance/renditions', max_bytes=5 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, checksum, preset_name):
+        return f"{checksum}_{preset_name}_v{PRESET_VERSION}"
+
+    def _entry_path(self, key):
+        # Un nivel de subdirectorios para no acumular miles de archivos juntos
+        return os.path.join(self.directory, key[:2], f"{key}.{RENDITION_EXTENSION}")
+
+    def _lock_path(self, key):
+        return os.path.join(self.directory, 'locks', f"{key}.lock")
+
+    @contextmanager
+    def _locked(self, path, blocking=True):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, source_path, checksum, preset_name):
+        """
+        Ruta de la versión del video para preset_name, codificándola si no
+        está en la caché
+        """
+        key = self.key(checksum, preset_name)
+        path = self._entry_path(key)
+        if self._touch(path):
+            self._record(preset_name, 'hit')
+            return path
+
+        with self._locked(self._lock_path(key)):
+            # Otra petición pudo codificarla mientras esperábamos el bloqueo
+            if self._touch(path):
+                self._record(preset_name, 'hit')
+                return path
+            self._record(preset_name, 'miss')
+            self._transcode(source_path, path, preset_name)
+
+        self.evict(keep=path)
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _transcode(self, source_path, path, preset_name):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = subprocess.run(
+                ffmpeg_args(source_path, temporary, preset_for(preset_name)),
+                capture_output=True, text=True, timeout=TRANSCODE_TIMEOUT
+            )
+            if result.returncode != 0:
+                raise RenditionError(f"ffmpeg falló: {result.stderr.strip()[-300:]}")
+            os.replace(temporary, path)
+            outcome = 'success'
+        except FileNotFoundError:
+            raise RenditionError("ffmpeg no está instalado")
+        except subprocess.TimeoutExpired:
+            raise RenditionError("La recodificación superó el tiempo máximo")
+        finally:
+            elapsed = time.perf_counter() - started
+            RENDITION_TRANSCODE_DURATION.labels(preset=preset_name, outcome=outcome).observe(elapsed)
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        logger.info("Versión %s generada para %s en %.1f s (%d bytes)",
+                    preset_name, os.path.basename(source_path), elapsed, os.path.getsize(path))
+
+    def _entries(self):
+        """[(mtime, tamaño, ruta)] de las versiones guardadas"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or shard.name == 'locks':
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(f".{RENDITION_EXTENSION}"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=None):
+        """Expulsar las versiones menos usadas hasta caber en el presupuesto"""
+        with self._locked(os.path.join(self.directory, 'locks', 'evict.lock'), blocking=False) as acquired:
+            if not acquired:
+                return 0  # Otro proceso ya está expulsando
+            entries = sorted(self._entries())
+            used = sum(size for _, size, _ in entries)
+            grace_limit = time.time() - EVICTION_GRACE_SECONDS
+            evicted = 0
+            for mtime, size, path in entries:
+                if used <= self.max_bytes:
+                    break
+                if path == keep or mtime > grace_limit:
+                    continue
+                key = os.path.basename(path).rsplit('.', 1)[0]
+                with self._locked(self._lock_path(key), blocking=False) as free:
+                    if not free:
+                        continue  # Se está regenerando
+                    # El archivo de bloqueo se conserva: puede haber otro proceso esperándolo
+                    os.remove(path)
+                used -= size
+                evicted += 1
+                RENDITION_CACHE_EVICTIONS.inc()
+                self._record(None, 'eviction', size)
+            if evicted:
+                logger.info("Caché de versiones: %d expulsadas, %d bytes en uso", evicted, used)
+            return evicted
+
+    def _record(self, preset_name, result, size=0):
+        """Acumular aciertos/fallos/expulsiones en stats.json (entre workers)"""
+        if preset_name:
+            RENDITION_CACHE_REQUESTS.labels(preset=preset_name, result=result).inc()
+        stats_path = os.path.join(self.directory, 'stats.json')
+        try:
+            with self._locked(os.path.join(self.directory, 'locks', 'stats.lock')):
+                stats = self._read_stats(stats_path)
+                if result == 'eviction':
+                    stats['evictions'] += 1
+                    stats['evicted_bytes'] += size
+                else:
+                    preset_stats = stats['presets'].setdefault(preset_name, {'hits': 0, 'misses': 0})
+                    preset_stats['hits' if result == 'hit' else 'misses'] += 1
+                temporary = f"{stats_path}.tmp"
+                with open(temporary, 'w') as stats_file:
+                    json.dump(stats, stats_file)
+                os.replace(temporary, stats_path)
+        except OSError as e:
+            logger.warning("No se pudieron guardar las estadísticas de la caché: %s", e)
+
+    def _read_stats(self, stats_path):
+        try:
+            with open(stats_path) as stats_file:
+                return json.load(stats_file)
+        except (OSError, ValueError):
+            return {'presets': {}, 'evictions': 0, 'evicted_bytes': 0}
+
+    def stats(self):
+        """Uso de disco y aciertos/fallos acumulados"""
+        stats = self._read_stats(os.path.join(self.directory, 'stats.json'))
+        entries = self._entries()
+        hits = sum(preset['hits'] for preset in stats['presets'].values())
+        misses = sum(preset['misses'] for preset in stats['presets'].values())
+        return {
+            'directory': self.directory,
+            'max_bytes': self.max_bytes,
+            'used_bytes': sum(size for _, size, _ in entries),
+            'entries': len(entries),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'evictions': stats['evictions'],
+            'evicted_bytes': stats['evicted_bytes'],
+            'presets': stats['presets'],
+            'preset_version': PRESET_VERSION
+        }
+
+rendition_cache = RenditionCache()
+
+def init_rendition_cache(app):
+    """Aplicar la configuración de la caché"""
+    rendition_cache.directory = app.config.get('RENDITION_CACHE_DIR', 'instance/renditions')
+    rendition_cache.max_bytes = app.config.get('RENDITION_CACHE_MAX_MB', 5120) * 1024 * 1024
@@ -0,0 +1,449 @@
+"""
+Copias de seguridad del catálogo (filas de la base de datos + archivos de video)
+
+`flask --app app snapshot create` guarda en SNAPSHOT_FOLDER una instantánea
+coherente:
+
+    SNAPSHOT_FOLDER/
+      objects/ab/<sha256>            contenido de los videos (compartido)
+      20261019T040000Z/
+        tables/<tabla>.ndjson.gz     filas (cabecera de columnas + una lista por fila)
+        files.ndjson.gz              manifiesto: video, archivo, tamaño y SHA-256
+        manifest.json                se escribe al final; sin él la copia está incompleta
+
+Las filas se exportan siempre completas dentro de una sola transacción
+(REPEATABLE READ en PostgreSQL), así que cada instantánea es restaurable por
+sí sola y refleja también los borrados. Los archivos se guardan por
+contenido: una instantánea incremental solo copia los videos cuyo updated_at
+cambió desde la anterior y cuyo checksum no está ya guardado; el resto
+reutiliza la entrada del manifiesto anterior sin leer el archivo. Las copias
+se hacen en paralelo (SNAPSHOT_WORKERS hilos) calculando el SHA-256 al vuelo.
+
+`flask --app app snapshot restore <id>` copia los archivos en paralelo al
+nivel caliente verificando su SHA-256 y después inserta las filas por lotes
+en una sola transacción. Los agregados de analíticas no se copian: se
+recalculan al terminar. Tampoco las huellas perceptuales, que se regeneran
+a partir de los archivos con `flask --app app fingerprints backfill`.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import DateTime, delete, func, select, text
+
+from models import db, Platform, PlatformAccount, PlatformAccountLease, Publication, PublicationFailureRollup, \
+    PublicationRollup, PublishRequest, RollupState, Video, VideoFingerprint, VideoMetadata, VideoTag, VideoTagMap
+from services.storage_tiers import GZIP_SUFFIX, HOT, storage_tiers
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+# En orden de dependencias (las tablas referenciadas primero)
+CATALOG_TABLES = (Platform, PlatformAccount, VideoTag, Video, VideoMetadata, Publication)
+
+# Si alguna tiene filas, restaurar exige --replace (el resto se rellena al
+# migrar, al subir o con la CLI, y se sustituye siempre)
+PROTECTED_TABLES = (Video, Publication)
+
+# Tablas derivadas o transitorias que se vacían al restaurar
+DERIVED_TABLES = (PlatformAccountLease, PublishRequest, PublicationRollup, PublicationFailureRollup, RollupState,
+                  VideoFingerprint, VideoTagMap)
+
+EXPORT_BATCH_ROWS = 1000
+RESTORE_BATCH_ROWS = 5000
+
+COPY_BUFFER = 1024 * 1024
+
+class SnapshotError(Exception):
+    """La instantánea no existe, está incompleta o no se puede restaurar"""
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def _write_ndjson(path, lines):
+    with gzip.open(path, 'wt', encoding='utf-8') as output:
+        for line in lines:
+            output.write(json.dumps(line, default=_json_default, separators=(',', ':')))
+            output.write('\n')
+
+def _read_ndjson(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as source:
+        for line in source:
+            yield json.loads(line)
+
+class SnapshotStore:
+    """Creación y restauración de instantáneas en un directorio"""
+
+    def __init__(self, folder, workers=4, log=logger.info):
+        self.folder = folder
+        self.workers = workers
+        self.log = log
+
+    # Consulta
+
+    def _object_path(self, sha256):
+        return os.path.join(self.folder, 'objects', sha256[:2], sha256)
+
+    def list(self):
+        """Manifiestos de las instantáneas completas, de la más antigua a la más reciente"""
+        if not os.path.isdir(self.folder):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.folder)):
+            manifest_path = os.path.join(self.folder, name, 'manifest.json')
+            if name != 'objects' and os.path.exists(manifest_path):
+                with open(manifest_path) as manifest_file:
+                    manifests.append(json.load(manifest_file))
+        return manifests
+
+    def manifest(self, snapshot_id):
+        manifest_path = os.path.join(self.folder, snapshot_id, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"Instantánea {snapshot_id} no encontrada o incompleta")
+        with open(manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def _files(self, snapshot_id):
+        return {
+            entry['video_id']: entry
+            for entry in _read_ndjson(os.path.join(self.folder, snapshot_id, 'files.ndjson.gz'))
+        }
+
+    # Creación
+
+    def create(self, full=False):
+        """Crear una instantánea (incremental respecto a la última, salvo full)"""
+        started = time.perf_counter()
+        snapshots = self.list()
+        parent = None if full or not snapshots else snapshots[-1]['id']
+        snapshot_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+        directory = os.path.join(self.folder, snapshot_id)
+        os.makedirs(os.path.join(directory, 'tables'))
+
+        tables, videos = self._export_tables(directory)
+        files, summary = self._snapshot_files(videos, self._files(parent) if parent else {})
+        _write_ndjson(os.path.join(directory, 'files.ndjson.gz'), files)
+
+        manifest = {
+            'id': snapshot_id,
+            'format': SNAPSHOT_FORMAT,
+            'kind': 'incremental' if parent else 'full',
+            'parent': parent,
+            'created_at': datetime.utcnow().isoformat(),
+            'tables': tables,
+            'files': summary,
+            'duration_seconds': round(time.perf_counter() - started, 2)
+        }
+        # El manifiesto marca la instantánea como completa: se escribe el último
+        temporary = os.path.join(directory, 'manifest.json.tmp')
+        with open(temporary, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temporary, os.path.join(directory, 'manifest.json'))
+        return manifest
+
+    def _export_tables(self, directory):
+        """Volcar las tablas del catálogo en una sola transacción de lectura"""
+        tables = {}
+        videos = []
+        connection = db.engine.connect()
+        if db.engine.dialect.name == 'postgresql':
+            connection = connection.execution_options(
+                isolation_level='REPEATABLE READ', postgresql_readonly=True
+            )
+        with connection, connection.begin():
+            for model in CATALOG_TABLES:
+                table = model.__table__
+                columns = [column.name for column in table.columns]
+                result = connection.execution_options(yield_per=EXPORT_BATCH_ROWS).execute(
+                    select(table).order_by(*table.primary_key.columns)
+                )
+                count = 0
+
+                def rows():
+                    nonlocal count
+                    yield {'columns': columns}
+                    for row in result:
+                        count += 1
+                        if model is Video:
+                            videos.append({
+                                'video_id': row.id, 'filename': row.filename, 'file_path': row.file_path,
+                                'checksum': row.checksum, 'updated_at': row.updated_at
+                            })
+                        yield list(row)
+
+                _write_ndjson(os.path.join(directory, 'tables', f"{table.name}.ndjson.gz"), rows())
+                tables[table.name] = count
+        return tables, videos
+
+    def _snapshot_files(self, videos, parent_files):
+        """Manifiesto de archivos, copiando solo el contenido nuevo"""
+        reused, pending = [], []
+        for video in videos:
+            updated_at = video['updated_at'].isoformat() if video['updated_at'] else None
+            previous = parent_files.get(video['video_id'])
+            if (previous and previous['sha256'] and previous['updated_at'] == updated_at
+                    and previous['filename'] == video['filename']):
+                reused.append(previous)
+            elif video['checksum'] and os.path.exists(self._object_path(video['checksum'])):
+                # Contenido ya guardado por otra instantánea (o por otro video)
+                reused.append(self._entry(video, video['checksum'],
+                                          os.path.getsize(self._object_path(video['checksum']))))
+            else:
+                pending.append(video)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            copied = list(executor.map(self._copy_video, pending))
+
+        files = sorted(reused + copied, key=lambda entry: entry['video_id'])
+        missing = [entry['video_id'] for entry in copied if entry['sha256'] is None]
+        if missing:
+            logger.warning("Instantánea sin archivo para %d videos: %s", len(missing), missing[:20])
+        summary = {
+            'videos': len(files),
+            'copied': len(copied) - len(missing),
+            'copied_bytes': sum(entry['size'] for entry in copied if entry['sha256']),
+            'reused': len(reused),
+            'missing': len(missing),
+            'total_bytes': sum(entry['size'] for entry in files if entry['sha256'])
+        }
+        return files, summary
+
+    def _entry(self, video, sha256, size):
+        return {
+            'video_id': video['video_id'],
+            'filename': video['filename'],
+            'updated_at': video['updated_at'].isoformat() if video['updated_at'] else None,
+            'sha256': sha256,
+            'size': size
+        }
+
+    def _source_path(self, video):
+        """Ruta actual del archivo (puede haber cambiado de nivel durante la copia)"""
+        candidates = (
+            video['file_path'],
+            os.path.join(storage_tiers.hot_folder, video['filename']),
+            os.path.join(storage_tiers.cold_folder, video['filename']),
+            os.path.join(storage_tiers.cold_folder, video['filename'] + GZIP_SUFFIX)
+        )
+        return next((path for path in candidates if path and os.path.exists(path)), None)
+
+    def _copy_video(self, video):
+        source = self._source_path(video)
+        if source is None:
+            return self._entry(video, None, 0)
+        try:
+            sha256, size = self._store(source)
+        except FileNotFoundError:
+            return self._entry(video, None, 0)
+        if video['checksum'] and sha256 != video['checksum']:
+            logger.warning("El archivo del video %s no coincide con su checksum", video['video_id'])
+        return self._entry(video, sha256, size)
+
+    def _store(self, source):
+        """Guardar el contenido (sin comprimir) en objects/ y devolver (sha256, tamaño)"""
+        temporary_dir = os.path.join(self.folder, 'objects', 'tmp')
+        os.makedirs(temporary_dir, exist_ok=True)
+        temporary = os.path.join(temporary_dir, f"{os.getpid()}-{os.urandom(8).hex()}")
+        digest = hashlib.sha256()
+        size = 0
+        opener = gzip.open if source.endswith(GZIP_SUFFIX) else open
+        try:
+            with opener(source, 'rb') as src, open(temporary, 'wb') as dst:
+                while True:
+                    chunk = src.read(COPY_BUFFER)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    size += len(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+            sha256 = digest.hexdigest()
+            destination = self._object_path(sha256)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(temporary, destination)
+            return sha256, size
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    # Restauración
+
+    def restore(self, snapshot_id, replace=False, restore_files=True):
+        """Restaurar archivos y filas de una instantánea. Devuelve un resumen"""
+        started = time.perf_counter()
+        manifest = self.manifest(snapshot_id)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"Formato de instantánea no soportado: {manifest.get('format')}")
+        directory = os.path.join(self.folder, snapshot_id)
+
+        if not replace:
+            for model in PROTECTED_TABLES:
+                if db.session.query(func.count()).select_from(model.__table__).scalar():
+                    raise SnapshotError(
+                        f"La tabla {model.__tablename__} no está vacía (usar --replace para sustituirla)"
+                    )
+        db.session.remove()
+
+        # Primero los archivos: si algo falla, la base de datos no ha cambiado
+        restored_files = {}
+        if restore_files:
+            restored_files = self._restore_files(self._files(snapshot_id).values())
+            self.log(f"Archivos restaurados: {len(restored_files)} en "
+                     f"{time.perf_counter() - started:.1f}s")
+
+        rows = self._restore_rows(directory, restored_files)
+        self.log(f"Filas restauradas: {sum(rows.values())} en {time.perf_counter() - started:.1f}s")
+
+        from services.publication_analytics import publication_analytics
+        publication_analytics.refresh()
+        return {'files': len(restored_files), 'rows': rows,
+                'duration_seconds': round(time.perf_counter() - started, 2)}
+
+    def _restore_files(self, entries):
+        """Copiar en paralelo los archivos al nivel caliente. Devuelve {video_id: ruta}"""
+        hot_folder = storage_tiers.hot_folder
+        os.makedirs(hot_folder, exist_ok=True)
+        entries = [entry for entry in entries if entry['sha256']]
+
+        def restore_one(entry):
+            destination = os.path.join(hot_folder, entry['filename'])
+            # Reanudar una restauración interrumpida sin volver a copiar
+            if os.path.exists(destination) and os.path.getsize(destination) == entry['size']:
+                return entry['video_id'], destination
+            source = self._object_path(entry['sha256'])
+            temporary = f"{destination}.{os.getpid()}.restore"
+            digest = hashlib.sha256()
+            try:
+                with open(source, 'rb') as src, open(temporary, 'wb') as dst:
+                    while True:
+                        chunk = src.read(COPY_BUFFER)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        dst.write(chunk)
+                if digest.hexdigest() != entry['sha256']:
+                    raise SnapshotError(f"Contenido dañado en la instantánea: {entry['sha256']}")
+                os.replace(temporary, destination)
+            finally:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+            return entry['video_id'], destination
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(executor.map(restore_one, entries))
+
+    def _restore_rows(self, directory, restored_files):
+        """Insertar las filas por lotes en una sola transacción"""
+        counts = {}
+        with db.engine.begin() as connection:
+            # Sin --replace las tablas protegidas ya están vacías
+            for model in DERIVED_TABLES + tuple(reversed(CATALOG_TABLES)):
+                connection.execute(delete(model.__table__))
+
+            for model in CATALOG_TABLES:
+                table = model.__table__
+                lines = _read_ndjson(os.path.join(directory, 'tables', f"{table.name}.ndjson.gz"))
+                columns = next(lines)['columns']
+                datetime_columns = [
+                    index for index, name in enumerate(columns)
+                    if isinstance(table.columns[name].type, DateTime)
+                ]
+                counts[table.name] = 0
+                batch = []
+                for values in lines:
+                    for index in datetime_columns:
+                        if values[index] is not None:
+                            values[index] = datetime.fromisoformat(values[index])
+                    row = dict(zip(columns, values))
+                    if model is Video and row['id'] in restored_files:
+                        row['file_path'] = restored_files[row['id']]
+                        row['storage_tier'] = HOT
+                    batch.append(row)
+                    if len(batch) >= RESTORE_BATCH_ROWS:
+                        self._insert_batch(connection, model, batch)
+                        counts[table.name] += len(batch)
+                        batch = []
+                if batch:
+                    self._insert_batch(connection, model, batch)
+                    counts[table.name] += len(batch)
+
+            if connection.dialect.name == 'postgresql':
+                # Los ids se insertaron explícitamente: adelantar las secuencias
+                for model in CATALOG_TABLES:
+                    connection.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                        f"COALESCE((SELECT MAX(id) FROM {model.__tablename__}), 0) + 1, false)"
+                    ))
+        return counts
+
+    def _insert_batch(self, connection, model, batch):
+        if model is PlatformAccount:
+            # Las reservas no se guardan: ninguna publicación sigue en curso
+            batch = [dict(row, in_flight=0) for row in batch]
+        connection.execute(model.__table__.insert(), batch)
+        if model is Video:
+            # video_tag_map no se guarda: se reconstruye a partir de videos.tags
+            links = [
+                {'video_id': row['id'], 'tag': tag}
+                for row in batch
+                for tag in dict.fromkeys(t.strip() for t in (row.get('tags') or '').split(',') if t.strip())
+            ]
+            if links:
+                connection.execute(VideoTagMap.__table__.insert(), links)
+
+def _store():
+    config = current_app.config
+    return SnapshotStore(config.get('SNAPSHOT_FOLDER', 'snapshots'),
+                         workers=config.get('SNAPSHOT_WORKERS', 4), log=click.echo)
+
+snapshot_cli = AppGroup('snapshot', help='Copias de seguridad del catálogo y los videos')
+
+@snapshot_cli.command('create')
+@click.option('--full', is_flag=True, help='No partir de la última instantánea')
+def create_command(full):
+    """Crear una instantánea (incremental por defecto)"""
+    manifest = _store().create(full=full)
+    files = manifest['files']
+    click.echo(
+        f"Instantánea {manifest['id']} ({manifest['kind']}): {sum(manifest['tables'].values())} filas, "
+        f"{files['videos']} videos, {files['copied']} copiados "
+        f"({files['copied_bytes'] / 1024 / 1024:.1f} MB), {files['missing']} sin archivo, "
+        f"{manifest['duration_seconds']}s"
+    )
+
+@snapshot_cli.command('list')
+def list_command():
+    """Mostrar las instantáneas completas"""
+    for manifest in _store().list():
+        files = manifest['files']
+        click.echo(
+            f"{manifest['id']} {manifest['kind']:<11} {files['videos']} videos "
+            f"({files['total_bytes'] / 1024 / 1024:.1f} MB, {files['copied']} copiados)"
+        )
+
+@snapshot_cli.command('restore')
+@click.argument('snapshot_id')
+@click.option('--replace', is_flag=True, help='Sustituir el catálogo actual')
+@click.option('--skip-files', is_flag=True, help='Restaurar solo las filas')
+def restore_command(snapshot_id, replace, skip_files):
+    """Restaurar una instantánea (archivos en paralelo, filas por lotes)"""
+    try:
+        result = _store().restore(snapshot_id, replace=replace, restore_files=not skip_files)
+    except SnapshotError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restauración completada: {result['files']} archivos, "
+               f"{sum(result['rows'].values())} filas en {result['duration_seconds']}s")
+    click.echo("Las huellas perceptuales se regeneran con `flask --app app fingerprints backfill`")
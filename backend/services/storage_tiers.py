@@ -0,0 +1,248 @@
+"""
+Almacenamiento por niveles (caliente/frío) de la biblioteca de videos
+
+Los videos se suben al nivel caliente (UPLOAD_FOLDER, volumen rápido). Los
+que nadie descarga ni publica durante STORAGE_COLD_AFTER_DAYS se mueven por
+lotes al nivel frío (COLD_STORAGE_FOLDER, más barato), opcionalmente
+comprimidos con gzip, con `flask --app app storage demote` (cron). El
+último acceso se registra al servir /uploads y al publicar, como mucho una
+escritura por video cada STORAGE_ACCESS_TOUCH_SECONDS.
+
+Un video frío se vuelve a mover al nivel caliente de forma transparente la
+primera vez que se descarga o se publica. Cada movimiento copia el archivo
+a un temporal, lo renombra, actualiza Video.file_path y solo entonces
+borra el origen, así que una interrupción nunca deja el video sin archivo.
+Un bloqueo fcntl por video evita que dos procesos lo muevan a la vez.
+"""
+
+import fcntl
+import gzip
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, or_, update
+
+from metrics import STORAGE_TIER_MOVES
+from models import db, Publication, Video
+
+logger = logging.getLogger(__name__)
+
+HOT = 'hot'
+COLD = 'cold'
+
+GZIP_SUFFIX = '.gz'
+
+COPY_BUFFER = 1024 * 1024
+
+class StorageTiers:
+    """Movimiento de archivos de video entre el nivel caliente y el frío"""
+
+    def __init__(self):
+        self.hot_folder = 'static/uploads'
+        self.cold_folder = 'cold_storage'
+        self.compress = False
+        self.cold_after_days = 30
+        self.touch_interval = timedelta(hours=1)
+        self.batch_size = 50
+        self.batch_pause = 1.0
+
+    def configure(self, config):
+        self.hot_folder = config['UPLOAD_FOLDER']
+        self.cold_folder = config.get('COLD_STORAGE_FOLDER', 'cold_storage')
+        self.compress = config.get('COLD_STORAGE_COMPRESS', False)
+        self.cold_after_days = config.get('STORAGE_COLD_AFTER_DAYS', 30)
+        self.touch_interval = timedelta(seconds=config.get('STORAGE_ACCESS_TOUCH_SECONDS', 3600))
+        self.batch_size = config.get('STORAGE_DEMOTE_BATCH_SIZE', 50)
+        self.batch_pause = config.get('STORAGE_DEMOTE_BATCH_PAUSE_SECONDS', 1.0)
+
+    def record_access(self, video_id, last_accessed_at=None):
+        """
+        Registrar un acceso; solo escribe si el anterior es más antiguo que
+        touch_interval. Con last_accessed_at (el del video ya cargado) un
+        acceso reciente no ejecuta ninguna sentencia.
+        """
+        now = datetime.utcnow()
+        if last_accessed_at is not None and last_accessed_at >= now - self.touch_interval:
+            return
+        db.session.execute(
+            update(Video)
+            .where(Video.id == video_id,
+                   or_(Video.last_accessed_at.is_(None),
+                       Video.last_accessed_at < now - self.touch_interval))
+            .values(last_accessed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def ensure_hot(self, video):
+        """Devolver la ruta del archivo en el nivel caliente, promoviéndolo si está en frío"""
+        if video.storage_tier != COLD:
+            return video.file_path
+
+        with self._video_lock(video.filename):
+            # Otro proceso pudo promoverlo mientras esperábamos el bloqueo
+            db.session.refresh(video)
+            if video.storage_tier != COLD:
+                return video.file_path
+
+            started = time.perf_counter()
+            cold_path = video.file_path
+            hot_path = os.path.join(self.hot_folder, video.filename)
+            self._copy(cold_path, hot_path, decompress=cold_path.endswith(GZIP_SUFFIX))
+            video.file_path = hot_path
+            video.storage_tier = HOT
+            video.last_accessed_at = datetime.utcnow()
+            db.session.commit()
+            os.remove(cold_path)
+
+        STORAGE_TIER_MOVES.labels(direction='promote').inc()
+        logger.info("Video %s promovido al nivel caliente en %.1f ms",
+                    video.id, (time.perf_counter() - started) * 1000)
+        return hot_path
+
+    def demote(self, older_than_days=None, batch_size=None, max_batches=None):
+        """
+        Mover al nivel frío, por lotes, los videos sin accesos en
+        older_than_days días. Devuelve (videos movidos, bytes movidos).
+        """
+        days = self.cold_after_days if older_than_days is None else older_than_days
+        batch_size = batch_size or self.batch_size
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        moved = moved_bytes = batches = 0
+        skipped = set()
+
+        while max_batches is None or batches < max_batches:
+            query = Video.query.filter(Video.storage_tier == HOT, Video.last_accessed_at < cutoff)
+            if skipped:
+                query = query.filter(Video.id.notin_(skipped))
+            videos = query.order_by(Video.last_accessed_at).limit(batch_size).all()
+            if not videos:
+                break
+
+            # Los videos con publicaciones en curso se están subiendo: se dejan
+            publishing = {
+                video_id for video_id, in db.session.query(Publication.video_id).filter(
+                    Publication.video_id.in_([video.id for video in videos]),
+                    Publication.status == 'pending'
+                ).distinct()
+            }
+            for video in videos:
+                size = None if video.id in publishing else self._demote_one(video, cutoff)
+                if size is None:
+                    skipped.add(video.id)
+                    continue
+                moved += 1
+                moved_bytes += size
+
+            batches += 1
+            db.session.expire_all()
+            if len(videos) == batch_size and self.batch_pause:
+                # Pausa entre lotes para no saturar el disco caliente
+                time.sleep(self.batch_pause)
+
+        if moved:
+            logger.info("%d videos movidos al nivel frío (%d bytes)", moved, moved_bytes)
+        return moved, moved_bytes
+
+    def _demote_one(self, video, cutoff):
+        with self._video_lock(video.filename, blocking=False) as acquired:
+            if not acquired:
+                return None
+            db.session.refresh(video)
+            if video.storage_tier != HOT or (video.last_accessed_at and video.last_accessed_at >= cutoff):
+                return None
+            hot_path = video.file_path
+            if not os.path.exists(hot_path):
+                logger.warning("Archivo del video %s no encontrado: %s", video.id, hot_path)
+                return None
+
+            size = os.path.getsize(hot_path)
+            cold_path = os.path.join(self.cold_folder, video.filename + (GZIP_SUFFIX if self.compress else ''))
+            self._copy(hot_path, cold_path, compress=self.compress)
+            video.file_path = cold_path
+            video.storage_tier = COLD
+            db.session.commit()
+            os.remove(hot_path)
+
+        STORAGE_TIER_MOVES.labels(direction='demote').inc()
+        return size
+
+    def _copy(self, source, destination, compress=False, decompress=False):
+        """Copiar a un temporal y renombrar (el destino nunca queda a medias)"""
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        try:
+            if compress or decompress:
+                opener_in = gzip.open if decompress else open
+                opener_out = gzip.open if compress else open
+                with opener_in(source, 'rb') as src, opener_out(temporary, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, COPY_BUFFER)
+            else:
+                shutil.copyfile(source, temporary)
+            with open(temporary, 'rb+') as written:
+                os.fsync(written.fileno())
+            os.replace(temporary, destination)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @contextmanager
+    def _video_lock(self, filename, blocking=True):
+        lock_path = os.path.join(self.cold_folder, '.locks', f"{filename}.lock")
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """Número de videos y bytes en cada nivel"""
+        rows = db.session.query(
+            Video.storage_tier, func.count(Video.id), func.coalesce(func.sum(Video.file_size), 0)
+        ).group_by(Video.storage_tier).all()
+        return {tier: {'videos': count, 'bytes': int(size)} for tier, count, size in rows}
+
+storage_tiers = StorageTiers()
+
+def init_storage_tiers(app):
+    """Aplicar la configuración de los niveles de almacenamiento"""
+    storage_tiers.configure(app.config)
+
+storage_cli = AppGroup('storage', help='Niveles de almacenamiento de los videos')
+
+@storage_cli.command('demote')
+@click.option('--days', type=int, default=None,
+              help='Días sin accesos para pasar a frío (STORAGE_COLD_AFTER_DAYS)')
+@click.option('--batch-size', type=int, default=None)
+@click.option('--max-batches', type=int, default=None)
+def demote_command(days, batch_size, max_batches):
+    """Mover al nivel frío los videos sin accesos recientes (para cron)"""
+    moved, moved_bytes = storage_tiers.demote(days, batch_size, max_batches)
+    click.echo(f"Videos movidos al nivel frío: {moved} ({moved_bytes / 1024 / 1024:.1f} MB)")
+
+@storage_cli.command('promote')
+@click.argument('video_id', type=int)
+def promote_command(video_id):
+    """Volver a mover un video al nivel caliente"""
+    video = db.session.get(Video, video_id)
+    if video is None:
+        raise click.ClickException('Video no encontrado')
+    click.echo(storage_tiers.ensure_hot(video))
+
+@storage_cli.command('status')
+def status_command():
+    """Mostrar videos y espacio ocupado en cada nivel"""
+    for tier, stats in sorted(storage_tiers.stats().items()):
+        click.echo(f"{tier}: {stats['videos']} videos, {stats['bytes'] / 1024 / 1024:.1f} MB")
@@ -0,0 +1,163 @@
+"""
+Índice en memoria para autocompletar tags
+
+Trie sobre los tags de video_tags (sin distinguir mayúsculas) en el que cada
+nodo guarda los K tags más usados de su subárbol, de modo que una sugerencia
+cuesta O(longitud del prefijo) sin importar cuántos tags haya.
+
+El índice se construye la primera vez que se usa y se actualiza de forma
+incremental: VideoService avisa de cada cambio de usage_count en este
+worker y, cada TAG_INDEX_REFRESH_SECONDS, se leen de la base de datos solo
+los tags modificados desde la última sincronización (cambios hechos por otros
+workers).
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from models import VideoTag
+
+logger = logging.getLogger(__name__)
+
+SYNC_OVERLAP = timedelta(seconds=5)
+
+class _Node:
+    __slots__ = ('children', 'tags', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.tags = {}  # Tags que terminan en este nodo: {tag: usage_count}
+        self.top = []  # [(usage_count, tag)] de mayor a menor, como mucho K
+
+def _rank(entry):
+    count, tag = entry
+    return (-count, tag)
+
+class TagIndex:
+    """Trie de tags con los K más usados precalculados en cada nodo"""
+
+    def __init__(self, max_suggestions=10, refresh_seconds=30):
+        self.max_suggestions = max_suggestions
+        self.refresh_seconds = refresh_seconds
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._watermark = None
+        self._last_refresh = 0.0
+
+    def suggest(self, prefix, limit=None):
+        """Tags que empiezan por prefix ordenados por usage_count"""
+        self._ensure_fresh()
+        limit = min(limit or self.max_suggestions, self.max_suggestions)
+        with self._lock:
+            node = self._root
+            for char in prefix.strip().casefold():
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            return [{'tag': tag, 'usage_count': count} for count, tag in node.top[:limit]]
+
+    def update(self, tag, usage_count):
+        """Aplicar el nuevo usage_count de un tag (0 lo quita de las sugerencias)"""
+        with self._lock:
+            self._apply(tag, usage_count)
+
+    def _apply(self, tag, usage_count):
+        path = [self._root]
+        for char in tag.casefold():
+            path.append(path[-1].children.setdefault(char, _Node()))
+
+        leaf = path[-1]
+        if usage_count > 0:
+            leaf.tags[tag] = usage_count
+        else:
+            leaf.tags.pop(tag, None)
+
+        # Recalcular el top-K de abajo arriba; los nodos vacíos se podan
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            candidates = [(count, name) for name, count in node.tags.items()]
+            for child in node.children.values():
+                candidates.extend(child.top)
+            candidates.sort(key=_rank)
+            node.top = candidates[:self.max_suggestions]
+            if depth and not node.top and not node.children:
+                del path[depth - 1].children[tag.casefold()[depth - 1]]
+
+    def _rebuild(self, rows):
+        """Construir el trie completo con un solo recorrido para los top-K"""
+        root = _Node()
+        for tag, usage_count in rows:
+            if not usage_count:
+                continue
+            node = root
+            for char in tag.casefold():
+                node = node.children.setdefault(char, _Node())
+            node.tags[tag] = usage_count
+
+        # Postorden iterativo: cada nodo combina los top-K de sus hijos
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+                continue
+            candidates = [(count, name) for name, count in node.tags.items()]
+            for child in node.children.values():
+                candidates.extend(child.top)
+            candidates.sort(key=_rank)
+            node.top = candidates[:self.max_suggestions]
+        return root
+
+    def _ensure_fresh(self):
+        """Cargar el índice o aplicar los cambios de otros workers si toca"""
+        if self._loaded and time.monotonic() - self._last_refresh < self.refresh_seconds:
+            return
+        # Solo un hilo sincroniza; el resto responde con el índice actual
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if self._loaded and time.monotonic() - self._last_refresh < self.refresh_seconds:
+                return
+            self._sync()
+        finally:
+            self._refresh_lock.release()
+
+    def _sync(self):
+        started = time.perf_counter()
+        query = VideoTag.query.with_entities(VideoTag.tag, VideoTag.usage_count, VideoTag.updated_at)
+        if self._loaded and self._watermark is not None:
+            # Con solapamiento para no perder transacciones que confirmaron
+            # tarde; reaplicar un usage_count es inocuo
+            query = query.filter(VideoTag.updated_at >= self._watermark - SYNC_OVERLAP)
+        rows = query.all()
+
+        watermark = max((updated_at for _, _, updated_at in rows if updated_at), default=None)
+        if not self._loaded:
+            root = self._rebuild((tag, usage_count) for tag, usage_count, _ in rows)
+        with self._lock:
+            if not self._loaded:
+                # Lo que update() aplicó durante la carga ya está confirmado en la
+                # base de datos; el siguiente _sync lo recoge por el solapamiento
+                self._root = root
+            else:
+                for tag, usage_count, _ in rows:
+                    self._apply(tag, usage_count or 0)
+            if watermark and (self._watermark is None or watermark > self._watermark):
+                self._watermark = watermark
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+
+        logger.debug("Índice de tags sincronizado: %d cambios en %.1f ms",
+                     len(rows), (time.perf_counter() - started) * 1000)
+
+tag_index = TagIndex()
+
+def init_tag_index(app):
+    """Aplicar la configuración del índice (se carga al primer uso)"""
+    tag_index.max_suggestions = app.config.get('TAG_SUGGESTIONS_MAX', 10)
+    tag_index.refresh_seconds = app.config.get('TAG_INDEX_REFRESH_SECONDS', 30)
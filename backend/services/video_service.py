@@ -1,44 +1,66 @@
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from flask import current_app
-from sqlalchemy import or_, and_
-from models import db, Video, VideoTag
+from sqlalchemy import or_, and_, func, inspect, select, union_all, literal_column, cast, null, distinct, String
+from sqlalchemy.orm import selectinload
+from models import db, Video, VideoTag, VideoMetadata, VideoTagMap, Publication
+from db_routing import read_only
+from upload_pipeline import ALLOWED_EXTENSIONS, UploadSink
+from services.tag_index import tag_index
+from services.fingerprints import fingerprint_index
 import subprocess
+import hashlib
 import json
+import time
+import logging
+from metrics import UPLOAD_BYTES, UPLOAD_DURATION, FFPROBE_DURATION
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_INTERVALS = ('day', 'week', 'month')
 
 class VideoService:
     """Servicio para gestión de videos"""
     
     def __init__(self):
-        self.allowed_extensions = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'}
+        self.allowed_extensions = ALLOWED_EXTENSIONS
     
     def upload_video(self, file, title, description, tags):
         """
         Subir un video al sistema
         """
+        started = time.perf_counter()
         try:
             # Validar archivo
             if not self._is_allowed_file(file.filename):
                 raise ValueError("Formato de archivo no permitido")
             
-            # Generar nombre único para el archivo
-            filename = self._generate_unique_filename(file.filename)
-            
-            # Ruta donde se guardará el archivo
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            file_path = os.path.join(upload_folder, filename)
-            
-            # Crear directorio si no existe
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            # Guardar archivo
-            file.save(file_path)
+            sink = file.stream if isinstance(file.stream, UploadSink) else None
+            if sink is not None:
+                # Ya escrito en UPLOAD_FOLDER mientras se recibía (upload_pipeline)
+                filename = sink.filename
+                file_path = sink.path
+                file_size = sink.size
+                checksum = sink.checksum
+            else:
+                # Generar nombre único para el archivo
+                filename = self._generate_unique_filename(file.filename)
+                
+                # Ruta donde se guardará el archivo
+                upload_folder = current_app.config['UPLOAD_FOLDER']
+                file_path = os.path.join(upload_folder, filename)
+                
+                # Crear directorio si no existe
+                os.makedirs(upload_folder, exist_ok=True)
+                
+                # Guardar archivo calculando tamaño y checksum en la misma pasada
+                file_size, checksum = self._save_with_checksum(file.stream, file_path)
             
-            # Obtener información del video
-            file_size = os.path.getsize(file_path)
-            duration = self._get_video_duration(file_path)
+            # Obtener información del video (una sola ejecución de ffprobe)
+            probe = self._probe_video(file_path)
+            duration = self._duration_from_probe(probe)
             
             # Crear registro en la base de datos
             video = Video(
@@ -48,63 +70,186 @@ class VideoService:
                 original_filename=file.filename,
                 file_path=file_path,
                 file_size=file_size,
+                checksum=checksum,
                 duration=duration,
                 tags=tags.strip() if tags else ''
             )
+            if probe:
+                video.video_metadata = VideoMetadata.from_ffprobe(
+                    probe, container=filename.rsplit('.', 1)[1].lower(), size=file_size
+                )
+            video.sync_tag_links()
             
             db.session.add(video)
             db.session.commit()
+            if sink is not None:
+                sink.keep()
             
             # Actualizar estadísticas de tags
             self._update_tags_statistics(video.get_tags_list())
             
-            return video.to_dict()
+            video_data = video.to_dict()
+            if fingerprint_index.enabled:
+                # Copias recodificadas o recortadas de videos ya subidos (solo aviso)
+                video_data['possible_duplicates'] = fingerprint_index.check_upload(video)
+            
+            UPLOAD_BYTES.observe(file_size)
+            UPLOAD_DURATION.labels(outcome='success').observe(time.perf_counter() - started)
+            
+            return video_data
             
         except Exception as e:
+            UPLOAD_DURATION.labels(outcome='error').observe(time.perf_counter() - started)
             db.session.rollback()
             # Eliminar archivo si fue creado
             if 'file_path' in locals() and os.path.exists(file_path):
                 os.remove(file_path)
             raise e
     
+    @read_only
     def get_videos(self, search='', tag='', sort_by='date', order='desc'):
         """
         Obtener lista de videos con filtros y ordenamiento
         """
         try:
-            query = Video.query
-            
-            # Aplicar filtros de búsqueda
-            if search:
-                search_filter = or_(
-                    Video.title.contains(search),
-                    Video.description.contains(search),
-                    Video.tags.contains(search)
-                )
-                query = query.filter(search_filter)
-            
-            # Filtrar por tag específico
-            if tag:
-                query = query.filter(Video.tags.contains(tag))
-            
-            # Aplicar ordenamiento
-            if sort_by == 'title':
-                if order == 'asc':
-                    query = query.order_by(Video.title.asc())
-                else:
-                    query = query.order_by(Video.title.desc())
-            else:  # sort_by == 'date'
-                if order == 'asc':
-                    query = query.order_by(Video.upload_date.asc())
-                else:
-                    query = query.order_by(Video.upload_date.desc())
-            
-            videos = query.all()
+            videos = self._videos_query(search, tag, sort_by, order).options(
+                selectinload(Video.publications)
+            ).all()
             return [video.to_dict() for video in videos]
             
         except Exception as e:
             raise e
     
+    @read_only
+    def iter_videos(self, search='', tag='', sort_by='date', order='desc', batch_size=500):
+        """
+        Igual que get_videos pero entregando los videos de uno en uno con un
+        cursor del servidor (para respuestas en streaming)
+        """
+        yield from self._iter_dicts(self._videos_query(search, tag, sort_by, order), batch_size)
+    
+    @read_only
+    def get_videos_page(self, search='', tag='', sort_by='date', order='desc', page=1, per_page=20):
+        """
+        Una página de get_videos con el total de resultados
+        """
+        query = self._videos_query(search, tag, sort_by, order)
+        total = query.order_by(None).count()
+        videos = query.options(selectinload(Video.publications)).offset(
+            (page - 1) * per_page
+        ).limit(per_page).all()
+        return {
+            'videos': [video.to_dict() for video in videos],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
+            }
+        }
+    
+    @read_only
+    def get_video_facets(self, search='', tag='', tags_limit=100):
+        """
+        Recuentos para los filtros sobre los videos que cumplen search y tag:
+        total, videos por tag, por plataforma y estado de publicación y por
+        mes de subida. Se calculan en una sola consulta (UNION ALL de
+        agregados sobre el mismo conjunto filtrado).
+        """
+        filtered = self._filter_videos(
+            db.session.query(Video.id.label('id'), Video.upload_date.label('upload_date')), search, tag
+        ).cte('filtered')
+        month = self._month_expression(filtered.c.upload_date)
+        no_value = cast(null(), String)
+        
+        facet_query = union_all(
+            select(literal_column("'total'", String), no_value, no_value, func.count())
+            .select_from(filtered),
+            select(literal_column("'tag'", String), VideoTagMap.tag, no_value, func.count())
+            .select_from(VideoTagMap)
+            .join(filtered, filtered.c.id == VideoTagMap.video_id)
+            .group_by(VideoTagMap.tag),
+            # Videos (no publicaciones) con alguna publicación en ese estado
+            select(literal_column("'platform'", String), Publication.platform, Publication.status,
+                   func.count(distinct(Publication.video_id)))
+            .select_from(Publication)
+            .join(filtered, filtered.c.id == Publication.video_id)
+            .group_by(Publication.platform, Publication.status),
+            select(literal_column("'month'", String), month, no_value, func.count())
+            .select_from(filtered)
+            .group_by(month)
+        )
+        
+        facets = {'total': 0, 'tags': [], 'platforms': [], 'months': []}
+        for facet, value, status, count in db.session.execute(facet_query):
+            if facet == 'total':
+                facets['total'] = count
+            elif facet == 'tag':
+                facets['tags'].append({'tag': value, 'count': count})
+            elif facet == 'platform':
+                facets['platforms'].append({'platform': value, 'status': status or 'pending', 'count': count})
+            elif value:
+                facets['months'].append({'month': value, 'count': count})
+        
+        facets['tags'].sort(key=lambda item: (-item['count'], item['tag']))
+        facets['tags'] = facets['tags'][:tags_limit]
+        facets['platforms'].sort(key=lambda item: (item['platform'], item['status']))
+        facets['months'].sort(key=lambda item: item['month'], reverse=True)
+        return facets
+    
+    def _videos_query(self, search, tag, sort_by, order):
+        query = self._filter_videos(Video.query, search, tag)
+        
+        # Aplicar ordenamiento (id como desempate para un orden estable)
+        if sort_by == 'title':
+            column = Video.title
+        else:  # sort_by == 'date'
+            column = Video.upload_date
+        if order == 'asc':
+            return query.order_by(column.asc(), Video.id.asc())
+        return query.order_by(column.desc(), Video.id.desc())
+    
+    def _filter_videos(self, query, search, tag):
+        # Aplicar filtros de búsqueda
+        if search:
+            search_filter = or_(
+                Video.title.icontains(search),
+                Video.description.icontains(search),
+                Video.tags.icontains(search)
+            )
+            query = query.filter(search_filter)
+        
+        # Filtrar por tag específico (exacto, con el índice de video_tag_map)
+        if tag:
+            query = query.filter(Video.id.in_(
+                select(VideoTagMap.video_id).where(VideoTagMap.tag == tag.strip())
+            ))
+        return query
+    
+    def _iter_dicts(self, query, batch_size):
+        """
+        Recorrer la consulta por lotes de batch_size filas (yield_per) y
+        cargar las publicaciones de cada lote en una sola consulta. Los
+        videos ya serializados se sacan de la sesión para que la memoria no
+        crezca con el número de filas.
+        """
+        session = db.session
+        batch = []
+        for video in query.options(selectinload(Video.publications)).yield_per(batch_size):
+            yield video.to_dict()
+            batch.append(video)
+            if len(batch) >= batch_size:
+                self._expunge(session, batch)
+                batch = []
+        self._expunge(session, batch)
+    
+    def _expunge(self, session, videos):
+        for video in videos:
+            for publication in video.publications:
+                session.expunge(publication)
+            session.expunge(video)
+    
+    @read_only
     def get_video_by_id(self, video_id):
         """
         Obtener un video específico por ID
@@ -112,11 +257,35 @@ class VideoService:
         try:
             video = Video.query.get(video_id)
             if video:
-                return video.to_dict()
+                video_data = video.to_dict()
+                video_data['metadata'] = video.video_metadata.to_dict() if video.video_metadata else None
+                return video_data
             return None
         except Exception as e:
             raise e
     
+    @read_only
+    def get_video_metadata(self, video_id):
+        """
+        Obtener metadatos de ffprobe y compatibilidad por plataforma de un video
+        """
+        metadata = VideoMetadata.query.filter_by(video_id=video_id).first()
+        return metadata.to_dict() if metadata else None
+    
+    @read_only
+    def get_similar_videos(self, video_id, max_distance=None, limit=20):
+        """
+        Videos casi duplicados de uno dado (por huellas perceptuales)
+        """
+        if db.session.get(Video, video_id) is None:
+            return None
+        similar = fingerprint_index.similar(video_id, max_distance=max_distance, limit=limit)
+        return {
+            'video_id': video_id,
+            'fingerprinted': similar is not None,
+            'similar': similar or []
+        }
+    
     def delete_video(self, video_id):
         """
         Eliminar un video
@@ -136,6 +305,7 @@ class VideoService:
             # Eliminar registro de la base de datos
             db.session.delete(video)
             db.session.commit()
+            fingerprint_index.remove(video_id)
             
             return True
             
@@ -170,6 +340,7 @@ class VideoService:
                 self._update_tags_statistics(new_tags, increment=True)
                 
                 video.tags = tags.strip()
+                video.sync_tag_links()
             
             video.updated_at = datetime.utcnow()
             db.session.commit()
@@ -194,23 +365,134 @@ class VideoService:
         except Exception as e:
             raise e
     
-    def search_videos_by_date_range(self, start_date, end_date):
+    def suggest_tags(self, prefix, limit=None):
         """
-        Buscar videos por rango de fechas
+        Sugerir tags que empiezan por un prefijo, ordenados por uso
+        """
+        return tag_index.suggest(prefix, limit)
+    
+    @read_only
+    def search_videos_by_date_range(self, start_date, end_date, page=1, per_page=20):
+        """
+        Buscar videos por rango de fechas [start_date, end_date) con paginación
         """
         try:
-            videos = Video.query.filter(
+            query = Video.query.filter(
                 and_(
                     Video.upload_date >= start_date,
-                    Video.upload_date <= end_date
+                    Video.upload_date < end_date
                 )
-            ).order_by(Video.upload_date.desc()).all()
+            )
+            total = query.count()
             
-            return [video.to_dict() for video in videos]
+            # Orden estable (id) para que las páginas no se solapen
+            videos = query.options(selectinload(Video.publications)).order_by(
+                Video.upload_date.desc(), Video.id.desc()
+            ).offset((page - 1) * per_page).limit(per_page).all()
+            
+            return {
+                'videos': [video.to_dict() for video in videos],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': (total + per_page - 1) // per_page
+                }
+            }
             
         except Exception as e:
             raise e
     
+    @read_only
+    def iter_videos_by_date_range(self, start_date, end_date, batch_size=500):
+        """
+        Todos los videos del rango [start_date, end_date), del más reciente
+        al más antiguo, entregados de uno en uno (para respuestas en streaming)
+        """
+        query = Video.query.filter(
+            Video.upload_date >= start_date,
+            Video.upload_date < end_date
+        ).order_by(Video.upload_date.desc(), Video.id.desc())
+        yield from self._iter_dicts(query, batch_size)
+    
+    @read_only
+    def get_upload_histogram(self, start_date, end_date, interval='day'):
+        """
+        Número de videos y bytes subidos por día, semana o mes en el rango
+        [start_date, end_date). La agregación se hace en SQL sobre el índice
+        de upload_date; los periodos sin subidas se rellenan con ceros.
+        """
+        if interval not in HISTOGRAM_INTERVALS:
+            raise ValueError(f"Intervalo no válido: {interval}")
+        
+        period = self._period_expression(interval)
+        rows = db.session.query(
+            period.label('period'),
+            func.count(Video.id),
+            func.coalesce(func.sum(Video.file_size), 0)
+        ).filter(
+            Video.upload_date >= start_date,
+            Video.upload_date < end_date
+        ).group_by(period).all()
+        
+        counts = {self._period_start(value, interval): (count, total_bytes)
+                  for value, count, total_bytes in rows}
+        
+        histogram = []
+        current = self._period_start(start_date, interval)
+        while current < end_date:
+            count, total_bytes = counts.get(current, (0, 0))
+            histogram.append({
+                'period': current.date().isoformat(),
+                'count': count,
+                'bytes': int(total_bytes)
+            })
+            current = self._next_period(current, interval)
+        return histogram
+    
+    def _period_expression(self, interval):
+        """
+        Expresión SQL que trunca upload_date al inicio del periodo
+        """
+        if db.session.get_bind(mapper=inspect(Video)).dialect.name == 'postgresql':
+            return func.date_trunc(interval, Video.upload_date)
+        # SQLite: semanas de lunes a domingo, como date_trunc('week')
+        if interval == 'week':
+            return func.date(Video.upload_date, '-6 days', 'weekday 1')
+        if interval == 'month':
+            return func.strftime('%Y-%m-01', Video.upload_date)
+        return func.date(Video.upload_date)
+    
+    def _month_expression(self, column):
+        """
+        Mes de una fecha como texto YYYY-MM
+        """
+        if db.session.get_bind(mapper=inspect(Video)).dialect.name == 'postgresql':
+            return func.to_char(column, 'YYYY-MM')
+        return func.strftime('%Y-%m', column)
+    
+    def _period_start(self, value, interval):
+        """
+        Normalizar un valor de periodo (datetime o texto de SQLite) a datetime
+        """
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        value = datetime(value.year, value.month, value.day)
+        if interval == 'week':
+            return value - timedelta(days=value.weekday())
+        if interval == 'month':
+            return value.replace(day=1)
+        return value
+    
+    def _next_period(self, value, interval):
+        if interval == 'day':
+            return value + timedelta(days=1)
+        if interval == 'week':
+            return value + timedelta(weeks=1)
+        if value.month == 12:
+            return value.replace(year=value.year + 1, month=1)
+        return value.replace(month=value.month + 1)
+    
     def _is_allowed_file(self, filename):
         """
         Verificar si el archivo tiene una extensión permitida
@@ -218,6 +500,22 @@ class VideoService:
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
     
+    def _save_with_checksum(self, stream, file_path, chunk_size=1024 * 1024):
+        """
+        Copiar un stream a disco por bloques devolviendo (tamaño, sha256)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(file_path, 'wb') as destination:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                destination.write(chunk)
+        return size, digest.hexdigest()
+    
     def _generate_unique_filename(self, original_filename):
         """
         Generar nombre único para el archivo
@@ -234,12 +532,13 @@ class VideoService:
         
         return secure_filename(filename)
     
-    def _get_video_duration(self, file_path):
+    def _probe_video(self, file_path):
         """
-        Obtener duración del video usando ffprobe
+        Obtener los metadatos completos del video usando ffprobe
         """
+        started = time.perf_counter()
+        outcome = 'error'
         try:
-            # Comando ffprobe para obtener duración
             cmd = [
                 'ffprobe', '-v', 'quiet', '-print_format', 'json',
                 '-show_format', '-show_streams', file_path
@@ -249,22 +548,34 @@ class VideoService:
             
             if result.returncode == 0:
                 data = json.loads(result.stdout)
-                duration = float(data['format']['duration'])
-                return duration
+                outcome = 'success'
+                return data
             else:
                 # Si ffprobe no está disponible, retornar None
                 return None
                 
         except (subprocess.TimeoutExpired, subprocess.CalledProcessError, 
-                json.JSONDecodeError, KeyError, FileNotFoundError):
+                json.JSONDecodeError, FileNotFoundError):
             # Si hay algún error, retornar None
             return None
+        finally:
+            FFPROBE_DURATION.labels(outcome=outcome).observe(time.perf_counter() - started)
+    
+    def _duration_from_probe(self, probe):
+        """
+        Extraer la duración en segundos de la salida de ffprobe
+        """
+        try:
+            return float(probe['format']['duration'])
+        except (TypeError, KeyError, ValueError):
+            return None
     
     def _update_tags_statistics(self, tags_list, increment=True):
         """
         Actualizar estadísticas de uso de tags
         """
         try:
+            updated_counts = {}
             for tag_name in tags_list:
                 if not tag_name:
                     continue
@@ -283,13 +594,19 @@ class VideoService:
                         tag.usage_count = max(0, tag.usage_count - 1)
                     
                     tag.updated_at = datetime.utcnow()
+                
+                updated_counts[tag_name] = tag.usage_count
             
             db.session.commit()
             
+            # Actualizar el índice de autocompletado de este worker
+            for tag_name, usage_count in updated_counts.items():
+                tag_index.update(tag_name, usage_count)
+            
         except Exception as e:
             db.session.rollback()
             # No relanzar la excepción para no afectar la operación principal
-            print(f"Error actualizando estadísticas de tags: {e}")
+            logger.error("Error actualizando estadísticas de tags: %s", e)
     
     def get_video_stats(self):
         """
@@ -315,6 +632,7 @@ class VideoService:
         except Exception as e:
             raise e
     
+    @read_only
     def get_statistics(self):
         """
         Obtener estadísticas completas de la aplicación
@@ -330,6 +648,7 @@ class VideoService:
         except Exception as e:
             raise e
     
+    @read_only
     def get_all_tags(self):
         """
         Obtener todos los tags disponibles
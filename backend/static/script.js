@@ -1,7 +1,9 @@
 // Variables globales
 let currentVideoId = null;
-let allVideos = [];
 let filteredVideos = [];
+let videoPagination = null;
+let videosRequestId = 0;
+let publicationStream = null;
 
 // Configuración de la API
 // Detectar automáticamente el entorno
@@ -25,10 +27,17 @@ function getApiBaseUrl() {
 
 const API_BASE_URL = getApiBaseUrl();
 
+// Videos por página del listado (el servidor filtra, ordena y cuenta los tags)
+const VIDEOS_PER_PAGE = 60;
+
+// Espera antes de reabrir el flujo de publicaciones si el servidor lo rechaza
+const PUBLICATION_STREAM_RETRY_MS = 10000;
+
 // DOM Elements
 const searchInput = document.getElementById('searchInput');
 const sortSelect = document.getElementById('sortSelect');
 const tagFilter = document.getElementById('tagFilter');
+const loadMoreButton = document.getElementById('loadMoreButton');
 const videosContainer = document.getElementById('videosContainer');
 const uploadForm = document.getElementById('uploadForm');
 const fileUploadArea = document.getElementById('fileUploadArea');
@@ -124,20 +133,39 @@ function showSection(sectionName) {
 }
 
 // Gestión de videos
+function videoQueryParams(page) {
+    const [sortBy, order] = sortSelect.value.split('-');
+    return new URLSearchParams({
+        search: searchInput.value.trim(),
+        tag: tagFilter.value,
+        sort_by: sortBy,
+        order: order,
+        page: page,
+        per_page: VIDEOS_PER_PAGE
+    });
+}
+
 async function loadVideos() {
+    // Solo se pinta la respuesta de la última búsqueda
+    const requestId = ++videosRequestId;
     try {
         showLoading();
-        const response = await fetch(`${API_BASE_URL}/api/videos`);
+        const params = videoQueryParams(1);
+        params.set('facets', '1');
+        const response = await fetch(`${API_BASE_URL}/api/videos?${params}`);
         
         if (!response.ok) {
             throw new Error('Error al cargar videos');
         }
         
         const data = await response.json();
-        allVideos = data.data || [];
-        filteredVideos = [...allVideos];
+        if (requestId !== videosRequestId) {
+            return;
+        }
+        filteredVideos = data.data || [];
+        videoPagination = data.pagination;
         
-        updateTagFilter();
+        updateTagFilter(data.facets.tags);
         renderVideos();
         
     } catch (error) {
@@ -147,9 +175,41 @@ async function loadVideos() {
     }
 }
 
+async function loadMoreVideos() {
+    if (!videoPagination || videoPagination.page >= videoPagination.pages) {
+        return;
+    }
+    const requestId = videosRequestId;
+    try {
+        loadMoreButton.disabled = true;
+        const response = await fetch(`${API_BASE_URL}/api/videos?${videoQueryParams(videoPagination.page + 1)}`);
+        
+        if (!response.ok) {
+            throw new Error('Error al cargar videos');
+        }
+        
+        const data = await response.json();
+        if (requestId !== videosRequestId) {
+            return;
+        }
+        filteredVideos = filteredVideos.concat(data.data || []);
+        videoPagination = data.pagination;
+        renderVideos();
+        
+    } catch (error) {
+        console.error('Error:', error);
+        showToast('Error al cargar videos', 'error');
+    } finally {
+        loadMoreButton.disabled = false;
+    }
+}
+
 function renderVideos() {
     hideLoading();
     
+    loadMoreButton.style.display =
+        videoPagination && videoPagination.page < videoPagination.pages ? '' : 'none';
+    
     if (filteredVideos.length === 0) {
         showEmptyState();
         return;
@@ -186,58 +246,18 @@ function renderVideos() {
 }
 
 function filterVideos() {
-    const searchTerm = searchInput.value.toLowerCase();
-    const selectedTag = tagFilter.value;
-    const sortBy = sortSelect.value;
-    
-    // Filtrar
-    filteredVideos = allVideos.filter(video => {
-        const matchesSearch = !searchTerm || 
-            video.title.toLowerCase().includes(searchTerm) ||
-            video.description.toLowerCase().includes(searchTerm) ||
-            video.tags.some(tag => tag.toLowerCase().includes(searchTerm));
-        
-        const matchesTag = !selectedTag || video.tags.includes(selectedTag);
-        
-        return matchesSearch && matchesTag;
-    });
-    
-    // Ordenar
-    const [sortField, sortOrder] = sortBy.split('-');
-    filteredVideos.sort((a, b) => {
-        let aValue, bValue;
-        
-        if (sortField === 'date') {
-            aValue = new Date(a.upload_date);
-            bValue = new Date(b.upload_date);
-        } else if (sortField === 'title') {
-            aValue = a.title.toLowerCase();
-            bValue = b.title.toLowerCase();
-        }
-        
-        if (sortOrder === 'asc') {
-            return aValue > bValue ? 1 : -1;
-        } else {
-            return aValue < bValue ? 1 : -1;
-        }
-    });
-    
-    renderVideos();
+    loadVideos();
 }
 
-function updateTagFilter() {
-    const allTags = new Set();
-    allVideos.forEach(video => {
-        video.tags.forEach(tag => allTags.add(tag));
-    });
-    
+function updateTagFilter(tagFacets) {
     const currentValue = tagFilter.value;
     tagFilter.innerHTML = '<option value="">Todos los tags</option>';
     
-    Array.from(allTags).sort().forEach(tag => {
+    // Recuentos sobre los videos que cumplen la búsqueda actual
+    [...tagFacets].sort((a, b) => a.tag.localeCompare(b.tag)).forEach(({ tag, count }) => {
         const option = document.createElement('option');
         option.value = tag;
-        option.textContent = tag;
+        option.textContent = `${tag} (${count})`;
         if (tag === currentValue) {
             option.selected = true;
         }
@@ -276,6 +296,9 @@ async function openVideoModal(videoId) {
             cb.checked = false;
         });
         
+        // Recibir en vivo los cambios de estado de sus publicaciones
+        subscribeToPublications(videoId);
+        
         // Mostrar modal
         videoModal.classList.add('active');
         document.body.style.overflow = 'hidden';
@@ -295,6 +318,7 @@ function closeModal() {
     modalVideo.pause();
     modalVideo.currentTime = 0;
     
+    closePublicationStream();
     currentVideoId = null;
 }
 
@@ -389,7 +413,14 @@ async function handleUpload(e) {
         console.log('   - Response Data:', data);
         
         if (response.ok) {
-            showToast('Video subido exitosamente', 'success');
+            const duplicates = data.data.possible_duplicates || [];
+            if (duplicates.length) {
+                const titles = duplicates.slice(0, 3)
+                    .map(d => `"${d.title}" (${Math.round(d.similarity * 100)}%)`).join(', ');
+                showToast(`Video subido, pero parece una copia de: ${titles}`, 'warning');
+            } else {
+                showToast('Video subido exitosamente', 'success');
+            }
             resetForm();
             loadVideos();
             showSection('videos');
@@ -459,6 +490,13 @@ function hideUploadProgress() {
 }
 
 // Publicación en redes sociales
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 async function publishVideo() {
     const selectedPlatforms = Array.from(document.querySelectorAll('input[name="platform"]:checked'))
         .map(cb => cb.value);
@@ -478,7 +516,10 @@ async function publishVideo() {
         const response = await fetch(`${API_BASE_URL}/api/videos/${currentVideoId}/publish`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                // Una clave por pulsación: si la petición se repite, el servidor
+                // devuelve el resultado guardado en lugar de publicar otra vez
+                'Idempotency-Key': newIdempotencyKey()
             },
             body: JSON.stringify({
                 platforms: selectedPlatforms
@@ -524,6 +565,67 @@ function showPublicationResults(results) {
     statusDiv.style.display = 'block';
 }
 
+// Estado de publicaciones en vivo (Server-Sent Events)
+function subscribeToPublications(videoId) {
+    closePublicationStream();
+    
+    if (!window.EventSource) {
+        return;
+    }
+    
+    const statuses = {};
+    const handleEvent = (e) => {
+        const publication = JSON.parse(e.data);
+        statuses[publication.platform] = publication;
+        renderPublicationStatuses(statuses);
+    };
+    
+    const stream = new EventSource(`${API_BASE_URL}/api/videos/${videoId}/publications/stream`);
+    stream.addEventListener('snapshot', handleEvent);
+    stream.addEventListener('publication', handleEvent);
+    // Con el servidor lleno (503) EventSource no reconecta solo
+    stream.onerror = () => {
+        if (stream.readyState === EventSource.CLOSED) {
+            setTimeout(() => {
+                if (publicationStream === stream) {
+                    subscribeToPublications(videoId);
+                }
+            }, PUBLICATION_STREAM_RETRY_MS);
+        }
+    };
+    publicationStream = stream;
+}
+
+function closePublicationStream() {
+    if (publicationStream) {
+        publicationStream.close();
+        publicationStream = null;
+    }
+}
+
+function renderPublicationStatuses(statuses) {
+    const statusDiv = document.getElementById('publicationStatus');
+    const labels = {
+        pending: '<span class="pending">⏳ Publicando...</span>',
+        published: '<span class="success">✓ Publicado</span>',
+        failed: '<span class="error">✗ Falló</span>'
+    };
+    
+    const statusesHTML = Object.values(statuses).map(publication => `
+        <div class="publication-result ${publication.status === 'failed' ? 'error' : 'success'}">
+            <strong>${publication.platform.charAt(0).toUpperCase() + publication.platform.slice(1)}:</strong>
+            ${labels[publication.status] || escapeHtml(publication.status)}
+            ${publication.message ? escapeHtml(publication.message) : ''}
+        </div>
+    `).join('');
+    
+    statusDiv.innerHTML = `
+        <h5>Estado de Publicaciones:</h5>
+        ${statusesHTML}
+    `;
+    statusDiv.style.display = 'block';
+}
+
 // Eliminar video
 async function deleteVideo() {
     if (!confirm('¿Estás seguro de que quieres eliminar este video? Esta acción no se puede deshacer.')) {
@@ -583,17 +685,17 @@ async function loadStats() {
 
 async function loadPopularTags() {
     try {
-        // Calcular tags populares desde los videos cargados
-        const tagCounts = {};
-        allVideos.forEach(video => {
-            video.tags.forEach(tag => {
-                tagCounts[tag] = (tagCounts[tag] || 0) + 1;
-            });
-        });
+        // Recuentos de tags de todo el catálogo (facetas del servidor, sin descargar los videos)
+        const response = await fetch(`${API_BASE_URL}/api/videos?facets=1&page=1&per_page=1`);
         
-        const popularTags = Object.entries(tagCounts)
-            .sort((a, b) => b[1] - a[1])
-            .slice(0, 10);
+        if (!response.ok) {
+            throw new Error('Error al cargar tags populares');
+        }
+        
+        const data = await response.json();
+        const popularTags = data.facets.tags
+            .slice(0, 10)
+            .map(({ tag, count }) => [tag, count]);
         
         const tagsContainer = document.getElementById('tagsContainer');
         
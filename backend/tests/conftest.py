@@ -0,0 +1,64 @@
+"""
+Fixtures comunes: una aplicación con configuración de pruebas sobre una base
+SQLite en archivo (los hilos de cada prueba comparten la misma base, como
+los workers comparten PostgreSQL)
+"""
+
+import os
+import threading
+
+import pytest
+
+# Antes de importar la configuración: load_dotenv no pisa variables ya
+# definidas y la app del módulo app.py no debe apuntar a la base del .env
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from config import TestConfig
+from models import db, Video
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(TestConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(TestConfig, 'FINGERPRINTS_ENABLED', False)
+    from app import create_app
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def video(app):
+    video = Video(title='Video', filename='video.mp4', original_filename='video.mp4',
+                  file_path='/tmp/video.mp4', file_size=1, tags='a,b')
+    db.session.add(video)
+    db.session.commit()
+    return video
+
+def run_in_threads(app, *targets):
+    """Ejecutar cada target en su hilo (con su contexto de aplicación) y devolver sus resultados"""
+    results = [None] * len(targets)
+    errors = []
+    start = threading.Barrier(len(targets))
+
+    def runner(index, target):
+        with app.app_context():
+            try:
+                start.wait()
+                results[index] = target()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=runner, args=(i, target)) for i, target in enumerate(targets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,128 @@
+"""Reparto de publicaciones entre cuentas: concurrencia, cuota y reservas caducadas"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Platform, PlatformAccount, PlatformAccountLease
+from services.platform_accounts import AccountRegistry, AccountUnavailable
+from tests.conftest import run_in_threads
+
+@pytest.fixture
+def registry(app):
+    registry = AccountRegistry()
+    registry.configure(app.config)
+    registry.wait_seconds = 0.5
+    return registry
+
+def add_account(**values):
+    if not db.session.execute(db.select(Platform).filter_by(name='twitter')).first():
+        db.session.add(Platform(name='twitter', display_name='Twitter'))
+    account = PlatformAccount(platform='twitter', name=values.pop('name', 'principal'),
+                              credentials='{"bearer_token": "t"}', **values)
+    db.session.add(account)
+    db.session.commit()
+    return account
+
+def account_state(account_id):
+    db.session.expire_all()
+    account = db.session.get(PlatformAccount, account_id)
+    leases = db.session.execute(
+        db.select(PlatformAccountLease).filter_by(account_id=account_id)
+    ).scalars().all()
+    return account, leases
+
+def test_concurrent_acquires_respect_max_concurrency(app, registry):
+    account = add_account(max_concurrency=1)
+    held = threading.Event()
+    outcomes = []
+
+    def publish():
+        try:
+            with registry.lease('twitter'):
+                outcomes.append('acquired')
+                held.set()
+                time.sleep(1)  # Más que la espera del registro
+        except AccountUnavailable:
+            outcomes.append('unavailable')
+
+    def inspect_while_held():
+        held.wait(5)
+        return account_state(account.id)
+
+    results = run_in_threads(app, publish, publish, inspect_while_held)
+
+    assert sorted(outcomes) == ['acquired', 'unavailable']
+    during, leases_during = results[2]
+    assert during.in_flight == 1
+    assert len(leases_during) == 1
+    after, leases_after = account_state(account.id)
+    assert after.in_flight == 0
+    assert leases_after == []
+
+def test_exhausted_quota_raises_without_waiting(app, registry):
+    account = add_account(quota_limit=1)
+    with registry.lease('twitter') as lease:
+        assert lease.account_id == account.id
+
+    started = time.monotonic()
+    with pytest.raises(AccountUnavailable, match='Cuota agotada'):
+        with registry.lease('twitter'):
+            pass
+    assert time.monotonic() - started < registry.wait_seconds
+
+def test_quota_window_reset(app, registry):
+    account = add_account(quota_limit=1, quota_used=1,
+                          quota_reset_at=datetime.utcnow() - timedelta(seconds=1))
+
+    with registry.lease('twitter'):
+        pass
+
+    account, _ = account_state(account.id)
+    assert account.quota_used == 1
+    assert account.quota_reset_at > datetime.utcnow()
+
+def test_expired_lease_is_reclaimed(app, registry):
+    # Un worker caído dejó ocupado el único hueco y su reserva ya caducó
+    account = add_account(max_concurrency=1, in_flight=1)
+    db.session.add(PlatformAccountLease(account_id=account.id, holder='caido:1',
+                                        expires_at=datetime.utcnow() - timedelta(seconds=5)))
+    db.session.commit()
+
+    with registry.lease('twitter') as lease:
+        assert lease.account_id == account.id
+        during, leases = account_state(account.id)
+        assert during.in_flight == 1
+        assert len(leases) == 1
+        assert leases[0].holder != 'caido:1'
+
+    after, leases = account_state(account.id)
+    assert after.in_flight == 0
+    assert leases == []
+
+def test_live_lease_is_not_reclaimed(app, registry):
+    account = add_account(max_concurrency=1, in_flight=1)
+    db.session.add(PlatformAccountLease(account_id=account.id, holder='vivo:1',
+                                        expires_at=datetime.utcnow() + timedelta(seconds=60)))
+    db.session.commit()
+
+    with pytest.raises(AccountUnavailable, match='ocupadas'):
+        with registry.lease('twitter'):
+            pass
+
+    account, leases = account_state(account.id)
+    assert account.in_flight == 1
+    assert [row.holder for row in leases] == ['vivo:1']
+
+def test_heartbeat_extends_held_lease(app, registry):
+    registry.lease_seconds = 1  # Latido cada 0.25 s
+    add_account()
+
+    with registry.lease('twitter') as lease:
+        _, leases = account_state(lease.account_id)
+        first_expiry = leases[0].expires_at
+        time.sleep(0.6)
+        _, leases = account_state(lease.account_id)
+        assert leases[0].expires_at > first_expiry
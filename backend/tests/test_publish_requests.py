@@ -0,0 +1,137 @@
+"""Coordinación de publicaciones: una sola llamada por (video, plataforma, clave)"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, PublishRequest
+from services.publish_requests import PublishRequestCoordinator
+from tests.conftest import run_in_threads
+
+class FakePlatform:
+    """Operación de publicación que cuenta sus llamadas"""
+
+    def __init__(self, delay=0.0, success=True):
+        self.delay = delay
+        self.success = success
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'platform': 'twitter', 'success': self.success, 'publication_id': None,
+                'message': 'ok' if self.success else 'error de la plataforma'}
+
+def request_rows():
+    return db.session.execute(db.select(PublishRequest)).scalars().all()
+
+@pytest.mark.parametrize('shared_coordinator', [True, False], ids=['mismo-worker', 'otro-worker'])
+def test_concurrent_requests_make_one_platform_call(app, video, shared_coordinator):
+    platform = FakePlatform(delay=0.5)
+    first = PublishRequestCoordinator()
+    # Dos coordinadores simulan dos workers: solo se coordinan por la base de datos
+    second = first if shared_coordinator else PublishRequestCoordinator()
+
+    results = run_in_threads(
+        app,
+        lambda: first.run(video.id, 'twitter', 'key-1', platform),
+        lambda: second.run(video.id, 'twitter', 'key-1', platform)
+    )
+
+    assert platform.calls == 1
+    assert all(result['success'] for result in results)
+    assert sorted(bool(result.get('replayed')) for result in results) == [False, True]
+    rows = request_rows()
+    assert len(rows) == 1
+    assert rows[0].status == 'completed'
+
+def test_completed_key_is_replayed(app, video):
+    platform = FakePlatform()
+    coordinator = PublishRequestCoordinator()
+
+    coordinator.run(video.id, 'twitter', 'key-1', platform)
+    result = coordinator.run(video.id, 'twitter', 'key-1', platform)
+
+    assert platform.calls == 1
+    assert result['replayed'] is True
+
+def test_abandoned_claim_is_taken_over(app, video):
+    app.config['PUBLISH_INFLIGHT_TIMEOUT_SECONDS'] = 60
+    # Fila de un worker caído: sin latidos desde hace más del tiempo límite
+    db.session.add(PublishRequest(video_id=video.id, platform='twitter', idempotency_key='key-1',
+                                  updated_at=datetime.utcnow() - timedelta(seconds=120)))
+    db.session.commit()
+    platform = FakePlatform()
+
+    result = PublishRequestCoordinator().run(video.id, 'twitter', 'key-1', platform)
+
+    assert platform.calls == 1
+    assert result['success'] and not result.get('replayed')
+    rows = request_rows()
+    assert len(rows) == 1
+    assert rows[0].status == 'completed'
+
+def test_live_claim_is_not_taken_over(app, video):
+    app.config['PUBLISH_INFLIGHT_TIMEOUT_SECONDS'] = 60
+    app.config['PUBLISH_WAIT_SECONDS'] = 1
+    db.session.add(PublishRequest(video_id=video.id, platform='twitter', idempotency_key='key-1'))
+    db.session.commit()
+    platform = FakePlatform()
+
+    result = PublishRequestCoordinator().run(video.id, 'twitter', 'key-1', platform)
+
+    assert platform.calls == 0
+    assert result['in_progress'] is True
+
+def test_heartbeat_keeps_long_operation_claimed(app, video):
+    # Latido cada 0.25 s; la operación dura varias veces el tiempo límite
+    app.config['PUBLISH_INFLIGHT_TIMEOUT_SECONDS'] = 1
+    app.config['PUBLISH_WAIT_SECONDS'] = 5
+    platform = FakePlatform(delay=2.5)
+
+    def late_retry():
+        time.sleep(1.5)
+        return PublishRequestCoordinator().run(video.id, 'twitter', 'key-1', platform)
+
+    results = run_in_threads(
+        app,
+        lambda: PublishRequestCoordinator().run(video.id, 'twitter', 'key-1', platform),
+        late_retry
+    )
+
+    assert platform.calls == 1
+    assert results[1]['replayed'] is True
+    assert len(request_rows()) == 1
+
+def test_failed_result_can_be_retried(app, video):
+    coordinator = PublishRequestCoordinator()
+    failing = FakePlatform(success=False)
+    first = coordinator.run(video.id, 'twitter', 'key-1', failing)
+    assert first['success'] is False
+
+    working = FakePlatform()
+    retry = coordinator.run(video.id, 'twitter', 'key-1', working)
+
+    assert working.calls == 1
+    assert retry['success'] and not retry.get('replayed')
+    rows = request_rows()
+    assert len(rows) == 1
+    assert rows[0].status == 'completed'
+
+def test_exception_releases_the_claim(app, video):
+    coordinator = PublishRequestCoordinator()
+
+    def broken():
+        raise RuntimeError('sin conexión')
+
+    with pytest.raises(RuntimeError):
+        coordinator.run(video.id, 'twitter', 'key-1', broken)
+    assert request_rows() == []
+
+    platform = FakePlatform()
+    assert coordinator.run(video.id, 'twitter', 'key-1', platform)['success']
+    assert platform.calls == 1
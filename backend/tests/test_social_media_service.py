@@ -0,0 +1,49 @@
+"""Registro de las publicaciones en SocialMediaService"""
+
+from contextlib import contextmanager
+
+from models import db, Publication
+from services.platform_accounts import account_registry
+from services.renditions import rendition_cache
+from services.social_media_service import SocialMediaService
+
+def test_publication_without_account_is_recorded_as_failed(app, video):
+    service = SocialMediaService()
+
+    results = service.publish_to_platforms(video.to_dict(), ['twitter'], brand='sin-cuentas')
+
+    assert results[0]['success'] is False
+    publications = db.session.execute(db.select(Publication)).scalars().all()
+    assert len(publications) == 1
+    assert publications[0].status == 'failed'
+    assert publications[0].account_id is None
+    assert 'No hay cuentas' in publications[0].message
+    assert publications[0].completed_at >= publications[0].requested_at
+
+def test_rendition_is_encoded_inside_the_claim_and_before_the_lease(app, video, monkeypatch):
+    app.config['CHUNKED_UPLOAD_PLATFORMS'] = ['tiktok']
+    events = []
+    monkeypatch.setattr(rendition_cache, 'get', lambda *args: events.append('encode') or '/tmp/rendition.mp4')
+    real_lease = account_registry.lease
+
+    @contextmanager
+    def lease(*args, **kwargs):
+        events.append('lease')
+        with real_lease(*args, **kwargs) as account:
+            yield account
+
+    monkeypatch.setattr(account_registry, 'lease', lease)
+    service = SocialMediaService()
+    monkeypatch.setattr(
+        service.platforms['tiktok'], 'publish_video',
+        lambda data, credentials: events.append(('publish', data['media_path'])) or {'success': True, 'post_id': 'p1'}
+    )
+    compatibility = {'tiktok': {'compatible': False, 'transcodable': True, 'issues': ['duración']}}
+
+    first = service.publish_to_platforms(video.to_dict(), ['tiktok'], compatibility, idempotency_key='key-1')
+    retry = service.publish_to_platforms(video.to_dict(), ['tiktok'], compatibility, idempotency_key='key-1')
+
+    assert first[0]['success'] is True
+    assert retry[0]['replayed'] is True
+    # El reintento con resultado guardado no vuelve a codificar
+    assert events == ['encode', 'lease', ('publish', '/tmp/rendition.mp4')]
@@ -0,0 +1,62 @@
+"""Registro de accesos a los videos servidos desde /uploads"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Video
+
+@pytest.fixture
+def served_video(app):
+    folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'clip.mp4'), 'wb') as f:
+        f.write(b'\x00' * 1000)
+    video = Video(title='Clip', filename='clip.mp4', original_filename='clip.mp4',
+                  file_path=os.path.join(folder, 'clip.mp4'), file_size=1000,
+                  last_accessed_at=datetime.utcnow() - timedelta(days=2))
+    db.session.add(video)
+    db.session.commit()
+    return video
+
+@pytest.fixture
+def updates(app):
+    """Sentencias UPDATE ejecutadas durante la prueba"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('UPDATE'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+def last_accessed(video_id):
+    db.session.expire_all()
+    return db.session.get(Video, video_id).last_accessed_at
+
+def test_first_request_records_access(app, served_video, updates):
+    response = app.test_client().get('/uploads/clip.mp4', headers={'Range': 'bytes=0-99'})
+
+    assert response.status_code == 206
+    assert len(updates) == 1
+    assert last_accessed(served_video.id) > datetime.utcnow() - timedelta(minutes=1)
+
+def test_later_range_requests_do_not_write(app, served_video, updates):
+    response = app.test_client().get('/uploads/clip.mp4', headers={'Range': 'bytes=500-'})
+
+    assert response.status_code == 206
+    assert updates == []
+
+def test_recent_access_does_not_write(app, served_video, updates):
+    served_video.last_accessed_at = datetime.utcnow()
+    db.session.commit()
+    updates.clear()
+
+    response = app.test_client().get('/uploads/clip.mp4')
+
+    assert response.status_code == 200
+    assert updates == []
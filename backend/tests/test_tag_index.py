@@ -0,0 +1,85 @@
+"""Índice de autocompletado de tags: top-K por nodo y sincronización"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, VideoTag
+from services.tag_index import TagIndex
+
+def add_tags(**counts):
+    for tag, usage_count in counts.items():
+        db.session.add(VideoTag(tag=tag, usage_count=usage_count))
+    db.session.commit()
+
+def names(suggestions):
+    return [suggestion['tag'] for suggestion in suggestions]
+
+@pytest.fixture
+def index(app):
+    return TagIndex(max_suggestions=3, refresh_seconds=3600)
+
+def test_each_prefix_returns_its_top_k(app, index):
+    add_tags(cocina=5, cocinero=9, coche=7, cuarteto=1, coco=7, arte=3)
+
+    assert names(index.suggest('c')) == ['cocinero', 'coche', 'coco']
+    assert names(index.suggest('coc')) == ['cocinero', 'coche', 'coco']
+    assert names(index.suggest('cocin')) == ['cocinero', 'cocina']
+    assert names(index.suggest('CU')) == ['cuarteto']
+    assert index.suggest('c')[0] == {'tag': 'cocinero', 'usage_count': 9}
+    assert names(index.suggest('c', limit=1)) == ['cocinero']
+    assert index.suggest('z') == []
+
+def test_update_adds_and_reorders(app, index):
+    add_tags(cocina=5, coche=7)
+    index.suggest('c')  # Carga inicial
+
+    index.update('cocina', 10)
+    index.update('cuadro', 6)
+
+    assert names(index.suggest('c')) == ['cocina', 'coche', 'cuadro']
+    assert names(index.suggest('cu')) == ['cuadro']
+
+def test_update_to_zero_removes_and_prunes(app, index):
+    add_tags(cocina=5, coche=7, zumo=1)
+    index.suggest('c')
+
+    index.update('zumo', 0)
+    index.update('coche', 0)
+
+    assert index.suggest('z') == []
+    assert 'z' not in index._root.children
+    assert names(index.suggest('co')) == ['cocina']
+
+def test_changes_from_other_workers_are_synced(app):
+    add_tags(cocina=5, coche=7)
+    worker = TagIndex(max_suggestions=3, refresh_seconds=0)
+    assert names(worker.suggest('c')) == ['coche', 'cocina']
+
+    # Otro worker actualiza la base de datos sin avisar a este índice
+    later = datetime.utcnow() + timedelta(seconds=1)
+    cocina = db.session.execute(db.select(VideoTag).filter_by(tag='cocina')).scalar_one()
+    cocina.usage_count = 20
+    cocina.updated_at = later
+    coche = db.session.execute(db.select(VideoTag).filter_by(tag='coche')).scalar_one()
+    coche.usage_count = 0
+    coche.updated_at = later
+    db.session.add(VideoTag(tag='cuadro', usage_count=4, updated_at=later))
+    db.session.commit()
+
+    assert names(worker.suggest('c')) == ['cocina', 'cuadro']
+    assert worker._watermark == later
+
+def test_sync_reads_only_changes_since_watermark(app):
+    old = datetime.utcnow() - timedelta(hours=1)
+    db.session.add(VideoTag(tag='antiguo', usage_count=3, updated_at=old))
+    db.session.add(VideoTag(tag='reciente', usage_count=1))
+    db.session.commit()
+    worker = TagIndex(max_suggestions=3, refresh_seconds=0)
+    worker.suggest('a')
+
+    # Cambio anterior a la marca menos el solapamiento: no se vuelve a leer
+    worker.update('antiguo', 0)
+    add_tags(arte=2)
+
+    assert names(worker.suggest('a')) == ['arte']
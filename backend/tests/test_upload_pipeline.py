@@ -0,0 +1,77 @@
+"""Validación del contenido de las subidas por sus primeros bytes"""
+
+import io
+import os
+
+import pytest
+
+import upload_pipeline
+from upload_pipeline import SNIFF_BYTES, sniff_video_type
+
+def iso_file(brand, size=SNIFF_BYTES * 4):
+    """Archivo ISO-BMFF con la marca principal indicada"""
+    head = b'\x00\x00\x00\x18ftyp' + brand + b'\x00\x00\x00\x00' + brand + b'\x00\x00\x00\x08mdat'
+    return head + b'\x00' * (size - len(head))
+
+class FakeMagic:
+    def __init__(self, mime_type):
+        self.mime_type = mime_type
+
+    def from_buffer(self, head, mime=False):
+        return self.mime_type
+
+@pytest.fixture
+def without_magic(monkeypatch):
+    monkeypatch.setattr(upload_pipeline, 'magic', None)
+
+@pytest.mark.parametrize('brand, mime_type', [
+    (b'isom', 'video/mp4'),
+    (b'mp42', 'video/mp4'),
+    (b'qt  ', 'video/quicktime'),
+    (b'3gp5', 'video/3gpp'),
+])
+def test_video_brands_are_accepted(without_magic, brand, mime_type):
+    assert sniff_video_type(iso_file(brand)) == mime_type
+
+@pytest.mark.parametrize('brand', [b'heic', b'mif1', b'avif', b'M4A '])
+def test_image_and_audio_brands_are_rejected(without_magic, brand):
+    assert sniff_video_type(iso_file(brand)) is None
+
+def test_other_signatures_without_magic(without_magic):
+    assert sniff_video_type(b'\x1a\x45\xdf\xa3' + b'\x00' * 20 + b'webm') == 'video/webm'
+    assert sniff_video_type(b'RIFF\x00\x00\x00\x00AVI LIST') == 'video/x-msvideo'
+    assert sniff_video_type(b'\x00\x00\x00\x08wide\x00\x00\x00\x08mdat') == 'video/quicktime'
+    assert sniff_video_type(b'GIF89a' + b'\x00' * 20) is None
+
+def test_too_few_header_bytes(without_magic):
+    assert sniff_video_type(b'') is None
+    assert sniff_video_type(b'\x00\x00\x00\x18ftyp') is None
+    assert sniff_video_type(b'\x00\x00\x00\x18ftypis') is None
+
+def test_magic_verdict_is_final(monkeypatch):
+    # Con python-magic disponible no se recurre a las firmas conocidas
+    monkeypatch.setattr(upload_pipeline, 'magic', FakeMagic('image/heic'))
+    assert sniff_video_type(iso_file(b'isom')) is None
+    monkeypatch.setattr(upload_pipeline, 'magic', FakeMagic('video/x-matroska'))
+    assert sniff_video_type(b'\x1a\x45\xdf\xa3') == 'video/x-matroska'
+
+def upload(client, content, filename='clip.mp4'):
+    return client.post('/api/videos', data={
+        'video': (io.BytesIO(content), filename),
+        'title': 'Clip'
+    }, content_type='multipart/form-data')
+
+def test_upload_with_video_brand_is_stored(app, without_magic):
+    response = upload(app.test_client(), iso_file(b'isom'))
+
+    assert response.status_code == 201
+    stored = response.get_json()['data']
+    assert os.path.exists(stored['file_path'])
+
+@pytest.mark.parametrize('content', [iso_file(b'heic'), b'\x00\x00\x00\x18ftyp'], ids=['heic', 'cabecera-corta'])
+def test_upload_with_bad_content_is_rejected(app, without_magic, content):
+    response = upload(app.test_client(), content)
+
+    assert response.status_code == 415
+    # El archivo a medio escribir se elimina
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
@@ -0,0 +1,162 @@
+"""
+Subida de videos en una sola pasada
+
+Werkzeug guarda por defecto cada archivo multipart en un temporal que luego
+hay que copiar a UPLOAD_FOLDER. Aquí el archivo de la ruta de subida se
+escribe directamente en su ubicación final mientras se recibe y en la misma
+pasada se calcula el tamaño y el SHA-256. Con los primeros bytes se
+comprueba que el contenido es realmente un video (python-magic si está
+disponible; solo sin él, firmas conocidas) y el cuerpo se rechaza con 415
+sin esperar al resto. La memoria usada no depende del tamaño del archivo.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from flask import Request, current_app
+from werkzeug.exceptions import UnsupportedMediaType
+
+try:
+    import magic
+except ImportError:  # python-magic necesita libmagic en el sistema
+    magic = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes necesarios para identificar el contenedor
+SNIFF_BYTES = 262
+
+# Endpoints cuyos archivos se escriben directamente en UPLOAD_FOLDER
+STREAMED_ENDPOINTS = {'main.upload_video'}
+
+# Extensiones de video admitidas en las subidas (app, pipeline y VideoService)
+ALLOWED_EXTENSIONS = frozenset({'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv'})
+
+_ASF_GUID = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')
+# Cajas con las que empieza un QuickTime antiguo (sin ftyp)
+_QUICKTIME_BOX_TYPES = (b'moov', b'mdat', b'free', b'wide', b'skip', b'pnot')
+# Marcas principales de ftyp de contenedores de video: otras (heic, mif1,
+# avif...) son imágenes o audio con la misma estructura ISO-BMFF
+_VIDEO_BRANDS = {
+    b'isom', b'iso2', b'iso3', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42', b'mp71', b'avc1',
+    b'M4V ', b'M4VH', b'M4VP', b'dash', b'f4v ', b'mmp4', b'msnv', b'MSNV', b'XAVC', b'qt  '
+}
+_BRAND_MIME_TYPES = {b'qt  ': 'video/quicktime'}
+
+def sniff_video_type(head):
+    """
+    Identificar el tipo MIME de video a partir de los primeros bytes.
+    Devuelve None si el contenido no parece un video.
+    """
+    if magic is not None:
+        mime_type = magic.from_buffer(head, mime=True)
+        return mime_type if mime_type.startswith('video/') else None
+
+    if len(head) >= 12 and head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand.startswith((b'3gp', b'3g2')):
+            return 'video/3gpp2' if brand.startswith(b'3g2') else 'video/3gpp'
+        if brand in _VIDEO_BRANDS:
+            return _BRAND_MIME_TYPES.get(brand, 'video/mp4')
+        return None
+    if len(head) >= 8 and head[4:8] in _QUICKTIME_BOX_TYPES:
+        return 'video/quicktime'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm' if b'webm' in head else 'video/x-matroska'
+    if head.startswith(b'RIFF') and head[8:12] == b'AVI ':
+        return 'video/x-msvideo'
+    if head.startswith(b'FLV'):
+        return 'video/x-flv'
+    if head.startswith(_ASF_GUID):
+        return 'video/x-ms-asf'
+    return None
+
+class UploadSink:
+    """
+    Archivo de destino de una subida: escribe en UPLOAD_FOLDER, calcula el
+    tamaño y el checksum y valida el contenido con los primeros bytes.
+
+    Si la petición termina sin que el servicio llame a keep(), el archivo
+    se elimina al cerrar la petición.
+    """
+
+    def __init__(self, directory, extension):
+        # Mismo formato de nombre que VideoService._generate_unique_filename
+        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        self.filename = f"{timestamp}_{uuid.uuid4()}.{extension}"
+        self.path = os.path.join(directory, self.filename)
+        self.size = 0
+        self.mime_type = None
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self._kept = False
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w+b')
+
+    @property
+    def checksum(self):
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        if self.mime_type is None:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._validate()
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Werkzeug hace seek(0) al terminar la parte: archivos muy pequeños
+        # se validan aquí
+        if self.mime_type is None:
+            self._validate()
+        return self._file.seek(offset, whence)
+
+    def _validate(self):
+        self.mime_type = sniff_video_type(self._head)
+        if self.mime_type is None:
+            logger.info("Subida rechazada: el contenido no es un video (%d bytes leídos)",
+                        len(self._head))
+            self.discard()
+            raise UnsupportedMediaType('El contenido del archivo no es un video válido')
+
+    def keep(self):
+        """Conservar el archivo (ya registrado en la base de datos)"""
+        self._kept = True
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self._kept:
+            self._file.close()
+        else:
+            self.discard()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+class VideoRequest(Request):
+    """Request que escribe los videos subidos directamente en UPLOAD_FOLDER"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        extension = filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else None
+        if self.endpoint in STREAMED_ENDPOINTS and extension in ALLOWED_EXTENSIONS:
+            sink = UploadSink(current_app.config['UPLOAD_FOLDER'], extension)
+            self.__dict__.setdefault('_upload_sinks', []).append(sink)
+            return sink
+        return super()._get_file_stream(total_content_length, content_type, filename,
+                                        content_length)
+
+    def close(self):
+        super().close()
+        # También las partes que no llegaron a completarse (cliente cortado)
+        for sink in self.__dict__.pop('_upload_sinks', []):
+            sink.close()
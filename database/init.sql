@@ -21,9 +21,12 @@ CREATE TABLE IF NOT EXISTS videos (
     original_filename VARCHAR(255) NOT NULL,
     file_path VARCHAR(500) NOT NULL,
     file_size INTEGER,
+    checksum VARCHAR(64),
     duration REAL,
     tags VARCHAR(500),
     upload_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    storage_tier VARCHAR(10) NOT NULL DEFAULT 'hot',
+    last_accessed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -39,17 +42,122 @@ CREATE TABLE IF NOT EXISTS platforms (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
--- Tabla de publicaciones
-CREATE TABLE IF NOT EXISTS publications (
+-- Cuentas de cada plataforma (varias por plataforma y marca). in_flight y
+-- quota_used se actualizan con UPDATE condicionales desde todos los workers
+CREATE TABLE IF NOT EXISTS platform_accounts (
+    id SERIAL PRIMARY KEY,
+    platform VARCHAR(50) NOT NULL REFERENCES platforms(name),
+    name VARCHAR(100) NOT NULL,
+    brand VARCHAR(100),
+    credentials TEXT NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    max_concurrency INTEGER NOT NULL DEFAULT 2,
+    quota_limit INTEGER,
+    quota_window_seconds INTEGER NOT NULL DEFAULT 86400,
+    quota_used INTEGER NOT NULL DEFAULT 0,
+    quota_reset_at TIMESTAMP,
+    in_flight INTEGER NOT NULL DEFAULT 0,
+    in_flight_updated_at TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_platform_accounts_name UNIQUE (platform, name)
+);
+
+CREATE INDEX IF NOT EXISTS ix_platform_accounts_platform_brand ON platform_accounts(platform, brand);
+
+-- Publicaciones en curso de cada cuenta (una por hueco de in_flight). Se
+-- renuevan mientras el worker publica; las caducadas se eliminan y liberan
+-- su hueco
+CREATE TABLE IF NOT EXISTS platform_account_leases (
     id SERIAL PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES platform_accounts(id) ON DELETE CASCADE,
+    holder VARCHAR(100),
+    acquired_at TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_platform_account_leases_account_expires ON platform_account_leases(account_id, expires_at);
+
+-- Tabla de publicaciones, particionada por mes de requested_at. La clave
+-- primaria incluye la columna de partición; id sigue siendo único por la
+-- secuencia. `flask --app app db partitions` crea los meses siguientes y
+-- archiva los antiguos en publication_archive
+CREATE TABLE IF NOT EXISTS publications (
+    id SERIAL,
     video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
     platform VARCHAR(50) NOT NULL,
     platform_post_id VARCHAR(100),
+    account_id INTEGER REFERENCES platform_accounts(id) ON DELETE SET NULL,
     status VARCHAR(20) DEFAULT 'pending',
     message TEXT,
     published_at TIMESTAMP WITH TIME ZONE,
+    requested_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, requested_at)
+) PARTITION BY RANGE (requested_at);
+
+-- Partición por defecto: recoge filas fuera de los meses creados para que
+-- una inserción nunca falle si el mantenimiento no se ha ejecutado
+CREATE TABLE IF NOT EXISTS publications_default PARTITION OF publications DEFAULT;
+
+-- Crear las particiones mensuales de publications desde from_month durante
+-- `months` meses. Las filas de esos meses que hubieran caído en la partición
+-- por defecto se mueven a su partición
+CREATE OR REPLACE FUNCTION ensure_publication_partitions(from_month DATE, months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months - 1 LOOP
+        month_start := (date_trunc('month', from_month) + make_interval(months => i))::DATE;
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := 'publications_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        CREATE TEMP TABLE IF NOT EXISTS publications_relocated (LIKE publications) ON COMMIT DROP;
+        TRUNCATE publications_relocated;
+        WITH moved AS (
+            DELETE FROM publications_default
+            WHERE requested_at >= month_start AND requested_at < month_end
+            RETURNING *
+        )
+        INSERT INTO publications_relocated SELECT * FROM moved;
+
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF publications FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_end
+        );
+        INSERT INTO publications SELECT * FROM publications_relocated;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_publication_partitions(CURRENT_DATE, 4);
+
+-- Resumen compacto de las publicaciones archivadas (por mes, video y plataforma)
+CREATE TABLE IF NOT EXISTS publication_archive (
+    id SERIAL PRIMARY KEY,
+    month DATE NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    platform VARCHAR(50) NOT NULL,
+    total INTEGER NOT NULL,
+    published INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    pending INTEGER NOT NULL,
+    last_status VARCHAR(20),
+    last_platform_post_id VARCHAR(100),
+    last_published_at TIMESTAMP WITH TIME ZONE,
+    first_requested_at TIMESTAMP WITH TIME ZONE,
+    last_requested_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_publication_archive UNIQUE (month, video_id, platform)
 );
 
 -- Tabla de tags de videos
@@ -61,6 +169,98 @@ CREATE TABLE IF NOT EXISTS video_tags (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Tabla de metadatos de ffprobe y compatibilidad por plataforma
+CREATE TABLE IF NOT EXISTS video_metadata (
+    id SERIAL PRIMARY KEY,
+    video_id INTEGER NOT NULL UNIQUE REFERENCES videos(id) ON DELETE CASCADE,
+    container VARCHAR(20),
+    format_name VARCHAR(100),
+    duration REAL,
+    size BIGINT,
+    bit_rate BIGINT,
+    video_codec VARCHAR(50),
+    video_profile VARCHAR(50),
+    pixel_format VARCHAR(50),
+    width INTEGER,
+    height INTEGER,
+    rotation INTEGER DEFAULT 0,
+    frame_rate REAL,
+    audio_codec VARCHAR(50),
+    audio_channels INTEGER,
+    audio_sample_rate INTEGER,
+    audio_bit_rate BIGINT,
+    probe TEXT,
+    compatibility TEXT,
+    limits_version INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tags de cada video, normalizados (filtro exacto y facetas)
+CREATE TABLE IF NOT EXISTS video_tag_map (
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    tag VARCHAR(100) NOT NULL,
+    PRIMARY KEY (video_id, tag)
+);
+
+-- Hashes perceptuales de los fotogramas clave (videos casi duplicados)
+CREATE TABLE IF NOT EXISTS video_fingerprints (
+    id SERIAL PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    frame_index INTEGER NOT NULL,
+    hash BIGINT NOT NULL,
+    version INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Agregados horarios de publicaciones (analíticas)
+CREATE TABLE IF NOT EXISTS publication_rollups (
+    id SERIAL PRIMARY KEY,
+    bucket_start TIMESTAMP NOT NULL,
+    platform VARCHAR(50) NOT NULL,
+    total INTEGER DEFAULT 0,
+    published INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    pending INTEGER DEFAULT 0,
+    latency_count INTEGER DEFAULT 0,
+    latency_sum_ms REAL DEFAULT 0,
+    latency_histogram TEXT,
+    refreshed_at TIMESTAMP,
+    CONSTRAINT uq_publication_rollups_bucket UNIQUE (bucket_start, platform)
+);
+
+CREATE TABLE IF NOT EXISTS publication_failure_rollups (
+    id SERIAL PRIMARY KEY,
+    bucket_start TIMESTAMP NOT NULL,
+    platform VARCHAR(50) NOT NULL,
+    reason VARCHAR(200) NOT NULL,
+    count INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP,
+    refreshed_at TIMESTAMP
+);
+
+-- Peticiones de publicación: una sola operación en curso por clave y
+-- resultado guardado para los reintentos con Idempotency-Key. Sin FK a
+-- publications porque su clave primaria es compuesta (particionada)
+CREATE TABLE IF NOT EXISTS publish_requests (
+    id SERIAL PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    platform VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+    publication_id INTEGER,
+    result TEXT,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    CONSTRAINT uq_publish_requests_key UNIQUE (video_id, platform, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_publish_requests_updated_at ON publish_requests(updated_at);
+
 -- Triggers para actualizar updated_at automáticamente
 CREATE TRIGGER update_videos_updated_at 
     BEFORE UPDATE ON videos 
@@ -70,6 +270,10 @@ CREATE TRIGGER update_platforms_updated_at
     BEFORE UPDATE ON platforms 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_platform_accounts_updated_at 
+    BEFORE UPDATE ON platform_accounts 
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 CREATE TRIGGER update_publications_updated_at 
     BEFORE UPDATE ON publications 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -78,13 +282,25 @@ CREATE TRIGGER update_video_tags_updated_at
     BEFORE UPDATE ON video_tags 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_video_metadata_updated_at 
+    BEFORE UPDATE ON video_metadata 
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 -- Índices para mejorar rendimiento
 CREATE INDEX IF NOT EXISTS idx_videos_upload_date ON videos(upload_date);
 CREATE INDEX IF NOT EXISTS idx_videos_title ON videos(title);
+CREATE INDEX IF NOT EXISTS ix_videos_checksum ON videos(checksum);
+CREATE INDEX IF NOT EXISTS ix_videos_tier_accessed ON videos(storage_tier, last_accessed_at);
+CREATE INDEX IF NOT EXISTS ix_videos_filename ON videos(filename);
 CREATE INDEX IF NOT EXISTS idx_videos_tags ON videos USING gin(to_tsvector('spanish', tags));
+-- En publications los índices se crean en cada partición: las consultas por
+-- video_id usan el índice de cada mes vivo. Los agregados por plataforma y
+-- estado se leen de publication_rollups, así que no se indexan aquí
 CREATE INDEX IF NOT EXISTS idx_publications_video_id ON publications(video_id);
-CREATE INDEX IF NOT EXISTS idx_publications_platform ON publications(platform);
-CREATE INDEX IF NOT EXISTS idx_publications_status ON publications(status);
+CREATE INDEX IF NOT EXISTS ix_publications_updated_at ON publications(updated_at);
+CREATE INDEX IF NOT EXISTS ix_publication_failure_rollups_bucket ON publication_failure_rollups(bucket_start, platform);
+CREATE INDEX IF NOT EXISTS ix_video_fingerprints_video_id ON video_fingerprints(video_id);
+CREATE INDEX IF NOT EXISTS ix_video_tag_map_tag_video ON video_tag_map(tag, video_id);
 CREATE INDEX IF NOT EXISTS idx_video_tags_tag ON video_tags(tag);
 CREATE INDEX IF NOT EXISTS idx_video_tags_usage_count ON video_tags(usage_count DESC);
 